@@ -0,0 +1,275 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from stats_parser import get_stats_parser
+from match_output import (MANIFEST_FILENAME, ensure_parsed_jsons_folder, write_match_json, source_hash, payload_hash,
+                          match_files)
+import db_operations
+import instrumentation
+from render_service import RenderService
+from stream_parser import stream_stats_file
+from match_archive import append_matches
+
+REQUIRED_MANIFEST_FIELDS: list[str] = ['Axis Team Name', 'Allies Team Name', 'Map', 'Match Date']
+
+# Exit codes for run_batch
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1
+EXIT_USAGE_ERROR = 2
+
+class ManifestError(Exception):
+    pass
+
+def load_manifest(manifest_path: str) -> dict[str, dict[str, Any]]:
+    """Load the sidecar manifest that replaces the interactive prompts.
+
+    The manifest maps CSV file names to their match details:
+
+        {
+            "TLvsVLK.csv": {
+                "Axis Team Name": "VLK",
+                "Allies Team Name": "-TL-",
+                "Map": "Carentan",
+                "Match Date": "10/26/2024",
+                "Armor Overrides": ["76561198034832038"]
+            }
+        }
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ManifestError(f"Could not read manifest {manifest_path}: {type(e).__name__} - {e}")
+
+    if not isinstance(manifest, dict):
+        raise ManifestError(f"Manifest {manifest_path} must be a JSON object keyed by CSV file name")
+
+    for file_name, entry in manifest.items():
+        missing = [field for field in REQUIRED_MANIFEST_FIELDS if not isinstance(entry, dict) or field not in entry]
+        if missing:
+            raise ManifestError(f"Manifest entry for {file_name} is missing {', '.join(missing)}")
+
+    return manifest
+
+def parse_manifest_entry(file_path: str, entry: dict[str, Any], engine: str = 'rows', classifier: Any = None) -> dict[str, Any]:
+    """Parse one CSV without prompting. Runs inside a worker process."""
+    return get_stats_parser(engine).parse_stats_file(
+        file_path,
+        axis_team_name=entry['Axis Team Name'],
+        allies_team_name=entry['Allies Team Name'],
+        map_name=entry['Map'],
+        match_date=entry['Match Date'],
+        armor_player_overrides=set(entry.get('Armor Overrides', [])),
+        interactive=False,
+        classifier=classifier
+    )
+
+def load_group_classifier(db_file: str | None = None) -> Any:
+    """The database's GroupClassifier, trained if it is stale; None when there is not enough data yet."""
+    from group_classifier import GroupClassifier, cache_path_for
+    conn = db_operations.connect(db_file)
+    try:
+        db_operations.create_tables(conn)
+        classifier = GroupClassifier.load_or_train(conn, cache_path_for(db_file or db_operations.db_path))
+    finally:
+        conn.close()
+    if classifier is None:
+        print("Not enough classified matches to train the group classifier; using the weapon heuristic.")
+    else:
+        print(f"Group classifier trained on {classifier.rows} players, {classifier.accuracy:.1%} accurate on the latest matches.")
+    return classifier
+
+def run_batch(csv_directory: str, manifest_path: str | None = None, output_directory: str | None = None,
+              db_file: str | None = None, workers: int | None = None, update_database: bool = True,
+              engine: str = 'rows', render_preset: str | None = None, archive_file: str | None = None,
+              classify: bool = False) -> int:
+    """Parse every CSV in csv_directory, write the JSONs and load them into the database.
+
+    Files whose CSV or parsed match is already in the database, or earlier in the batch,
+    are skipped before any parsing or writing, so repeating a batch is a cheap no-op.
+    With classify, groups come from a GroupClassifier trained on the database.
+
+    Returns EXIT_OK when every file was ingested or skipped, EXIT_FILE_ERRORS when at least
+    one file failed and EXIT_USAGE_ERROR when the directory or manifest could not be used at all.
+    """
+    if not os.path.isdir(csv_directory):
+        print(f"Error: {csv_directory} is not a directory")
+        return EXIT_USAGE_ERROR
+
+    if manifest_path is None:
+        manifest_path = os.path.join(csv_directory, MANIFEST_FILENAME)
+
+    try:
+        manifest = load_manifest(manifest_path)
+    except ManifestError as e:
+        print(f"Error: {e}")
+        return EXIT_USAGE_ERROR
+
+    if output_directory is None:
+        output_directory = ensure_parsed_jsons_folder(os.path.dirname(os.path.abspath(__file__)))
+    else:
+        os.makedirs(output_directory, exist_ok=True)
+
+    csv_files: list[str] = match_files(csv_directory, ('.csv',))
+    summary: dict[str, str] = {}
+
+    conn = None
+    if update_database:
+        conn = db_operations.connect(db_file)
+        db_operations.create_tables(conn)
+    classifier = load_group_classifier(db_file) if classify else None
+
+    # Hash every CSV first so known sources never reach the parser pool
+    to_parse: dict[str, str] = {}
+    seen_sources: dict[str, str] = {}
+    for file_name in csv_files:
+        if file_name not in manifest:
+            summary[file_name] = 'FAILED - no manifest entry'
+            continue
+        try:
+            csv_hash = source_hash(os.path.join(csv_directory, file_name))
+        except OSError as e:
+            summary[file_name] = f"FAILED - {type(e).__name__} - {e}"
+            continue
+        loaded_as = db_operations.find_loaded_match(conn, source_hash=csv_hash) if conn else None
+        if loaded_as is not None:
+            summary[file_name] = f"SKIPPED - already loaded as {loaded_as}"
+        elif csv_hash in seen_sources:
+            summary[file_name] = f"SKIPPED - same CSV as {seen_sources[csv_hash]}"
+        else:
+            seen_sources[csv_hash] = file_name
+            to_parse[file_name] = csv_hash
+
+    futures = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_name in to_parse:
+            file_path = os.path.join(csv_directory, file_name)
+            futures[file_name] = executor.submit(instrumentation.call_recorded, instrumentation.is_enabled(),
+                                                 parse_manifest_entry, file_path, manifest[file_name], engine, classifier)
+
+        parsed: dict[str, dict[str, Any]] = {}
+        seen_payloads: dict[str, str] = {}
+        for file_name, future in futures.items():
+            try:
+                parsed_results = instrumentation.unwrap_recorded(future.result())
+            except Exception as e:
+                summary[file_name] = f"FAILED - {type(e).__name__} - {e}"
+                continue
+            parsed_results['Source Hash'] = to_parse[file_name]
+
+            # Different CSV bytes can still describe a match that is already loaded
+            match_hash = payload_hash(parsed_results)
+            loaded_as = db_operations.find_loaded_match(conn, match_hash=match_hash) if conn else None
+            if loaded_as is not None:
+                summary[file_name] = f"SKIPPED - same match as already loaded {loaded_as}"
+            elif match_hash in seen_payloads:
+                summary[file_name] = f"SKIPPED - same match as {seen_payloads[match_hash]}"
+            else:
+                seen_payloads[match_hash] = file_name
+                parsed[file_name] = parsed_results
+
+    for file_name in manifest:
+        if file_name not in csv_files:
+            summary[file_name] = 'FAILED - listed in manifest but not found'
+
+    # Single writer pass: write every JSON, then load all of them in one transaction
+    written: dict[str, str] = {}
+    for file_name, parsed_results in parsed.items():
+        try:
+            written[file_name] = write_match_json(parsed_results, output_directory)
+            summary[file_name] = f"OK - {os.path.basename(written[file_name])}"
+        except Exception as e:
+            summary[file_name] = f"FAILED - {type(e).__name__} - {e}"
+
+    if archive_file and written:
+        try:
+            append_matches(archive_file, [(os.path.basename(output_file), parsed[file_name])
+                                          for file_name, output_file in written.items()])
+        except Exception as e:
+            print(f"Warning: Could not append to archive {archive_file}: {type(e).__name__} - {e}")
+
+    # Graphs render in worker processes while the database load runs
+    render_service = RenderService(workers=workers or os.cpu_count() or 1, preset=render_preset) if render_preset else None
+    renders = {file_name: render_service.render(parsed[file_name], output_directory)
+               for file_name in written} if render_service else {}
+
+    if conn is not None and written:
+        try:
+            prepared = {file_name: db_operations.prepare_match(os.path.basename(output_file), parsed[file_name])
+                        for file_name, output_file in written.items()}
+            loaded = db_operations.bulk_load_matches(conn, list(prepared.values()))
+        except Exception as e:
+            for file_name in written:
+                summary[file_name] = f"FAILED - JSON written but not loaded: {type(e).__name__} - {e}"
+        else:
+            # The loader skips matches another writer loaded after the checks above
+            if loaded < len(written):
+                for file_name, output_file in written.items():
+                    json_name = os.path.basename(output_file)
+                    loaded_as = db_operations.find_loaded_match(conn, match_hash=prepared[file_name][7])
+                    if loaded_as is None:
+                        summary[file_name] = f"SKIPPED - JSON written but not loaded, {json_name} is already loaded"
+                    elif loaded_as != json_name:
+                        summary[file_name] = f"SKIPPED - JSON written but not loaded, same match as already loaded {loaded_as}"
+    if conn is not None:
+        conn.close()
+
+    for file_name, future in renders.items():
+        try:
+            summary[file_name] += f", graph {os.path.basename(future.result())}"
+        except Exception as e:
+            summary[file_name] += f", graph not rendered: {type(e).__name__} - {e}"
+    if render_service:
+        render_service.shutdown()
+
+    print("\nBatch summary:")
+    for file_name in sorted(summary):
+        print(f"  {file_name}: {summary[file_name]}")
+
+    failures = sum(1 for status in summary.values() if status.startswith('FAILED'))
+    skipped = sum(1 for status in summary.values() if status.startswith('SKIPPED'))
+    print(f"\n{len(summary) - failures - skipped} of {len(summary)} files ingested successfully, {skipped} skipped as duplicates.")
+    return EXIT_FILE_ERRORS if failures else EXIT_OK
+
+def run_stream(csv_file: str, axis_team_name: str, allies_team_name: str, map_name: str, match_date: str,
+               armor_player_overrides: set[str] | None = None, output_directory: str | None = None,
+               db_file: str | None = None, update_database: bool = True) -> int:
+    """Stream one oversized CSV export into an NDJSON file and load it record by record."""
+    if not os.path.isfile(csv_file):
+        print(f"Error: {csv_file} is not a file")
+        return EXIT_USAGE_ERROR
+
+    if output_directory is None:
+        output_directory = ensure_parsed_jsons_folder(os.path.dirname(os.path.abspath(__file__)))
+    else:
+        os.makedirs(output_directory, exist_ok=True)
+
+    conn = None
+    if update_database:
+        conn = db_operations.connect(db_file)
+        db_operations.create_tables(conn)
+
+    try:
+        csv_hash = source_hash(csv_file)
+        loaded_as = db_operations.find_loaded_match(conn, source_hash=csv_hash) if conn else None
+        if loaded_as is not None:
+            print(f"{os.path.basename(csv_file)} has already been loaded as {loaded_as}. Nothing to do.")
+            return EXIT_OK
+
+        output_file = stream_stats_file(csv_file, output_directory, axis_team_name, allies_team_name, map_name,
+                                        match_date, armor_player_overrides, source_hash=csv_hash)
+        print(f"Results have been saved to {output_file}")
+
+        if conn is not None:
+            db_operations.process_ndjson_file(conn, output_file)
+            conn.commit()
+            print("Database update complete.")
+    except Exception as e:
+        print(f"Error streaming {csv_file}: {type(e).__name__} - {e}")
+        return EXIT_FILE_ERRORS
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return EXIT_OK
@@ -0,0 +1,824 @@
+"""Performance benchmarks for the parser and database layers.
+
+Run with `python benchmarks.py <benchmark>`; every benchmark works on temporary
+databases and never touches hell_let_loose.db.
+"""
+import os
+import sys
+import time
+import sqlite3
+import random
+import argparse
+import tempfile
+import contextlib
+import io
+import json
+import csv
+import tracemalloc
+import threading
+import http.client
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+import db_operations
+import instrumentation
+import ratings
+from stats_parser import PARSE_ENGINES, get_stats_parser
+from match_output import write_match_json, match_files
+from stream_parser import stream_stats_file
+from match_archive import MatchArchive, append_matches
+from kill_graph import KillGraph
+from weapon_data import WeaponData
+import reports
+import stats_api
+import season_dashboard
+from render_service import RENDER_PRESETS
+from batch_ingest import MANIFEST_FILENAME, load_manifest, parse_manifest_entry
+from synthetic_exports import generate_exports
+
+base_directory: str = os.path.dirname(os.path.abspath(__file__))
+parsed_jsons_folder: str = os.path.join(base_directory, "parsed_jsons")
+raw_csvs_folder: str = os.path.join(base_directory, "Raw_csvs")
+
+def load_bundled_matches(copies: int) -> list[tuple[str, dict[str, Any]]]:
+    """Load parsed_jsons/ and repeat it under unique file names to get a bigger workload.
+
+    Each copy gets its own Match Date so the payload hashes differ and no copy is
+    skipped as a duplicate.
+    """
+    matches = []
+    for filename in match_files(parsed_jsons_folder):
+        matches.append((filename, db_operations.load_json_file(os.path.join(parsed_jsons_folder, filename))))
+    return [(f"copy{copy}_{filename}", dict(data, **{'Match Date': f"{data['Match Date']} (copy {copy})"}))
+            for copy in range(copies) for filename, data in matches]
+
+def count_performance_rows(matches: list[tuple[str, dict[str, Any]]]) -> int:
+    return sum(len(db_operations.prepare_match(file_name, data)[4]) for file_name, data in matches)
+
+def time_in_fresh_database(load: Callable[[sqlite3.Connection], None]) -> float:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = db_operations.connect(os.path.join(temp_dir, 'benchmark.db'))
+        db_operations.create_tables(conn)
+        start = time.perf_counter()
+        load(conn)
+        elapsed = time.perf_counter() - start
+        conn.close()
+    return elapsed
+
+def benchmark_ingest(args: argparse.Namespace) -> None:
+    """Compare the per-row process_match_data path with bulk_load_matches."""
+    matches = load_bundled_matches(args.copies)
+    rows = count_performance_rows(matches)
+    print(f"Loading {len(matches)} matches ({rows} player rows)")
+
+    def per_row(conn: sqlite3.Connection) -> None:
+        for file_name, data in matches:
+            db_operations.process_match_data(conn, file_name, data)
+        conn.commit()
+
+    def bulk(conn: sqlite3.Connection) -> None:
+        db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in matches])
+
+    for label, load in [('per-row', per_row), ('bulk', bulk)]:
+        elapsed = min(time_in_fresh_database(load) for _ in range(args.repeat))
+        print(f"  {label:<8} {elapsed:8.3f} s  {rows / elapsed:12,.0f} rows/s")
+
+LEGACY_TEAM_PLAYERS_LOOKUP = '''
+    WITH LatestTeam AS (
+        SELECT DISTINCT PlayerID, TeamID, FirstSeen, LastSeen, MatchesPlayed
+        FROM PlayerTeamAffiliations
+        WHERE (PlayerID, LastSeen) IN (
+            SELECT PlayerID, MAX(LastSeen) FROM PlayerTeamAffiliations GROUP BY PlayerID
+        )
+    ),
+    LatestName AS (
+        SELECT DISTINCT PlayerID, PlayerName
+        FROM PlayerNameHistory
+        WHERE (PlayerID, LastSeen) IN (
+            SELECT PlayerID, MAX(LastSeen) FROM PlayerNameHistory GROUP BY PlayerID
+        )
+    )
+    SELECT DISTINCT p.PlayerID, ln.PlayerName, t.TeamName, lt.FirstSeen, lt.LastSeen, lt.MatchesPlayed
+    FROM Players p
+    JOIN LatestTeam lt ON p.PlayerID = lt.PlayerID
+    JOIN Teams t ON lt.TeamID = t.TeamID
+    JOIN LatestName ln ON p.PlayerID = ln.PlayerID
+    WHERE p.PlayerID = ?
+    GROUP BY p.PlayerID
+'''
+
+def build_synthetic_history(conn: sqlite3.Connection, players: int, teams: int, seed: int) -> list[str]:
+    """Fill Players, Teams and the history tables with a random multi-season history."""
+    rng = random.Random(seed)
+    player_ids = [str(76561198000000000 + index) for index in range(players)]
+    conn.executemany('INSERT INTO Teams (TeamName) VALUES (?)', ((f"Team {index}",) for index in range(teams)))
+    conn.executemany('''
+        INSERT INTO Players (PlayerID, PlayerName, TotalKills, TotalDeaths, TotalMatches, TotalCombatEffectiveness)
+        VALUES (?, ?, 0, 0, 0, 0)
+    ''', ((player_id, f"Player {player_id[-6:]}") for player_id in player_ids))
+
+    def random_date() -> str:
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+
+    affiliations = []
+    names = []
+    for player_id in player_ids:
+        for team_id in rng.sample(range(1, teams + 1), rng.randint(1, 3)):
+            first_seen, last_seen = sorted([random_date(), random_date()])
+            affiliations.append((player_id, team_id, first_seen, last_seen, rng.randint(1, 40)))
+        for name_index in range(rng.randint(1, 3)):
+            first_seen, last_seen = sorted([random_date(), random_date()])
+            names.append((player_id, f"Player {player_id[-6:]} v{name_index}", first_seen, last_seen))
+    conn.executemany('''
+        INSERT INTO PlayerTeamAffiliations (PlayerID, TeamID, FirstSeen, LastSeen, MatchesPlayed)
+        VALUES (?, ?, ?, ?, ?)
+    ''', affiliations)
+    conn.executemany('''
+        INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
+        VALUES (?, ?, ?, ?)
+    ''', names)
+    db_operations.refresh_current_player_state(conn)
+    conn.commit()
+    return player_ids
+
+def time_lookups(conn: sqlite3.Connection, sql: str, player_ids: list[str]) -> float:
+    """Average seconds per lookup of sql for the given player IDs."""
+    start = time.perf_counter()
+    for player_id in player_ids:
+        conn.execute(sql, (player_id,)).fetchall()
+    return (time.perf_counter() - start) / len(player_ids)
+
+def benchmark_views(args: argparse.Namespace) -> None:
+    """Per-player lookup latency of the TeamPlayers and PlayerHistory views."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = db_operations.connect(os.path.join(temp_dir, 'benchmark.db'))
+        db_operations.create_tables(conn)
+        print(f"Building a synthetic history of {args.players:,} players")
+        player_ids = build_synthetic_history(conn, args.players, args.teams, args.seed)
+        sample = random.Random(args.seed).sample(player_ids, args.lookups)
+
+        lookups = [
+            ('TeamPlayers', 'SELECT * FROM TeamPlayers WHERE PlayerID = ?', sample),
+            ('PlayerHistory', 'SELECT * FROM PlayerHistory WHERE PlayerID = ?', sample),
+        ]
+        if args.legacy_lookups:
+            lookups.append(('legacy TeamPlayers', LEGACY_TEAM_PLAYERS_LOOKUP, sample[:args.legacy_lookups]))
+
+        for label, sql, player_ids in lookups:
+            per_lookup = time_lookups(conn, sql, player_ids)
+            print(f"  {label:<20} {per_lookup * 1000:10.3f} ms per lookup ({len(player_ids)} lookups)")
+        conn.close()
+
+def parse_quietly(engine: str, file_path: str) -> dict[str, Any]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return get_stats_parser(engine).parse_stats_file(file_path, 'Axis', 'Allies', 'Benchmark Map', '1/1/2024',
+                                                         armor_player_overrides=set(), interactive=False)
+
+def benchmark_parse(args: argparse.Namespace) -> None:
+    """Throughput of each CSV parse engine on Raw_csvs/, checking they agree."""
+    csv_files = [os.path.join(raw_csvs_folder, name) for name in match_files(raw_csvs_folder, ('.csv',))]
+    outputs: dict[str, list[str]] = {}
+
+    for engine in PARSE_ENGINES:
+        parse_quietly(engine, csv_files[0])  # Warm up imports
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = [parse_quietly(engine, file_path) for file_path in csv_files]
+            best = min(best, time.perf_counter() - start)
+        outputs[engine] = [json.dumps(result, ensure_ascii=False) for result in results]
+        rows = sum(len(db_operations.prepare_match('', result)[4]) for result in results)
+        print(f"  {engine:<9} {best:8.3f} s  {rows / best:12,.0f} rows/s  ({len(csv_files)} files)")
+
+    reference = outputs[PARSE_ENGINES[0]]
+    for engine, output in outputs.items():
+        if output != reference:
+            print(f"  WARNING: {engine} output differs from {PARSE_ENGINES[0]}")
+
+def write_concatenated_export(output_file: str, copies: int) -> int:
+    """Write Raw_csvs/ repeated copies times as one export in the first file's column order."""
+    csv_files = [os.path.join(raw_csvs_folder, name) for name in match_files(raw_csvs_folder, ('.csv',))]
+    rows = 0
+    with open(output_file, 'w', encoding='utf8', newline='') as out:
+        writer = csv.writer(out)
+        headers = None
+        for _ in range(copies):
+            for file_path in csv_files:
+                with open(file_path, encoding='utf8', newline='') as f:
+                    reader = csv.reader(f)
+                    file_headers = next(reader)
+                    if headers is None:
+                        headers = file_headers
+                        writer.writerow(headers)
+                    # Older exports call the ID column 'Steam ID'
+                    aliases = {'Player ID': 'Steam ID', 'Steam ID': 'Player ID'}
+                    order = [file_headers.index(column if column in file_headers else aliases[column]) for column in headers]
+                    for row in reader:
+                        writer.writerow([row[index] for index in order])
+                        rows += 1
+    return rows
+
+def measure_peak(run: Callable[[], Any]) -> tuple[float, int]:
+    """Seconds and peak traced bytes for one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def benchmark_stream(args: argparse.Namespace) -> None:
+    """Peak memory of the in-memory parser vs the streaming NDJSON pipeline as exports grow."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for copies in args.copies:
+            export_file = os.path.join(temp_dir, f'export_{copies}.csv')
+            rows = write_concatenated_export(export_file, copies)
+            details = ('Axis', 'Allies', 'Benchmark Map', '1/1/2024')
+
+            def in_memory() -> None:
+                results = get_stats_parser('rows').parse_stats_file(export_file, *details, armor_player_overrides=set(), interactive=False)
+                write_match_json(results, temp_dir)
+
+            def streamed() -> None:
+                stream_stats_file(export_file, temp_dir, *details, armor_player_overrides=set())
+
+            print(f"  {rows:,} rows")
+            for label, run in [('in-memory', in_memory), ('streamed', streamed)]:
+                elapsed, peak = measure_peak(run)
+                print(f"    {label:<10} {elapsed:8.3f} s  peak {peak / 2**20:8.1f} MiB")
+
+def benchmark_archive(args: argparse.Namespace) -> None:
+    """Reading a season from parsed JSON files vs from a memory-mapped archive."""
+    matches = load_bundled_matches(args.copies)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_folder = os.path.join(temp_dir, 'jsons')
+        os.makedirs(json_folder)
+        for file_name, data in matches:
+            with open(os.path.join(json_folder, file_name), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+        archive_file = os.path.join(temp_dir, 'season.hllarc')
+        append_matches(archive_file, matches)
+
+        def from_jsons() -> list[tuple]:
+            return [db_operations.prepare_match(file_name, db_operations.load_json_file(os.path.join(json_folder, file_name)))
+                    for file_name in match_files(json_folder)]
+
+        def from_archive() -> list[tuple]:
+            with MatchArchive(archive_file) as archive:
+                return [match.prepared() for match in archive]
+
+        def season_totals() -> dict[str, dict[str, int]]:
+            with MatchArchive(archive_file) as archive:
+                return archive.player_totals()
+
+        json_bytes = sum(os.path.getsize(os.path.join(json_folder, name)) for name in match_files(json_folder))
+        print(f"{len(matches)} matches: {json_bytes / 2**20:.1f} MiB of JSON, {os.path.getsize(archive_file) / 2**20:.1f} MiB archive")
+        for label, run in [('JSON scan', from_jsons), ('archive', from_archive), ('archive totals', season_totals)]:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            print(f"  {label:<15} {best * 1000:10.1f} ms")
+
+def build_synthetic_season(conn: sqlite3.Connection, matches: int, players: int, teams: int,
+                           seed: int, first_match: int = 0) -> None:
+    """Insert random 50 vs 50 matches with their MatchPerformance rows and kill edges."""
+    rng = random.Random(seed + first_match)
+    if first_match == 0:
+        conn.executemany('INSERT INTO Teams (TeamName) VALUES (?)', ((f"Team {index}",) for index in range(teams)))
+        conn.executemany('INSERT INTO Players (PlayerID, PlayerName) VALUES (?, ?)',
+                         ((str(76561198000000000 + index), f"Player {index}") for index in range(players)))
+    rosters = [[str(76561198000000000 + index) for index in range(team, players, teams)] for team in range(teams)]
+
+    for match_index in range(first_match, first_match + matches):
+        played_at = (datetime(2024, 1, 1) + timedelta(hours=match_index)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor = conn.execute('INSERT INTO ParsedResults (FileName, MapName, MatchDate, MatchTimestamp) VALUES (?, ?, ?, ?)',
+                              (f"synthetic_{match_index}.json", 'Carentan', played_at, played_at))
+        result_id = cursor.lastrowid
+        axis_team, allies_team = rng.sample(range(teams), 2)
+        sides = [(axis_team, rng.sample(rosters[axis_team], 50)), (allies_team, rng.sample(rosters[allies_team], 50))]
+        conn.executemany('''
+            INSERT INTO MatchPerformance (ResultID, MatchTimestamp, PlayerID, TeamID, Kills, Deaths, CombatEffectiveness)
+            VALUES (?, ?, ?, ?, 0, 0, 0)
+        ''', ((result_id, played_at, player_id, team + 1) for team, roster in sides for player_id in roster))
+        edges = []
+        for (_, roster), (_, opponents) in (sides, sides[::-1]):
+            for killer in roster:
+                for victim in rng.sample(opponents, 8):
+                    edges.append((result_id, killer, victim, rng.randint(1, 4)))
+        conn.executemany('INSERT INTO PlayerKillEdges (ResultID, KillerID, VictimID, Kills) VALUES (?, ?, ?, ?)', edges)
+    conn.commit()
+
+def benchmark_kill_graph(args: argparse.Namespace) -> None:
+    """Full build, cached reload, incremental update and rankings of the kill graph on a synthetic season."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = db_operations.connect(os.path.join(temp_dir, 'benchmark.db'))
+        db_operations.create_tables(conn)
+        print(f"Building a synthetic season of {args.matches:,} matches between {args.players:,} players")
+        build_synthetic_season(conn, args.matches, args.players, args.teams, args.seed)
+        cache_file = os.path.join(temp_dir, 'benchmark.killgraph.npz')
+
+        def timed(label: str, run: Callable[[], Any]) -> Any:
+            start = time.perf_counter()
+            result = run()
+            print(f"  {label:<28} {(time.perf_counter() - start) * 1000:10.1f} ms")
+            return result
+
+        graph = timed('full build', lambda: KillGraph.build(conn))
+        print(f"    {graph.kills.nnz:,} killer/victim pairs, {int(graph.kills.sum()):,} kills")
+        timed('save cache', lambda: graph.save(cache_file))
+        graph = timed('load cache', lambda: KillGraph.load(cache_file))
+        build_synthetic_season(conn, args.new_matches, args.players, args.teams, args.seed, first_match=args.matches)
+        timed(f'update with {args.new_matches} new matches', lambda: graph.update(conn))
+        timed('top rivalries', lambda: graph.top_rivalries(args.limit))
+        timed('team feed', lambda: graph.team_feed(args.limit))
+        timed('threat scores (PageRank)', lambda: graph.top_threats(args.limit))
+        conn.close()
+
+def synthetic_prepared_matches(first_match: int, matches: int, players: int, teams: int,
+                               rng: random.Random) -> list[tuple]:
+    """Random 50 vs 50 matches in the prepare_match shape, ready for bulk_load_matches."""
+    weapons = sorted(WeaponData.WEAPONS) + sorted(WeaponData.MACHINE_GUNS)
+    maps = ['Carentan', 'Foy', 'Hurtgen Forest', 'Kursk', 'SMDM', 'Utah Beach', 'Omaha Beach', 'Stalingrad']
+    prepared = []
+    for match_index in range(first_match, first_match + matches):
+        team_indices = rng.sample(range(teams), 2)
+        sides = []
+        for side, team_index in zip(['Axis', 'Allies'], team_indices):
+            roster = rng.sample(range(team_index, players, teams), 50)
+            sides.append((side, f"Team {team_index}", [str(76561198000000000 + index) for index in roster]))
+        rows, weapon_rows, edges = [], [], []
+        for (side, team_name, roster), (_, _, opponents) in zip(sides, sides[::-1]):
+            for player_id in roster:
+                kills, deaths = rng.randint(0, 60), rng.randint(0, 40)
+                rows.append((player_id, f"Player {player_id[-6:]}", team_name, side, 'Infantry', kills, deaths,
+                             rng.randint(0, 800), rng.randint(0, 15), round(kills / 90, 2), round(deaths / 90, 2),
+                             rng.randint(0, 8), 0, 0, 0, rng.randint(1, 30), rng.randint(5, 60),
+                             rng.randint(0, 300), rng.randint(0, 300), rng.randint(0, 200), rng.randint(0, kills)))
+                weapon_rows.extend((player_id, weapon, 0, rng.randint(1, 20)) for weapon in rng.sample(weapons, 2))
+                weapon_rows.extend((player_id, weapon, 1, rng.randint(1, 10)) for weapon in rng.sample(weapons, 2))
+                edges.extend((player_id, victim, None, None, rng.randint(1, 4)) for victim in rng.sample(opponents, 3))
+        played_at = (datetime(2024, 1, 1) + timedelta(hours=match_index)).strftime('%Y-%m-%d %H:%M:%S')
+        prepared.append((f"synthetic_{match_index}.json", rng.choice(maps), played_at,
+                         (sides[0][1], sides[1][1]), rows, weapon_rows, None, f"synthetic-{match_index}", edges))
+    return prepared
+
+def benchmark_reports(args: argparse.Namespace) -> None:
+    """Latency of each report on one pooled connection over a synthetic season."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, 'benchmark.db')
+        conn = db_operations.connect(db_file)
+        db_operations.create_tables(conn)
+        print(f"Loading a synthetic season of {args.matches:,} matches between {args.players:,} players")
+        for first_match in range(0, args.matches, 500):
+            db_operations.bulk_load_matches(conn, synthetic_prepared_matches(
+                first_match, min(500, args.matches - first_match), args.players, args.teams, rng))
+        conn.close()
+
+        conn = reports.get_connection(db_file)
+        player_ids = [str(76561198000000000 + index) for index in rng.sample(range(args.players), args.lookups)]
+        team_names = [f"Team {index}" for index in rng.sample(range(args.teams), min(args.teams, args.lookups))]
+        runs = [
+            ('player card', [lambda player_id=player_id: reports.player_card(conn, player_id) for player_id in player_ids]),
+            ('team roster', [lambda team=team: reports.team_roster(conn, team) for team in team_names]),
+            ('map table', [lambda: reports.map_table(conn)] * args.lookups),
+            ('map table, one team', [lambda team=team: reports.map_table(conn, team) for team in team_names]),
+            ('weapon, one weapon', [lambda: reports.weapon_leaderboard(conn, weapon='M1 GARAND')] * args.lookups),
+            ('weapon, machine guns', [lambda: reports.weapon_leaderboard(conn, machine_guns=True)] * args.lookups),
+            ('weapon, infantry', [lambda: reports.weapon_leaderboard(conn, group='Infantry')] * args.lookups),
+            ('weapon, top weapons', [lambda: reports.weapon_leaderboard(conn)] * args.lookups),
+        ]
+        for label, calls in runs:
+            timings = []
+            for call in calls:
+                start = time.perf_counter()
+                reports.format_report(call(), 'json')
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"  {label:<22} median {timings[len(timings) // 2] * 1000:8.2f} ms   worst {timings[-1] * 1000:8.2f} ms")
+        reports.close_connections()
+
+def benchmark_concurrency(args: argparse.Namespace) -> None:
+    """Ingest throughput and reader latency with one writer and several readers, default vs tuned connections."""
+    modes = [
+        ('default', lambda path, read_only=False: sqlite3.connect(path, timeout=db_operations.BUSY_TIMEOUT,
+                                                                  check_same_thread=False)),
+        ('tuned', lambda path, read_only=False: db_operations.connect(path, read_only=read_only, check_same_thread=False)),
+    ]
+    for label, open_connection in modes:
+        for readers in sorted({0, args.readers}):
+            ingest_rate, latencies, errors = run_concurrent_ingest(open_connection, readers, args)
+            print(f"{label:<8} {readers} readers: {ingest_rate:8.1f} matches/s ingested", end='')
+            if latencies:
+                print(f", {len(latencies):,} reads, median {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                      f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, worst {latencies[-1] * 1000:.2f} ms, "
+                      f"{errors} errors")
+            else:
+                print()
+
+def run_concurrent_ingest(open_connection: Callable[..., sqlite3.Connection], readers: int,
+                          args: argparse.Namespace) -> tuple[float, list[float], int]:
+    """Ingest args.batches transactions into a fresh database while readers fetch player cards."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, 'benchmark.db')
+        conn = open_connection(db_file)
+        db_operations.create_tables(conn)
+        db_operations.bulk_load_matches(conn, synthetic_prepared_matches(0, args.base_matches, args.players, args.teams, rng))
+        batches = [synthetic_prepared_matches(args.base_matches + index * args.batch_size, args.batch_size,
+                                              args.players, args.teams, rng) for index in range(args.batches)]
+
+        writing = threading.Event()
+        writing.set()
+        latencies: list[float] = []
+        errors: list[str] = []
+
+        def read() -> None:
+            reader = open_connection(db_file, read_only=True)
+            reader_rng = random.Random()
+            while writing.is_set():
+                player_id = str(76561198000000000 + reader_rng.randrange(args.players))
+                start = time.perf_counter()
+                try:
+                    reports.player_card(reader, player_id)
+                except reports.ReportError:
+                    pass
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                latencies.append(time.perf_counter() - start)
+                time.sleep(args.read_interval)
+            reader.close()
+
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        start = time.perf_counter()
+        for batch in batches:
+            db_operations.bulk_load_matches(conn, batch)
+        elapsed = time.perf_counter() - start
+        writing.clear()
+        for thread in threads:
+            thread.join()
+        conn.close()
+    return args.batches * args.batch_size / elapsed, sorted(latencies), len(errors)
+
+def benchmark_api(args: argparse.Namespace) -> None:
+    """Requests per second and latency of the stats API with and without its response cache."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, 'benchmark.db')
+        conn = db_operations.connect(db_file)
+        db_operations.create_tables(conn)
+        print(f"Loading a synthetic season of {args.matches:,} matches between {args.players:,} players")
+        for first_match in range(0, args.matches, 500):
+            db_operations.bulk_load_matches(conn, synthetic_prepared_matches(
+                first_match, min(500, args.matches - first_match), args.players, args.teams, rng))
+        conn.close()
+
+        # Viewers mostly look at recent matches, popular players and the standings
+        paths = ['/maps', '/matches']
+        paths += [f"/matches/{result_id}" for result_id in range(args.matches - 20, args.matches + 1)]
+        paths += [f"/players/{76561198000000000 + index}" for index in rng.sample(range(args.players), 100)]
+        paths += [f"/teams/Team%20{index}" for index in range(min(args.teams, 20))]
+
+        for label, cache_entries in [('no cache', 0), ('LRU cache', stats_api.CACHE_ENTRIES)]:
+            api = stats_api.StatsApi(db_file, workers=args.workers, cache_entries=cache_entries)
+            server = stats_api.make_server(api, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            latencies: list[float] = []
+            latencies_lock = threading.Lock()
+
+            def client(seed: int) -> None:
+                client_rng = random.Random(seed)
+                connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+                timings = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    connection.request('GET', client_rng.choice(paths))
+                    connection.getresponse().read()
+                    timings.append(time.perf_counter() - start)
+                connection.close()
+                with latencies_lock:
+                    latencies.extend(timings)
+
+            clients = [threading.Thread(target=client, args=(seed,)) for seed in range(args.clients)]
+            start = time.perf_counter()
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            server.shutdown()
+            server.server_close()
+            api.close()
+
+            latencies.sort()
+            print(f"  {label:<10} {len(latencies) / elapsed:8.0f} requests/s   median {latencies[len(latencies) // 2] * 1000:7.2f} ms   "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms   "
+                  f"cache hits {api.cache.hits:,}/{api.cache.hits + api.cache.misses:,}")
+
+def benchmark_dashboard(args: argparse.Namespace) -> None:
+    """Season dashboards for a league, a fresh figure per team vs one reused template."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, 'benchmark.db')
+        conn = db_operations.connect(db_file)
+        db_operations.create_tables(conn)
+        print(f"Loading a synthetic season of {args.matches:,} matches between {args.teams} teams")
+        for first_match in range(0, args.matches, 500):
+            db_operations.bulk_load_matches(conn, synthetic_prepared_matches(
+                first_match, min(500, args.matches - first_match), args.players, args.teams, rng))
+
+        start = time.perf_counter()
+        season = season_dashboard.load_season(conn)
+        print(f"  load season           {time.perf_counter() - start:8.2f} s")
+        conn.close()
+
+        settings = RENDER_PRESETS[args.preset]
+        for label, reuse_template in [('figure per team', False), ('reused template', True)]:
+            start = time.perf_counter()
+            season_dashboard.render_teams(season.maps, season.bin_edges, season.teams, temp_dir,
+                                          settings['dpi'], settings['format'], reuse_template)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<20} {elapsed:8.2f} s   {elapsed / len(season.teams) * 1000:6.0f} ms per team")
+
+def benchmark_ratings(args: argparse.Namespace) -> None:
+    """Rating throughput: a full replay, new matches as they are loaded, and a backfilled match."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = db_operations.connect(os.path.join(temp_dir, 'benchmark.db'))
+        db_operations.create_tables(conn)
+        print(f"Loading a synthetic season of {args.matches:,} matches between {args.players:,} players")
+        for first_match in range(0, args.matches, 500):
+            db_operations.bulk_load_matches(conn, synthetic_prepared_matches(
+                first_match, min(500, args.matches - first_match), args.players, args.teams, rng))
+
+        start = time.perf_counter()
+        rated = ratings.replay_ratings(conn)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f"  full replay            {elapsed:8.2f} s   {rated / elapsed * 60:10,.0f} matches/min")
+
+        new_matches = synthetic_prepared_matches(args.matches, args.new_matches, args.players, args.teams, rng)
+        instrumentation.enable()
+        start = time.perf_counter()
+        for match in new_matches:
+            db_operations.bulk_load_matches(conn, [match])
+        elapsed = time.perf_counter() - start
+        rating_time = sum(total for path, (_, total, _) in instrumentation.snapshot()['spans'].items()
+                          if path.endswith('rate_new_matches'))
+        print(f"  load one by one        {elapsed:8.2f} s   {len(new_matches) / elapsed * 60:10,.0f} matches/min, "
+              f"{rating_time / len(new_matches) * 1000:.1f} ms per match rating")
+
+        # A match played mid-season but loaded last is rated by replaying from the checkpoint before it
+        backfill = synthetic_prepared_matches(args.matches + args.new_matches, 1, args.players, args.teams, rng)[0]
+        played_at = (datetime(2024, 1, 1) + timedelta(hours=args.matches // 2, minutes=30)).strftime('%Y-%m-%d %H:%M:%S')
+        backfill = (backfill[0], backfill[1], played_at) + backfill[3:]
+        start = time.perf_counter()
+        db_operations.bulk_load_matches(conn, [backfill])
+        print(f"  backfill mid-season    {time.perf_counter() - start:8.2f} s   "
+              f"{args.matches // 2 + args.new_matches:,} later matches replayed, at most {ratings.CHECKPOINT_INTERVAL} before it")
+        conn.close()
+
+SCALE_STAGES: list[tuple[str, str]] = [('parse', 'rows'), ('json', 'rows'), ('graph', 'matches'), ('ingest', 'rows')]
+
+def peak_rss_mib() -> float | None:
+    """Peak resident set size of this process; None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+def run_scale_pipeline(csv_directory: str, output_directory: str, engine: str, chunk_size: int,
+                       graph_limit: int, preset: str) -> dict[str, Any]:
+    """Parse, write, graph and load every export in csv_directory, the way batch does, in chunks.
+
+    Runs in its own process so the peak RSS belongs to this run alone. Returns seconds and
+    units per stage; only the first graph_limit matches are graphed.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from generate_comparison_graph import create_comprehensive_comparison
+
+    manifest = load_manifest(os.path.join(csv_directory, MANIFEST_FILENAME))
+    settings = RENDER_PRESETS[preset]
+    stages = {stage: [0.0, 0] for stage, _ in SCALE_STAGES}
+    conn = db_operations.connect(os.path.join(output_directory, 'benchmark.db'))
+    db_operations.create_tables(conn)
+    file_names = sorted(manifest)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for first in range(0, len(file_names), chunk_size):
+            prepared = []
+            for file_name in file_names[first:first + chunk_size]:
+                start = time.perf_counter()
+                parsed = parse_manifest_entry(os.path.join(csv_directory, file_name), manifest[file_name], engine)
+                stages['parse'][0] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                output_file = write_match_json(parsed, output_directory)
+                stages['json'][0] += time.perf_counter() - start
+
+                if stages['graph'][1] < graph_limit:
+                    start = time.perf_counter()
+                    create_comprehensive_comparison(parsed, output_directory, dpi=settings['dpi'], file_format=settings['format'])
+                    stages['graph'][0] += time.perf_counter() - start
+                    stages['graph'][1] += 1
+
+                start = time.perf_counter()
+                prepared.append(db_operations.prepare_match(os.path.basename(output_file), parsed))
+                stages['ingest'][0] += time.perf_counter() - start
+                rows = len(prepared[-1][4])
+                for stage in ('parse', 'json', 'ingest'):
+                    stages[stage][1] += rows
+
+            start = time.perf_counter()
+            db_operations.bulk_load_matches(conn, prepared)
+            stages['ingest'][0] += time.perf_counter() - start
+    conn.close()
+    return {'stages': stages, 'peak_rss_mib': peak_rss_mib()}
+
+def benchmark_scale(args: argparse.Namespace) -> int:
+    """End-to-end parse, JSON write, graph and database ingest of synthetic exports at growing scale."""
+    results: dict[str, Any] = {'engine': args.engine, 'preset': args.preset, 'runs': {}}
+    for matches in args.matches:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_directory = os.path.join(temp_dir, 'csv')
+            output_directory = os.path.join(temp_dir, 'out')
+            os.makedirs(output_directory)
+            start = time.perf_counter()
+            generate_exports(csv_directory, matches, seed=args.seed)
+            print(f"  {matches:,} matches, generated in {time.perf_counter() - start:.1f} s")
+
+            # A fresh process per run keeps each peak RSS separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                run = executor.submit(run_scale_pipeline, csv_directory, output_directory, args.engine,
+                                      args.chunk_size, args.graph_limit, args.preset).result()
+
+        peak = run['peak_rss_mib']
+        print(f"    peak RSS {'n/a' if peak is None else f'{peak:,.0f} MiB'}")
+        run_results: dict[str, Any] = {'peak_rss_mib': peak}
+        for stage, unit in SCALE_STAGES:
+            seconds, units = run['stages'][stage]
+            throughput = units / seconds if seconds else None
+            run_results[stage] = {'seconds': round(seconds, 3), unit: units,
+                                  f'{unit}_per_second': None if throughput is None else round(throughput, 1)}
+            if units:
+                print(f"    {stage:<8} {seconds:9.2f} s  {throughput:12,.1f} {unit}/s  ({units:,} {unit})")
+        results['runs'][str(matches)] = run_results
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        return compare_scale_results(results, args.baseline, args.tolerance)
+    return 0
+
+def compare_scale_results(results: dict[str, Any], baseline_file: str, tolerance: float) -> int:
+    """Flag stages whose throughput fell, or whose peak RSS grew, by more than tolerance against a saved run."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    for matches, run in results['runs'].items():
+        before = baseline['runs'].get(matches)
+        if before is None:
+            continue
+        for stage, unit in SCALE_STAGES:
+            old, new = before[stage].get(f'{unit}_per_second'), run[stage].get(f'{unit}_per_second')
+            if old and new and new < old * (1 - tolerance):
+                regressions.append(f"{matches} matches, {stage}: {new:,.1f} {unit}/s, was {old:,.1f}")
+        old, new = before.get('peak_rss_mib'), run.get('peak_rss_mib')
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{matches} matches, peak RSS: {new:,.0f} MiB, was {old:,.0f}")
+    if regressions:
+        print(f"\nRegressions against {baseline_file}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {baseline_file}.")
+    return 0
+
+def generate_synthetic_exports(args: argparse.Namespace) -> None:
+    """Write synthetic CRCON exports and their manifest, ready for `python main.py batch`."""
+    file_names = generate_exports(args.directory, args.matches, seed=args.seed, teams=args.teams)
+    print(f"Wrote {len(file_names):,} exports and {MANIFEST_FILENAME} to {args.directory}")
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Per-row vs bulk database load of parsed_jsons/')
+    ingest_parser.add_argument('--copies', type=int, default=20, help='How many times to repeat parsed_jsons/')
+    ingest_parser.add_argument('--repeat', type=int, default=3, help='Runs per loader; the fastest is reported')
+    ingest_parser.set_defaults(run=benchmark_ingest)
+
+    views_parser = subparsers.add_parser('views', help='TeamPlayers/PlayerHistory lookup latency on a synthetic history')
+    views_parser.add_argument('--players', type=int, default=100_000, help='Number of synthetic players')
+    views_parser.add_argument('--teams', type=int, default=400, help='Number of synthetic teams')
+    views_parser.add_argument('--lookups', type=int, default=5_000, help='Random player lookups per view')
+    views_parser.add_argument('--legacy-lookups', type=int, default=5, help='Lookups against the old correlated-subquery view (0 to skip)')
+    views_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic history')
+    views_parser.set_defaults(run=benchmark_views)
+
+    parse_parser = subparsers.add_parser('parse', help='Throughput of the CSV parse engines on Raw_csvs/')
+    parse_parser.add_argument('--repeat', type=int, default=5, help='Passes over Raw_csvs/ per engine; the fastest is reported')
+    parse_parser.set_defaults(run=benchmark_parse)
+
+    stream_parser = subparsers.add_parser('stream', help='Peak memory of in-memory vs streamed parsing of concatenated exports')
+    stream_parser.add_argument('--copies', type=int, nargs='+', default=[1, 4, 16], help='Export sizes, in copies of Raw_csvs/')
+    stream_parser.set_defaults(run=benchmark_stream)
+
+    archive_parser = subparsers.add_parser('archive', help='Season load from parsed JSON files vs the columnar archive')
+    archive_parser.add_argument('--copies', type=int, default=4, help='How many times to repeat parsed_jsons/')
+    archive_parser.add_argument('--repeat', type=int, default=3, help='Runs per reader; the fastest is reported')
+    archive_parser.set_defaults(run=benchmark_archive)
+
+    kill_graph_parser = subparsers.add_parser('kill-graph', help='Kill graph build, incremental update and rankings on a synthetic season')
+    kill_graph_parser.add_argument('--matches', type=int, default=3_000, help='Number of synthetic matches')
+    kill_graph_parser.add_argument('--players', type=int, default=10_000, help='Number of synthetic players')
+    kill_graph_parser.add_argument('--teams', type=int, default=100, help='Number of synthetic teams')
+    kill_graph_parser.add_argument('--new-matches', type=int, default=10, help='Matches added before the incremental update')
+    kill_graph_parser.add_argument('--limit', type=int, default=10, help='Rows per ranking')
+    kill_graph_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    kill_graph_parser.set_defaults(run=benchmark_kill_graph)
+
+    reports_parser = subparsers.add_parser('reports', help='Report latency on a synthetic season loaded through the bulk loader')
+    reports_parser.add_argument('--matches', type=int, default=10_000, help='Number of synthetic matches')
+    reports_parser.add_argument('--players', type=int, default=10_000, help='Number of synthetic players')
+    reports_parser.add_argument('--teams', type=int, default=100, help='Number of synthetic teams')
+    reports_parser.add_argument('--lookups', type=int, default=50, help='Runs per report')
+    reports_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    reports_parser.set_defaults(run=benchmark_reports)
+
+    concurrency_parser = subparsers.add_parser('concurrency', help='Ingest throughput and reader latency under concurrent load, default vs tuned connections')
+    concurrency_parser.add_argument('--base-matches', type=int, default=500, help='Matches loaded before the measurement')
+    concurrency_parser.add_argument('--batches', type=int, default=20, help='Ingest transactions during the measurement')
+    concurrency_parser.add_argument('--batch-size', type=int, default=5, help='Matches per ingest transaction')
+    concurrency_parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+    concurrency_parser.add_argument('--read-interval', type=float, default=0.01, help='Seconds each reader waits between reads')
+    concurrency_parser.add_argument('--players', type=int, default=10_000, help='Number of synthetic players')
+    concurrency_parser.add_argument('--teams', type=int, default=100, help='Number of synthetic teams')
+    concurrency_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    concurrency_parser.set_defaults(run=benchmark_concurrency)
+
+    api_parser = subparsers.add_parser('api', help='Stats API throughput and latency with and without the response cache')
+    api_parser.add_argument('--matches', type=int, default=2_000, help='Number of synthetic matches')
+    api_parser.add_argument('--players', type=int, default=10_000, help='Number of synthetic players')
+    api_parser.add_argument('--teams', type=int, default=100, help='Number of synthetic teams')
+    api_parser.add_argument('--clients', type=int, default=50, help='Concurrent HTTP clients')
+    api_parser.add_argument('--requests', type=int, default=100, help='Requests per client')
+    api_parser.add_argument('--workers', type=int, default=4, help='Database reader threads')
+    api_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    api_parser.set_defaults(run=benchmark_api)
+
+    dashboard_parser = subparsers.add_parser('dashboard', help='Season dashboard rendering for a league, fresh figures vs a reused template')
+    dashboard_parser.add_argument('--matches', type=int, default=2_000, help='Number of synthetic matches')
+    dashboard_parser.add_argument('--players', type=int, default=4_000, help='Number of synthetic players')
+    dashboard_parser.add_argument('--teams', type=int, default=40, help='Number of synthetic teams')
+    dashboard_parser.add_argument('--preset', choices=list(RENDER_PRESETS), default='preview', help='Render preset')
+    dashboard_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    dashboard_parser.set_defaults(run=benchmark_dashboard)
+
+    ratings_parser = subparsers.add_parser('ratings', help='Rating replay, incremental and backfill throughput on a synthetic season')
+    ratings_parser.add_argument('--matches', type=int, default=5_000, help='Number of synthetic matches')
+    ratings_parser.add_argument('--players', type=int, default=10_000, help='Number of synthetic players')
+    ratings_parser.add_argument('--teams', type=int, default=100, help='Number of synthetic teams')
+    ratings_parser.add_argument('--new-matches', type=int, default=100, help='Matches loaded one at a time after the season')
+    ratings_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic season')
+    ratings_parser.set_defaults(run=benchmark_ratings)
+
+    scale_parser = subparsers.add_parser('scale', help='Parse, JSON, graph and ingest throughput and peak RSS on synthetic exports')
+    scale_parser.add_argument('--matches', type=int, nargs='+', default=[10, 1_000, 10_000], help='Run sizes in matches')
+    scale_parser.add_argument('--engine', choices=PARSE_ENGINES, default='rows', help='CSV parse engine')
+    scale_parser.add_argument('--chunk-size', type=int, default=100, help='Matches per bulk load')
+    scale_parser.add_argument('--graph-limit', type=int, default=10, help='Matches graphed per run; graphs take seconds each')
+    scale_parser.add_argument('--preset', choices=list(RENDER_PRESETS), default='preview', help='Render preset for the graphs')
+    scale_parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic exports')
+    scale_parser.add_argument('--output', help='Write the results to this JSON file')
+    scale_parser.add_argument('--baseline', help='Earlier --output file to compare against; exits 1 on a regression')
+    scale_parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput drop or RSS growth against the baseline')
+    scale_parser.set_defaults(run=benchmark_scale)
+
+    generate_parser = subparsers.add_parser('generate', help='Write seeded synthetic CRCON exports and a manifest')
+    generate_parser.add_argument('directory', help='Folder for the CSV files and manifest.json')
+    generate_parser.add_argument('--matches', type=int, default=100, help='Number of matches')
+    generate_parser.add_argument('--teams', type=int, default=20, help='Number of teams')
+    generate_parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    generate_parser.set_defaults(run=generate_synthetic_exports)
+
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    return args.run(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import copy
+import json
+import os
+import pytest
+import db_operations
+from match_output import match_files, match_timestamp
+
+PARSED_JSONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parsed_jsons')
+RAW_CSVS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Raw_csvs')
+# Columns that depend on when or in what order rows were written rather than on the matches loaded
+UNSTABLE_COLUMNS: set[str] = {'MatchPerformanceID', 'NameHistoryID', 'AffiliationID', 'CheckpointID', 'ParseDate', 'MapID'}
+# Surrogate keys compared by the name they stand for
+REFERENCE_COLUMNS: dict[str, tuple[str, str]] = {
+    'ResultID': ('ParsedResults', 'FileName'),
+    'TeamID': ('Teams', 'TeamName'),
+    'WeaponID': ('Weapons', 'WeaponName'),
+}
+
+def load_bundled_matches() -> list[tuple[str, dict]]:
+    """Every bundled parsed JSON as (file name, match dict), in match date order."""
+    matches = []
+    for file_name in match_files(PARSED_JSONS, ('.json',)):
+        with open(os.path.join(PARSED_JSONS, file_name), 'r', encoding='utf-8') as f:
+            matches.append((file_name, json.load(f)))
+    return sorted(matches, key=lambda match: (match_timestamp(match[1]['Match Date']), match[0]))
+
+@pytest.fixture
+def bundled_matches():
+    return load_bundled_matches()
+
+@pytest.fixture
+def connect_db(tmp_path):
+    """Open fresh databases under tmp_path, closing them after the test."""
+    connections = []
+
+    def connect(name='test.db'):
+        conn = db_operations.connect(str(tmp_path / name))
+        db_operations.create_tables(conn)
+        conn.commit()
+        connections.append(conn)
+        return conn
+
+    yield connect
+    for conn in connections:
+        conn.close()
+
+@pytest.fixture
+def conn(connect_db):
+    return connect_db()
+
+def table_snapshot(conn, tables: list[str] | None = None) -> dict[str, list[tuple]]:
+    """Sorted rows of each table without UNSTABLE_COLUMNS, with floats rounded to 6 places."""
+    if tables is None:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT IN ('sqlite_sequence', 'IngestState')")]
+    names = {column: dict(conn.execute(f'SELECT {column}, {name} FROM {table}'))
+             for column, (table, name) in REFERENCE_COLUMNS.items()}
+    snapshot = {}
+    for table in tables:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})') if row[1] not in UNSTABLE_COLUMNS]
+        rows = []
+        for row in conn.execute(f'SELECT {", ".join(columns)} FROM {table}'):
+            rows.append(tuple(names[column].get(value) if column in names
+                              else round(value, 6) if isinstance(value, float) else value
+                              for column, value in zip(columns, row)))
+        snapshot[table] = sorted(rows, key=repr)
+    return snapshot
+
+@pytest.fixture
+def snapshot():
+    return table_snapshot
+
+@pytest.fixture
+def make_match(bundled_matches):
+    """Copy a bundled match with a new Match Date and, optionally, one player renamed."""
+    template = bundled_matches[0][1]
+
+    def make(match_date, player_id=None, player_name=None):
+        data = copy.deepcopy(template)
+        data['Match Date'] = match_date
+        data.pop('Source Hash', None)
+        data.pop('Analysis', None)
+        if player_id is not None:
+            for player in template_players(data):
+                if player['PlayerID'] == player_id:
+                    player['Name'] = player_name
+        return data
+
+    return make
+
+def template_players(data: dict) -> list[dict]:
+    return [player for side in ['Axis', 'Allies'] for group in ['Infantry', 'Artillery', 'Armor']
+            for player in data[side][group]['Players']] + data['Spectators']
@@ -2,12 +2,69 @@ import os
 import json
 import sqlite3
 from datetime import datetime
+import instrumentation
+import ratings
+from weapon_data import WeaponData
+from match_analysis import MatchAnalysis
+from match_output import payload_hash, match_timestamp, match_files, TIMESTAMP_FORMAT
+from stream_parser import NDJSON_EXTENSION, read_ndjson_match, ndjson_payload_hash
+
+# Per-player rate and streak metrics: (PlayerData.to_dict key and MatchPerformance column, SQL type)
+METRIC_COLUMNS = [
+    ('MaxKillStreak', 'INTEGER'),
+    ('KillsPerMinute', 'REAL'),
+    ('DeathsPerMinute', 'REAL'),
+    ('MaxDeathStreak', 'INTEGER'),
+    ('MaxTKStreak', 'INTEGER'),
+    ('DeathByTK', 'INTEGER'),
+    ('DeathByTKStreak', 'INTEGER'),
+    ('LongestLifeMinutes', 'INTEGER'),
+    ('ShortestLifeSeconds', 'INTEGER'),
+    # Points are kept per match so a match can be served back in the MatchResults shape
+    ('OffensivePoints', 'INTEGER'),
+    ('DefensivePoints', 'INTEGER'),
+    ('SupportPoints', 'INTEGER'),
+    ('MachineGunKills', 'INTEGER'),
+]
+METRIC_NAMES = [name for name, _ in METRIC_COLUMNS]
+POINT_NAMES = ['OffensivePoints', 'DefensivePoints', 'SupportPoints', 'MachineGunKills']
+
+# PlayerWeaponGroupAggregates keeps machine gun kills as one more weapon group
+MACHINE_GUN_GROUP = 'Machine Guns'
 
 # Define paths
 base_folder = os.getcwd()
 parsed_csvs_folder = os.path.join(base_folder, "parsed_jsons")
 db_path = os.path.join(base_folder, "hell_let_loose.db")
 
+# WAL lets readers keep reading while one writer ingests; with WAL, synchronous=NORMAL
+# only syncs at checkpoints, so a power cut can lose the last commits but never corrupts
+CONNECTION_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -65536),
+    ('temp_store', 'MEMORY'),
+    ('mmap_size', 268435456),
+    ('foreign_keys', 'ON'),
+]
+# Seconds a connection waits for another writer to commit before raising "database is locked"
+BUSY_TIMEOUT = 30
+
+def connect(path=None, read_only=False, cached_statements=128, check_same_thread=True):
+    """Open a database connection with WAL and the tuned pragmas.
+
+    Every connection to the database should come from here. Any number of read
+    connections can run while one connection writes.
+    """
+    conn = sqlite3.connect(path or db_path, timeout=BUSY_TIMEOUT, cached_statements=cached_statements,
+                           check_same_thread=check_same_thread)
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    instrumentation.trace_connection(conn)
+    return conn
+
 def create_tables(conn):
     cursor = conn.cursor()
     
@@ -38,10 +95,19 @@ def create_tables(conn):
             FileName TEXT UNIQUE,
             ParseDate TEXT,
             MapName TEXT,
-            MatchDate TEXT
+            MatchDate TEXT,
+            SourceHash TEXT,
+            PayloadHash TEXT,
+            MatchTimestamp TEXT
         )
     ''')
     
+    # Databases created before content hashing get the hash columns added
+    _ensure_column(cursor, 'ParsedResults', 'SourceHash', 'TEXT')
+    _ensure_column(cursor, 'ParsedResults', 'PayloadHash', 'TEXT')
+    # MatchDate is free text; MatchTimestamp is the same date as 'YYYY-MM-DD HH:MM:SS', set at ingest
+    _ensure_column(cursor, 'ParsedResults', 'MatchTimestamp', 'TEXT')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS Maps (
             MapID INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -67,6 +133,30 @@ def create_tables(conn):
             FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
         )
     ''')
+    
+    # Metric columns are added to new and existing databases alike
+    for column, column_type in METRIC_COLUMNS:
+        _ensure_column(cursor, 'MatchPerformance', column, column_type)
+    # A copy of ParsedResults.MatchTimestamp, so per player and per team time ranges are index range scans
+    _ensure_column(cursor, 'MatchPerformance', 'MatchTimestamp', 'TEXT')
+    # Where PlayerGroup came from (player_data.GROUP_SOURCES); NULL for matches parsed before it was recorded
+    _ensure_column(cursor, 'MatchPerformance', 'GroupSource', 'TEXT')
+    
+    # Who killed whom, from the Nemesis and Victim columns. An ID is NULL when the
+    # name could not be matched to a player in the same match.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerKillEdges (
+            ResultID INTEGER,
+            KillerID TEXT,
+            VictimID TEXT,
+            KillerName TEXT,
+            VictimName TEXT,
+            Kills INTEGER,
+            FOREIGN KEY (ResultID) REFERENCES ParsedResults (ResultID),
+            FOREIGN KEY (KillerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (VictimID) REFERENCES Players (PlayerID)
+        )
+    ''')
 
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS PlayerTeamAffiliations (
@@ -93,6 +183,249 @@ def create_tables(conn):
         )
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Weapons (
+            WeaponID INTEGER PRIMARY KEY AUTOINCREMENT,
+            WeaponName TEXT UNIQUE,
+            Side TEXT,
+            Faction TEXT,
+            WeaponGroup TEXT,
+            IsMachineGun INTEGER DEFAULT 0
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS WeaponKills (
+            ResultID INTEGER,
+            PlayerID TEXT,
+            WeaponID INTEGER,
+            Kills INTEGER,
+            PRIMARY KEY (ResultID, PlayerID, WeaponID),
+            FOREIGN KEY (ResultID) REFERENCES ParsedResults (ResultID),
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (WeaponID) REFERENCES Weapons (WeaponID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS WeaponDeaths (
+            ResultID INTEGER,
+            PlayerID TEXT,
+            WeaponID INTEGER,
+            Deaths INTEGER,
+            PRIMARY KEY (ResultID, PlayerID, WeaponID),
+            FOREIGN KEY (ResultID) REFERENCES ParsedResults (ResultID),
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (WeaponID) REFERENCES Weapons (WeaponID)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Latest team and name per player, maintained by the ingest path
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerCurrentTeam (
+            PlayerID TEXT PRIMARY KEY,
+            AffiliationID INTEGER,
+            TeamID INTEGER,
+            LastSeen TEXT,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (AffiliationID) REFERENCES PlayerTeamAffiliations (AffiliationID),
+            FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerCurrentName (
+            PlayerID TEXT PRIMARY KEY,
+            NameHistoryID INTEGER,
+            PlayerName TEXT,
+            LastSeen TEXT,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (NameHistoryID) REFERENCES PlayerNameHistory (NameHistoryID)
+        )
+    ''')
+    
+    # Materialized aggregates over MatchPerformance, maintained per match
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerAggregates (
+            PlayerID TEXT PRIMARY KEY,
+            Matches INTEGER DEFAULT 0,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            CombatEffectiveness INTEGER DEFAULT 0,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TeamAggregates (
+            TeamID INTEGER PRIMARY KEY,
+            Matches INTEGER DEFAULT 0,
+            PlayerAppearances INTEGER DEFAULT 0,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            CombatEffectiveness INTEGER DEFAULT 0,
+            FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MapAggregates (
+            MapName TEXT,
+            Side TEXT,
+            Matches INTEGER DEFAULT 0,
+            PlayerAppearances INTEGER DEFAULT 0,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            CombatEffectiveness INTEGER DEFAULT 0,
+            PRIMARY KEY (MapName, Side)
+        )
+    ''')
+    
+    # CRCON exports carry no match result, so a side "wins" when it got more kills than the other
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TeamMapAggregates (
+            TeamID INTEGER,
+            MapName TEXT,
+            Matches INTEGER DEFAULT 0,
+            KillWins INTEGER DEFAULT 0,
+            KillLosses INTEGER DEFAULT 0,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            PRIMARY KEY (TeamID, MapName),
+            FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerWeaponAggregates (
+            PlayerID TEXT,
+            WeaponID INTEGER,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            PRIMARY KEY (PlayerID, WeaponID),
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID),
+            FOREIGN KEY (WeaponID) REFERENCES Weapons (WeaponID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerWeaponGroupAggregates (
+            WeaponGroup TEXT,
+            PlayerID TEXT,
+            Kills INTEGER DEFAULT 0,
+            PRIMARY KEY (WeaponGroup, PlayerID),
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS WeaponAggregates (
+            WeaponID INTEGER PRIMARY KEY,
+            Kills INTEGER DEFAULT 0,
+            Deaths INTEGER DEFAULT 0,
+            FOREIGN KEY (WeaponID) REFERENCES Weapons (WeaponID)
+        )
+    ''')
+    
+    # Bumped by every load, retraction and rebuild so readers can tell when their cached results are stale
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS IngestState (
+            StateID INTEGER PRIMARY KEY CHECK (StateID = 1),
+            Generation INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO IngestState (StateID, Generation) VALUES (1, 0)')
+    
+    # Cross-match ratings, maintained by ratings.py as matches are loaded and retracted
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerRatings (
+            PlayerID TEXT PRIMARY KEY,
+            Rating REAL NOT NULL,
+            Matches INTEGER NOT NULL,
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TeamRatings (
+            TeamID INTEGER PRIMARY KEY,
+            Rating REAL NOT NULL,
+            Matches INTEGER NOT NULL,
+            FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerRatingHistory (
+            ResultID INTEGER,
+            PlayerID TEXT,
+            MatchTimestamp TEXT,
+            TeamID INTEGER,
+            RatingBefore REAL,
+            RatingAfter REAL,
+            PRIMARY KEY (ResultID, PlayerID),
+            FOREIGN KEY (ResultID) REFERENCES ParsedResults (ResultID),
+            FOREIGN KEY (PlayerID) REFERENCES Players (PlayerID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TeamRatingHistory (
+            ResultID INTEGER,
+            Side TEXT,
+            MatchTimestamp TEXT,
+            TeamID INTEGER,
+            RatingBefore REAL,
+            RatingAfter REAL,
+            KillShare REAL,
+            PRIMARY KEY (ResultID, Side),
+            FOREIGN KEY (ResultID) REFERENCES ParsedResults (ResultID),
+            FOREIGN KEY (TeamID) REFERENCES Teams (TeamID)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Snapshots of every rating, so a backfilled or retracted match is replayed from the last one before it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS RatingCheckpoints (
+            CheckpointID INTEGER PRIMARY KEY AUTOINCREMENT,
+            MatchTimestamp TEXT,
+            ResultID INTEGER
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PlayerRatingCheckpoints (
+            CheckpointID INTEGER,
+            PlayerID TEXT,
+            Rating REAL,
+            Matches INTEGER,
+            PRIMARY KEY (CheckpointID, PlayerID),
+            FOREIGN KEY (CheckpointID) REFERENCES RatingCheckpoints (CheckpointID)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS TeamRatingCheckpoints (
+            CheckpointID INTEGER,
+            TeamID INTEGER,
+            Rating REAL,
+            Matches INTEGER,
+            PRIMARY KEY (CheckpointID, TeamID),
+            FOREIGN KEY (CheckpointID) REFERENCES RatingCheckpoints (CheckpointID)
+        ) WITHOUT ROWID
+    ''')
+    
+    # The last match folded into the ratings, in (MatchTimestamp, ResultID) order
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS RatingState (
+            StateID INTEGER PRIMARY KEY CHECK (StateID = 1),
+            MatchTimestamp TEXT,
+            ResultID INTEGER,
+            MatchesSinceCheckpoint INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO RatingState (StateID) VALUES (1)')
+    
     # Create indexes
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_player_team_affiliation 
@@ -109,37 +442,127 @@ def create_tables(conn):
         ON PlayerNameHistory (PlayerID)
     ''')
     
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_name_history_player_last_seen
+        ON PlayerNameHistory (PlayerID, LastSeen)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_name_history_player_first_seen
+        ON PlayerNameHistory (PlayerID, FirstSeen)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_team_affiliation_last_seen
+        ON PlayerTeamAffiliations (PlayerID, LastSeen)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_current_team_team
+        ON PlayerCurrentTeam (TeamID)
+    ''')
+    
+    # Covering indexes so weapon aggregates never leave the index b-trees
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_weapon_kills_weapon
+        ON WeaponKills (WeaponID, ResultID, PlayerID, Kills)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_weapon_deaths_weapon
+        ON WeaponDeaths (WeaponID, ResultID, PlayerID, Deaths)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_weapons_machine_gun
+        ON Weapons (IsMachineGun, WeaponID)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_match_performance_result_player
+        ON MatchPerformance (ResultID, PlayerID, TeamID)
+    ''')
+    
+    # (PlayerID, MatchTimestamp) also serves every lookup by PlayerID alone
+    cursor.execute('DROP INDEX IF EXISTS idx_match_performance_player')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_match_performance_player_time
+        ON MatchPerformance (PlayerID, MatchTimestamp)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_match_performance_team_time
+        ON MatchPerformance (TeamID, MatchTimestamp)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_parsed_results_match_time
+        ON ParsedResults (MatchTimestamp)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_rating_history_player_time
+        ON PlayerRatingHistory (PlayerID, MatchTimestamp)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_team_rating_history_team_time
+        ON TeamRatingHistory (TeamID, MatchTimestamp)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_ratings_rating
+        ON PlayerRatings (Rating, Matches)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_weapon_aggregates_weapon
+        ON PlayerWeaponAggregates (WeaponID, Kills, PlayerID)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_weapon_group_aggregates_kills
+        ON PlayerWeaponGroupAggregates (WeaponGroup, Kills, PlayerID)
+    ''')
+    
+    # Covering indexes for head-to-head lookups in either direction
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kill_edges_killer_victim
+        ON PlayerKillEdges (KillerID, VictimID, Kills, ResultID)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kill_edges_victim_killer
+        ON PlayerKillEdges (VictimID, KillerID, Kills, ResultID)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kill_edges_result
+        ON PlayerKillEdges (ResultID)
+    ''')
+    
+    # A source CSV or match payload can only be loaded once
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_parsed_results_source_hash
+        ON ParsedResults (SourceHash) WHERE SourceHash IS NOT NULL
+    ''')
+    
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_parsed_results_payload_hash
+        ON ParsedResults (PayloadHash) WHERE PayloadHash IS NOT NULL
+    ''')
+    
+    seed_weapons(conn)
+    
     # Create views
+    _drop_outdated_view(cursor, 'TeamPlayers', 'PlayerCurrentTeam')
+    _drop_outdated_view(cursor, 'PlayerHistory', 'PlayerCurrentName')
+    
     cursor.execute('''
         CREATE VIEW IF NOT EXISTS TeamPlayers AS
-        WITH LatestTeam AS (
-            SELECT DISTINCT
-                PlayerID,
-                TeamID,
-                FirstSeen,
-                LastSeen,
-                MatchesPlayed
-            FROM PlayerTeamAffiliations pta
-            WHERE (PlayerID, LastSeen) IN (
-                SELECT PlayerID, MAX(LastSeen)
-                FROM PlayerTeamAffiliations
-                GROUP BY PlayerID
-            )
-        ),
-        LatestName AS (
-            SELECT DISTINCT
-                PlayerID,
-                PlayerName
-            FROM PlayerNameHistory pnh
-            WHERE (PlayerID, LastSeen) IN (
-                SELECT PlayerID, MAX(LastSeen)
-                FROM PlayerNameHistory
-                GROUP BY PlayerID
-            )
-        )
-        SELECT DISTINCT
+        SELECT 
             p.PlayerID,
-            ln.PlayerName as CurrentName,
+            cn.PlayerName as CurrentName,
             t.TeamName,
             p.TotalMatches,
             p.TotalKills,
@@ -147,20 +570,20 @@ def create_tables(conn):
             p.AverageKills,
             p.AverageDeaths,
             p.AverageCombatEffectiveness,
-            lt.FirstSeen as JoinedTeam,
-            lt.LastSeen as LastPlayed,
-            lt.MatchesPlayed as MatchesWithTeam
+            pta.FirstSeen as JoinedTeam,
+            pta.LastSeen as LastPlayed,
+            pta.MatchesPlayed as MatchesWithTeam
         FROM Players p
-        JOIN LatestTeam lt ON p.PlayerID = lt.PlayerID
-        JOIN Teams t ON lt.TeamID = t.TeamID
-        JOIN LatestName ln ON p.PlayerID = ln.PlayerID
-        GROUP BY p.PlayerID
+        JOIN PlayerCurrentTeam ct ON p.PlayerID = ct.PlayerID
+        JOIN PlayerTeamAffiliations pta ON ct.AffiliationID = pta.AffiliationID
+        JOIN Teams t ON ct.TeamID = t.TeamID
+        JOIN PlayerCurrentName cn ON p.PlayerID = cn.PlayerID
     ''')
     
     cursor.execute('''
         CREATE VIEW IF NOT EXISTS PlayerHistory AS
         SELECT 
-            pnh.PlayerName,
+            cn.PlayerName,
             p.PlayerID,
             t.TeamName,
             pta.FirstSeen as JoinedTeam,
@@ -169,78 +592,318 @@ def create_tables(conn):
         FROM PlayerTeamAffiliations pta
         JOIN Teams t ON pta.TeamID = t.TeamID
         JOIN Players p ON pta.PlayerID = p.PlayerID
-        JOIN PlayerNameHistory pnh ON p.PlayerID = pnh.PlayerID
-        WHERE (pnh.PlayerID, pnh.LastSeen) IN (
-            SELECT PlayerID, MAX(LastSeen)
-            FROM PlayerNameHistory
-            GROUP BY PlayerID
-        )
+        JOIN PlayerCurrentName cn ON p.PlayerID = cn.PlayerID
         ORDER BY pta.LastSeen DESC
     ''')
     
-    conn.commit()
-
-def insert_or_update_team(conn, team_name):
-    cursor = conn.cursor()
-    cursor.execute('INSERT OR IGNORE INTO Teams (TeamName) VALUES (?)', (team_name,))
-    cursor.execute('SELECT TeamID FROM Teams WHERE TeamName = ?', (team_name,))
-    return cursor.fetchone()[0]
-
-def update_player_name_history(conn, player_id: str, player_name: str):
-    """Update the player's name history."""
-    cursor = conn.cursor()
-    current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS PlayerSummary AS
+        SELECT 
+            pa.PlayerID,
+            p.PlayerName,
+            pa.Matches,
+            pa.Kills,
+            pa.Deaths,
+            pa.CombatEffectiveness,
+            CAST(pa.Kills AS REAL) / pa.Matches AS AverageKills,
+            CAST(pa.Deaths AS REAL) / pa.Matches AS AverageDeaths,
+            CAST(pa.CombatEffectiveness AS REAL) / pa.Matches AS AverageCombatEffectiveness
+        FROM PlayerAggregates pa
+        JOIN Players p ON pa.PlayerID = p.PlayerID
+    ''')
     
-    # Get the player's most recent name
     cursor.execute('''
-        SELECT PlayerName, NameHistoryID
-        FROM PlayerNameHistory
-        WHERE PlayerID = ?
-        ORDER BY LastSeen DESC
-        LIMIT 1
-    ''', (player_id,))
+        CREATE VIEW IF NOT EXISTS TeamSummary AS
+        SELECT 
+            ta.TeamID,
+            t.TeamName,
+            ta.Matches,
+            ta.PlayerAppearances,
+            ta.Kills,
+            ta.Deaths,
+            ta.CombatEffectiveness,
+            CAST(ta.Kills AS REAL) / ta.Matches AS AverageKills,
+            CAST(ta.Deaths AS REAL) / ta.Matches AS AverageDeaths
+        FROM TeamAggregates ta
+        JOIN Teams t ON ta.TeamID = t.TeamID
+    ''')
     
-    last_record = cursor.fetchone()
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS MapSummary AS
+        SELECT 
+            MapName,
+            Side,
+            Matches,
+            PlayerAppearances,
+            Kills,
+            Deaths,
+            CombatEffectiveness,
+            CAST(Kills AS REAL) / Matches AS AverageKills,
+            CAST(Deaths AS REAL) / Matches AS AverageDeaths
+        FROM MapAggregates
+    ''')
     
-    if last_record is None:
-        # First time we've seen this player
-        cursor.execute('''
-            INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
-            VALUES (?, ?, ?, ?)
-        ''', (player_id, player_name, current_date, current_date))
-    elif last_record[0] != player_name:
-        # Player has changed their name
-        cursor.execute('''
-            INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
-            VALUES (?, ?, ?, ?)
-        ''', (player_id, player_name, current_date, current_date))
-    else:
-        # Update LastSeen for the current name
-        cursor.execute('''
-            UPDATE PlayerNameHistory
-            SET LastSeen = ?
-            WHERE NameHistoryID = ?
-        ''', (current_date, last_record[1]))
-
-
-def insert_or_update_player(conn, player_data):
-    """Updated to include name history tracking."""
-    cursor = conn.cursor()
+    # Matches loaded before MatchTimestamp existed get it from MatchDate, and the history tables are restamped
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM ParsedResults WHERE MatchTimestamp IS NULL)')
+    if cursor.fetchone()[0]:
+        backfill_match_timestamps(conn)
     
-    cursor.execute('''
-        INSERT OR IGNORE INTO Players (PlayerID, PlayerName, TotalKills, TotalDeaths, TotalMatches, TotalCombatEffectiveness)
-        VALUES (?, ?, 0, 0, 0, 0)
-    ''', (player_data['PlayerID'], player_data['Name']))
+    # Databases created before the current-state tables existed get them filled once
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM PlayerCurrentTeam)')
+    has_current_team = cursor.fetchone()[0]
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM PlayerCurrentName)')
+    if not has_current_team and not cursor.fetchone()[0]:
+        refresh_current_player_state(conn)
     
+    # Databases created before the aggregate tables existed get them filled once
     cursor.execute('''
-        UPDATE Players SET
-        TotalKills = TotalKills + ?,
-        TotalDeaths = TotalDeaths + ?,
-        TotalMatches = TotalMatches + 1,
-        TotalCombatEffectiveness = TotalCombatEffectiveness + ?,
-        AverageKills = ROUND(CAST((TotalKills + ?) AS REAL) / (TotalMatches + 1), 1),
-        AverageDeaths = ROUND(CAST((TotalDeaths + ?) AS REAL) / (TotalMatches + 1), 1),
-        AverageCombatEffectiveness = ROUND(CAST((TotalCombatEffectiveness + ?) AS REAL) / (TotalMatches + 1), 1)
+        SELECT (NOT EXISTS (SELECT 1 FROM PlayerAggregates) OR NOT EXISTS (SELECT 1 FROM TeamMapAggregates))
+               AND EXISTS (SELECT 1 FROM MatchPerformance),
+               (NOT EXISTS (SELECT 1 FROM PlayerWeaponAggregates) OR NOT EXISTS (SELECT 1 FROM WeaponAggregates)
+                OR NOT EXISTS (SELECT 1 FROM PlayerWeaponGroupAggregates))
+               AND EXISTS (SELECT 1 FROM WeaponKills)
+    ''')
+    if any(cursor.fetchone()):
+        _rebuild_aggregate_tables(conn)
+    
+    # Databases created before the rating tables existed get their matches rated once
+    cursor.execute('SELECT ResultID IS NULL AND EXISTS (SELECT 1 FROM ParsedResults) FROM RatingState')
+    if cursor.fetchone()[0]:
+        ratings.replay_ratings(conn)
+    
+    conn.commit()
+
+def _ensure_column(cursor, table, column, definition):
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _drop_outdated_view(cursor, view_name, required_table):
+    """Drop a view whose stored definition predates required_table so it can be recreated."""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (view_name,))
+    row = cursor.fetchone()
+    if row is not None and required_table not in row[0]:
+        cursor.execute(f'DROP VIEW {view_name}')
+
+def refresh_current_player_state(conn, player_ids=None):
+    """Recompute PlayerCurrentTeam and PlayerCurrentName from the history tables.
+
+    Used to fill the tables for existing databases and after a retraction; normal
+    ingest keeps them current row by row. Limited to player_ids when given.
+    """
+    cursor = conn.cursor()
+    player_filter = ''
+    if player_ids is not None:
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS RefreshPlayers (PlayerID TEXT PRIMARY KEY)')
+        cursor.execute('DELETE FROM temp.RefreshPlayers')
+        cursor.executemany('INSERT OR IGNORE INTO RefreshPlayers (PlayerID) VALUES (?)', ((player_id,) for player_id in player_ids))
+        player_filter = 'WHERE PlayerID IN (SELECT PlayerID FROM RefreshPlayers)'
+
+    for table in ['PlayerCurrentTeam', 'PlayerCurrentName']:
+        cursor.execute(f'DELETE FROM {table} {player_filter}')
+
+    cursor.execute(f'''
+        INSERT INTO PlayerCurrentTeam (PlayerID, AffiliationID, TeamID, LastSeen)
+        SELECT PlayerID, AffiliationID, TeamID, LastSeen
+        FROM (
+            SELECT PlayerID, AffiliationID, TeamID, LastSeen,
+                   ROW_NUMBER() OVER (PARTITION BY PlayerID ORDER BY LastSeen DESC, AffiliationID DESC) AS Recency
+            FROM PlayerTeamAffiliations
+            {player_filter}
+        )
+        WHERE Recency = 1
+    ''')
+    cursor.execute(f'''
+        INSERT INTO PlayerCurrentName (PlayerID, NameHistoryID, PlayerName, LastSeen)
+        SELECT PlayerID, NameHistoryID, PlayerName, LastSeen
+        FROM (
+            SELECT PlayerID, NameHistoryID, PlayerName, LastSeen,
+                   ROW_NUMBER() OVER (PARTITION BY PlayerID ORDER BY LastSeen DESC, NameHistoryID DESC) AS Recency
+            FROM PlayerNameHistory
+            {player_filter}
+        )
+        WHERE Recency = 1
+    ''')
+
+def match_played_at(match_date):
+    """MatchTimestamp for a Match Date; the current time when the date cannot be read."""
+    return match_timestamp(match_date) or datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def backfill_match_timestamps(conn):
+    """Set MatchTimestamp on matches loaded before it existed and restamp the history tables.
+
+    FirstSeen and LastSeen were the time of loading; they become the first and last match
+    timestamps of each team affiliation and of each run of a name. A match whose date cannot
+    be read keeps its load time.
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT ResultID, MatchDate, ParseDate FROM ParsedResults WHERE MatchTimestamp IS NULL')
+    cursor.executemany('UPDATE ParsedResults SET MatchTimestamp = ? WHERE ResultID = ?', [
+        (match_timestamp(match_date) or parse_date or match_played_at(None), result_id)
+        for result_id, match_date, parse_date in cursor.fetchall()
+    ])
+    cursor.execute('''
+        UPDATE MatchPerformance SET MatchTimestamp = pr.MatchTimestamp
+        FROM ParsedResults pr
+        WHERE MatchPerformance.ResultID = pr.ResultID AND MatchPerformance.MatchTimestamp IS NULL
+    ''')
+    cursor.execute('''
+        UPDATE PlayerTeamAffiliations SET FirstSeen = s.FirstSeen, LastSeen = s.LastSeen
+        FROM (
+            SELECT PlayerID, TeamID, MIN(MatchTimestamp) AS FirstSeen, MAX(MatchTimestamp) AS LastSeen
+            FROM MatchPerformance
+            WHERE TeamID IS NOT NULL
+            GROUP BY PlayerID, TeamID
+        ) AS s
+        WHERE PlayerTeamAffiliations.PlayerID = s.PlayerID AND PlayerTeamAffiliations.TeamID = s.TeamID
+    ''')
+    # A name can come back after a change, so each history row is restamped from the matches of its
+    # own run: the n-th run of a name, in order of play, goes to the n-th history row with that name
+    cursor.execute('SELECT PlayerID, PlayerName, MatchTimestamp FROM MatchPerformance ORDER BY PlayerID, MatchTimestamp, ResultID')
+    name_runs = {}
+    for player_id, player_name, played_at in cursor.fetchall():
+        runs = name_runs.setdefault(player_id, [])
+        if runs and runs[-1][0] == player_name:
+            runs[-1][2] = played_at
+        else:
+            runs.append([player_name, played_at, played_at])
+    cursor.execute('SELECT NameHistoryID, PlayerID, PlayerName FROM PlayerNameHistory ORDER BY FirstSeen, NameHistoryID')
+    history_rows = {}
+    for name_history_id, player_id, player_name in cursor.fetchall():
+        history_rows.setdefault((player_id, player_name), []).append(name_history_id)
+
+    updates = []
+    inserts = []
+    for player_id, runs in name_runs.items():
+        for player_name, first_seen, last_seen in runs:
+            name_history_ids = history_rows.get((player_id, player_name))
+            if name_history_ids:
+                updates.append((first_seen, last_seen, name_history_ids.pop(0)))
+            else:
+                inserts.append((player_id, player_name, first_seen, last_seen))
+    cursor.executemany('UPDATE PlayerNameHistory SET FirstSeen = ?, LastSeen = ? WHERE NameHistoryID = ?', updates)
+    cursor.executemany('''
+        INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
+        VALUES (?, ?, ?, ?)
+    ''', inserts)
+    # Rows left over repeat a name no run of matches accounts for and would keep their load time
+    cursor.executemany('DELETE FROM PlayerNameHistory WHERE NameHistoryID = ?', [
+        (name_history_id,)
+        for (player_id, _), name_history_ids in history_rows.items() if player_id in name_runs
+        for name_history_id in name_history_ids
+    ])
+    refresh_current_player_state(conn)
+
+def _set_current_name(cursor, player_id, name_history_id, player_name, last_seen):
+    cursor.execute('''
+        INSERT INTO PlayerCurrentName (PlayerID, NameHistoryID, PlayerName, LastSeen)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(PlayerID) DO UPDATE SET
+            NameHistoryID = excluded.NameHistoryID,
+            PlayerName = excluded.PlayerName,
+            LastSeen = excluded.LastSeen
+        WHERE excluded.LastSeen >= PlayerCurrentName.LastSeen
+    ''', (player_id, name_history_id, player_name, last_seen))
+
+def seed_weapons(conn):
+    """Fill the Weapons dimension from WeaponData."""
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO Weapons (WeaponName, Side, Faction, WeaponGroup)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(WeaponName) DO UPDATE SET
+            Side = excluded.Side,
+            Faction = excluded.Faction,
+            WeaponGroup = excluded.WeaponGroup
+    ''', (
+        (weapon, ref['side'], ref['faction'], ref['group'])
+        for weapon, ref in WeaponData.WEAPONS.items()
+    ))
+    cursor.executemany('INSERT OR IGNORE INTO Weapons (WeaponName) VALUES (?)',
+                       ((weapon,) for weapon in WeaponData.MACHINE_GUNS))
+    cursor.executemany('UPDATE Weapons SET IsMachineGun = 1 WHERE WeaponName = ?',
+                       ((weapon,) for weapon in WeaponData.MACHINE_GUNS))
+
+def insert_or_update_team(conn, team_name):
+    cursor = conn.cursor()
+    cursor.execute('INSERT OR IGNORE INTO Teams (TeamName) VALUES (?)', (team_name,))
+    cursor.execute('SELECT TeamID FROM Teams WHERE TeamName = ?', (team_name,))
+    return cursor.fetchone()[0]
+
+def _merge_name_run(cursor, player_id, player_name, first_seen, last_seen):
+    """Record that the player used player_name from first_seen to last_seen.
+
+    Matches can arrive out of order, so the run is matched against the player's runs around it
+    rather than only the current name: a run of the same name that covers or borders it is
+    widened, and a new history row is added only when there is none. Returns the NameHistoryID
+    and LastSeen of the run that now holds it.
+    """
+    # The run in effect at first_seen, and the next run to start after it
+    cursor.execute('''
+        SELECT NameHistoryID, PlayerName, LastSeen
+        FROM PlayerNameHistory
+        WHERE PlayerID = ? AND FirstSeen <= ?
+        ORDER BY FirstSeen DESC, NameHistoryID DESC
+        LIMIT 1
+    ''', (player_id, first_seen))
+    previous_run = cursor.fetchone()
+    cursor.execute('''
+        SELECT NameHistoryID, PlayerName, LastSeen
+        FROM PlayerNameHistory
+        WHERE PlayerID = ? AND FirstSeen > ?
+        ORDER BY FirstSeen, NameHistoryID
+        LIMIT 1
+    ''', (player_id, first_seen))
+    next_run = cursor.fetchone()
+
+    if previous_run is not None and previous_run[1] == player_name:
+        name_history_id = previous_run[0]
+    elif next_run is not None and next_run[1] == player_name:
+        name_history_id = next_run[0]
+    else:
+        cursor.execute('''
+            INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
+            VALUES (?, ?, ?, ?)
+        ''', (player_id, player_name, first_seen, last_seen))
+        return cursor.lastrowid, last_seen
+
+    cursor.execute('''
+        UPDATE PlayerNameHistory
+        SET FirstSeen = MIN(FirstSeen, ?), LastSeen = MAX(LastSeen, ?)
+        WHERE NameHistoryID = ?
+    ''', (first_seen, last_seen, name_history_id))
+    cursor.execute('SELECT LastSeen FROM PlayerNameHistory WHERE NameHistoryID = ?', (name_history_id,))
+    return name_history_id, cursor.fetchone()[0]
+
+def update_player_name_history(conn, player_id: str, player_name: str, seen_at=None):
+    """Update the player's name history with a name seen in a match played at seen_at.
+
+    PlayerCurrentName only moves to a name seen later than the current one.
+    """
+    cursor = conn.cursor()
+    seen_at = seen_at or match_played_at(None)
+    name_history_id, last_seen = _merge_name_run(cursor, player_id, player_name, seen_at, seen_at)
+    _set_current_name(cursor, player_id, name_history_id, player_name, last_seen)
+
+
+def insert_or_update_player(conn, player_data, seen_at=None):
+    """Updated to include name history tracking."""
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO Players (PlayerID, PlayerName, TotalKills, TotalDeaths, TotalMatches, TotalCombatEffectiveness)
+        VALUES (?, ?, 0, 0, 0, 0)
+    ''', (player_data['PlayerID'], player_data['Name']))
+    
+    cursor.execute('''
+        UPDATE Players SET
+        TotalKills = TotalKills + ?,
+        TotalDeaths = TotalDeaths + ?,
+        TotalMatches = TotalMatches + 1,
+        TotalCombatEffectiveness = TotalCombatEffectiveness + ?,
+        AverageKills = ROUND(CAST((TotalKills + ?) AS REAL) / (TotalMatches + 1), 1),
+        AverageDeaths = ROUND(CAST((TotalDeaths + ?) AS REAL) / (TotalMatches + 1), 1),
+        AverageCombatEffectiveness = ROUND(CAST((TotalCombatEffectiveness + ?) AS REAL) / (TotalMatches + 1), 1)
         WHERE PlayerID = ?
     ''', (
         player_data['Kills'],
@@ -253,16 +916,16 @@ def insert_or_update_player(conn, player_data):
     ))
     
     # Update name history
-    update_player_name_history(conn, player_data['PlayerID'], player_data['Name'])
+    update_player_name_history(conn, player_data['PlayerID'], player_data['Name'], seen_at)
 
 
-def insert_parsed_result(conn, file_name, map_name, match_date):
+def insert_parsed_result(conn, file_name, map_name, match_date, source_hash=None, match_hash=None, played_at=None):
     cursor = conn.cursor()
     parse_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     cursor.execute('''
-        INSERT OR IGNORE INTO ParsedResults (FileName, ParseDate, MapName, MatchDate)
-        VALUES (?, ?, ?, ?)
-    ''', (file_name, parse_date, map_name, match_date))
+        INSERT OR IGNORE INTO ParsedResults (FileName, ParseDate, MapName, MatchDate, SourceHash, PayloadHash, MatchTimestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (file_name, parse_date, map_name, match_date, source_hash, match_hash, played_at or match_played_at(match_date)))
     return cursor.lastrowid
 
 def update_map_stats(conn, map_name):
@@ -276,16 +939,19 @@ def update_map_stats(conn, map_name):
         WHERE MapName = ?
     ''', (map_name,))
 
-def insert_match_performance(conn, result_id, player_data, team_id):
+def insert_match_performance(conn, result_id, player_data, team_id, played_at=None):
     cursor = conn.cursor()
+    played_at = played_at or match_played_at(None)
     
     # First insert the match performance as before
-    cursor.execute('''
+    cursor.execute(f'''
         INSERT INTO MatchPerformance (
-            ResultID, PlayerID, PlayerName, TeamID, Side, PlayerGroup, Kills, Deaths, CombatEffectiveness
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ResultID, MatchTimestamp, PlayerID, PlayerName, TeamID, Side, PlayerGroup, Kills, Deaths, CombatEffectiveness,
+            {', '.join(METRIC_NAMES)}, GroupSource
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?{', ?' * len(METRIC_NAMES)}, ?)
     ''', (
         result_id,
+        played_at,
         player_data['PlayerID'],
         player_data['Name'],
         team_id,
@@ -293,30 +959,482 @@ def insert_match_performance(conn, result_id, player_data, team_id):
         player_data['Group'],
         player_data['Kills'],
         player_data['Deaths'],
-        player_data['CombatEffectiveness']
+        player_data['CombatEffectiveness'],
+        *(player_data.get(name) for name in METRIC_NAMES),
+        player_data.get('GroupSource')
     ))
     
     # Then update the player team affiliation
     if team_id is not None:  # Only track affiliations for actual team members (not spectators)
-        current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Try to update existing affiliation or create new one
+        # Try to update existing affiliation or create new one; a backfilled match can only widen its range
         cursor.execute('''
             INSERT INTO PlayerTeamAffiliations (PlayerID, TeamID, FirstSeen, LastSeen, MatchesPlayed)
             VALUES (?, ?, ?, ?, 1)
             ON CONFLICT(PlayerID, TeamID) DO UPDATE SET
-                LastSeen = ?,
+                FirstSeen = MIN(FirstSeen, excluded.FirstSeen),
+                LastSeen = MAX(LastSeen, excluded.LastSeen),
                 MatchesPlayed = MatchesPlayed + 1
-            WHERE PlayerID = ? AND TeamID = ?
         ''', (
             player_data['PlayerID'],
             team_id,
-            current_date,
-            current_date,
-            current_date,
-            player_data['PlayerID'],
-            team_id
+            played_at,
+            played_at
         ))
+        
+        cursor.execute('''
+            INSERT INTO PlayerCurrentTeam (PlayerID, AffiliationID, TeamID, LastSeen)
+            SELECT PlayerID, AffiliationID, TeamID, LastSeen
+            FROM PlayerTeamAffiliations
+            WHERE PlayerID = ? AND TeamID = ?
+            ON CONFLICT(PlayerID) DO UPDATE SET
+                AffiliationID = excluded.AffiliationID,
+                TeamID = excluded.TeamID,
+                LastSeen = excluded.LastSeen
+            WHERE excluded.LastSeen >= PlayerCurrentTeam.LastSeen
+        ''', (player_data['PlayerID'], team_id))
+
+def insert_weapon_stats(conn, result_id, player_data):
+    """Store a player's per-weapon kills and deaths for one match."""
+    cursor = conn.cursor()
+    for table, column, weapons in [('WeaponKills', 'Kills', player_data.get('Weapons', {})),
+                                   ('WeaponDeaths', 'Deaths', player_data.get('DeathByWeapons', {}))]:
+        for weapon, count in weapons.items():
+            cursor.execute('INSERT OR IGNORE INTO Weapons (WeaponName) VALUES (?)', (weapon,))
+            cursor.execute(f'''
+                INSERT INTO {table} (ResultID, PlayerID, WeaponID, {column})
+                SELECT ?, ?, WeaponID, ? FROM Weapons WHERE WeaponName = ?
+                ON CONFLICT(ResultID, PlayerID, WeaponID) DO UPDATE SET
+                    {column} = {column} + excluded.{column}
+            ''', (result_id, player_data['PlayerID'], int(count), weapon))
+
+def insert_kill_edges(conn, result_id, edges):
+    """Store MatchResults.kill_edges tuples for one match."""
+    conn.executemany('''
+        INSERT INTO PlayerKillEdges (ResultID, KillerID, VictimID, KillerName, VictimName, Kills)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ((result_id,) + edge for edge in edges))
+
+def get_head_to_head(conn, player_id, opponent_id):
+    """Kills by player_id on opponent_id and by opponent_id on player_id, across all matches."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            (SELECT COALESCE(SUM(Kills), 0) FROM PlayerKillEdges WHERE KillerID = ? AND VictimID = ?),
+            (SELECT COALESCE(SUM(Kills), 0) FROM PlayerKillEdges WHERE KillerID = ? AND VictimID = ?)
+    ''', (player_id, opponent_id, opponent_id, player_id))
+    return cursor.fetchone()
+
+def get_top_victims(conn, player_id, limit=10):
+    """The players killed most often by player_id, with their current names."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT e.VictimID, pcn.PlayerName, SUM(e.Kills) AS Kills, COUNT(DISTINCT e.ResultID) AS Matches
+        FROM PlayerKillEdges e
+        LEFT JOIN PlayerCurrentName pcn ON pcn.PlayerID = e.VictimID
+        WHERE e.KillerID = ? AND e.VictimID IS NOT NULL
+        GROUP BY e.VictimID
+        ORDER BY Kills DESC
+        LIMIT ?
+    ''', (player_id, limit))
+    return cursor.fetchall()
+
+def get_nemeses(conn, player_id, limit=10):
+    """The players who killed player_id most often, with their current names."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT e.KillerID, pcn.PlayerName, SUM(e.Kills) AS Kills, COUNT(DISTINCT e.ResultID) AS Matches
+        FROM PlayerKillEdges e
+        LEFT JOIN PlayerCurrentName pcn ON pcn.PlayerID = e.KillerID
+        WHERE e.VictimID = ? AND e.KillerID IS NOT NULL
+        GROUP BY e.KillerID
+        ORDER BY Kills DESC
+        LIMIT ?
+    ''', (player_id, limit))
+    return cursor.fetchall()
+
+def get_weapon_kills_by_team_and_map(conn, machine_guns_only=False):
+    """Total kills per team and map, optionally only counting machine guns."""
+    cursor = conn.cursor()
+    weapon_filter = 'WHERE w.IsMachineGun = 1' if machine_guns_only else ''
+    cursor.execute(f'''
+        SELECT 
+            t.TeamName,
+            pr.MapName,
+            SUM(wk.Kills) AS Kills
+        FROM Weapons w
+        JOIN WeaponKills wk ON wk.WeaponID = w.WeaponID
+        JOIN MatchPerformance mp ON mp.ResultID = wk.ResultID AND mp.PlayerID = wk.PlayerID
+        JOIN Teams t ON mp.TeamID = t.TeamID
+        JOIN ParsedResults pr ON wk.ResultID = pr.ResultID
+        {weapon_filter}
+        GROUP BY t.TeamName, pr.MapName
+        ORDER BY Kills DESC
+    ''')
+    return cursor.fetchall()
+
+def update_aggregates(conn, result_ids, sign=1):
+    """Add (sign=1) or subtract (sign=-1) the given matches from the aggregate tables.
+
+    Only the MatchPerformance rows of those matches are read, so the cost is
+    proportional to the matches touched rather than to the database.
+    """
+    cursor = conn.cursor()
+    _bump_ingest_generation(cursor)
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS AggregateResults (ResultID INTEGER PRIMARY KEY)')
+    cursor.execute('DELETE FROM temp.AggregateResults')
+    cursor.executemany('INSERT OR IGNORE INTO AggregateResults (ResultID) VALUES (?)', ((result_id,) for result_id in result_ids))
+
+    cursor.execute('''
+        INSERT INTO PlayerAggregates (PlayerID, Matches, Kills, Deaths, CombatEffectiveness)
+        SELECT PlayerID, ? * COUNT(DISTINCT ResultID), ? * SUM(Kills), ? * SUM(Deaths), ? * SUM(CombatEffectiveness)
+        FROM MatchPerformance
+        WHERE ResultID IN (SELECT ResultID FROM AggregateResults)
+        GROUP BY PlayerID
+        ON CONFLICT(PlayerID) DO UPDATE SET
+            Matches = Matches + excluded.Matches,
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths,
+            CombatEffectiveness = CombatEffectiveness + excluded.CombatEffectiveness
+    ''', (sign, sign, sign, sign))
+
+    cursor.execute('''
+        INSERT INTO TeamAggregates (TeamID, Matches, PlayerAppearances, Kills, Deaths, CombatEffectiveness)
+        SELECT TeamID, ? * COUNT(DISTINCT ResultID), ? * COUNT(*), ? * SUM(Kills), ? * SUM(Deaths), ? * SUM(CombatEffectiveness)
+        FROM MatchPerformance
+        WHERE ResultID IN (SELECT ResultID FROM AggregateResults) AND TeamID IS NOT NULL
+        GROUP BY TeamID
+        ON CONFLICT(TeamID) DO UPDATE SET
+            Matches = Matches + excluded.Matches,
+            PlayerAppearances = PlayerAppearances + excluded.PlayerAppearances,
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths,
+            CombatEffectiveness = CombatEffectiveness + excluded.CombatEffectiveness
+    ''', (sign, sign, sign, sign, sign))
+
+    cursor.execute('''
+        INSERT INTO MapAggregates (MapName, Side, Matches, PlayerAppearances, Kills, Deaths, CombatEffectiveness)
+        SELECT pr.MapName, mp.Side, ? * COUNT(DISTINCT mp.ResultID), ? * COUNT(*), ? * SUM(mp.Kills),
+               ? * SUM(mp.Deaths), ? * SUM(mp.CombatEffectiveness)
+        FROM MatchPerformance mp
+        JOIN ParsedResults pr ON mp.ResultID = pr.ResultID
+        WHERE mp.ResultID IN (SELECT ResultID FROM AggregateResults) AND mp.TeamID IS NOT NULL
+        GROUP BY pr.MapName, mp.Side
+        ON CONFLICT(MapName, Side) DO UPDATE SET
+            Matches = Matches + excluded.Matches,
+            PlayerAppearances = PlayerAppearances + excluded.PlayerAppearances,
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths,
+            CombatEffectiveness = CombatEffectiveness + excluded.CombatEffectiveness
+    ''', (sign, sign, sign, sign, sign))
+
+    cursor.execute('''
+        WITH SideTotals AS (
+            SELECT ResultID, Side, TeamID, SUM(Kills) AS Kills, SUM(Deaths) AS Deaths
+            FROM MatchPerformance
+            WHERE ResultID IN (SELECT ResultID FROM AggregateResults) AND TeamID IS NOT NULL
+            GROUP BY ResultID, Side, TeamID
+        )
+        INSERT INTO TeamMapAggregates (TeamID, MapName, Matches, KillWins, KillLosses, Kills, Deaths)
+        SELECT s.TeamID, pr.MapName, ? * COUNT(*), ? * SUM(s.Kills > COALESCE(o.Kills, 0)),
+               ? * SUM(s.Kills < COALESCE(o.Kills, 0)), ? * SUM(s.Kills), ? * SUM(s.Deaths)
+        FROM SideTotals s
+        LEFT JOIN SideTotals o ON o.ResultID = s.ResultID AND o.Side <> s.Side
+        JOIN ParsedResults pr ON pr.ResultID = s.ResultID
+        GROUP BY s.TeamID, pr.MapName
+        ON CONFLICT(TeamID, MapName) DO UPDATE SET
+            Matches = Matches + excluded.Matches,
+            KillWins = KillWins + excluded.KillWins,
+            KillLosses = KillLosses + excluded.KillLosses,
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths
+    ''', (sign, sign, sign, sign, sign))
+
+    cursor.execute('''
+        INSERT INTO PlayerWeaponAggregates (PlayerID, WeaponID, Kills, Deaths)
+        SELECT PlayerID, WeaponID, ? * SUM(Kills), ? * SUM(Deaths)
+        FROM (
+            SELECT PlayerID, WeaponID, Kills, 0 AS Deaths
+            FROM WeaponKills WHERE ResultID IN (SELECT ResultID FROM AggregateResults)
+            UNION ALL
+            SELECT PlayerID, WeaponID, 0, Deaths
+            FROM WeaponDeaths WHERE ResultID IN (SELECT ResultID FROM AggregateResults)
+        )
+        GROUP BY PlayerID, WeaponID
+        ON CONFLICT(PlayerID, WeaponID) DO UPDATE SET
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths
+    ''', (sign, sign))
+
+    cursor.execute('''
+        INSERT INTO PlayerWeaponGroupAggregates (WeaponGroup, PlayerID, Kills)
+        SELECT g.WeaponGroup, wk.PlayerID, ? * SUM(wk.Kills)
+        FROM (
+            SELECT WeaponID, WeaponGroup FROM Weapons WHERE WeaponGroup IS NOT NULL
+            UNION ALL
+            SELECT WeaponID, ? FROM Weapons WHERE IsMachineGun = 1
+        ) AS g
+        JOIN WeaponKills wk ON wk.WeaponID = g.WeaponID
+        WHERE wk.ResultID IN (SELECT ResultID FROM AggregateResults)
+        GROUP BY g.WeaponGroup, wk.PlayerID
+        ON CONFLICT(WeaponGroup, PlayerID) DO UPDATE SET
+            Kills = Kills + excluded.Kills
+    ''', (sign, MACHINE_GUN_GROUP))
+
+    cursor.execute('''
+        INSERT INTO WeaponAggregates (WeaponID, Kills, Deaths)
+        SELECT WeaponID, ? * SUM(Kills), ? * SUM(Deaths)
+        FROM (
+            SELECT WeaponID, Kills, 0 AS Deaths
+            FROM WeaponKills WHERE ResultID IN (SELECT ResultID FROM AggregateResults)
+            UNION ALL
+            SELECT WeaponID, 0, Deaths
+            FROM WeaponDeaths WHERE ResultID IN (SELECT ResultID FROM AggregateResults)
+        )
+        GROUP BY WeaponID
+        ON CONFLICT(WeaponID) DO UPDATE SET
+            Kills = Kills + excluded.Kills,
+            Deaths = Deaths + excluded.Deaths
+    ''', (sign, sign))
+
+    if sign < 0:
+        for table in ['PlayerAggregates', 'TeamAggregates', 'MapAggregates', 'TeamMapAggregates']:
+            cursor.execute(f'DELETE FROM {table} WHERE Matches <= 0')
+        for table in ['PlayerWeaponAggregates', 'WeaponAggregates']:
+            cursor.execute(f'DELETE FROM {table} WHERE Kills <= 0 AND Deaths <= 0')
+        cursor.execute('DELETE FROM PlayerWeaponGroupAggregates WHERE Kills <= 0')
+
+def _bump_ingest_generation(cursor):
+    cursor.execute('UPDATE IngestState SET Generation = Generation + 1 WHERE StateID = 1')
+
+def get_ingest_generation(conn):
+    """Counter that changes whenever loaded matches or aggregates change."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT Generation FROM IngestState WHERE StateID = 1')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def _rebuild_aggregate_tables(conn):
+    cursor = conn.cursor()
+    _bump_ingest_generation(cursor)
+    for table in ['PlayerAggregates', 'TeamAggregates', 'MapAggregates', 'TeamMapAggregates',
+                  'PlayerWeaponAggregates', 'PlayerWeaponGroupAggregates', 'WeaponAggregates']:
+        cursor.execute(f'DELETE FROM {table}')
+
+    cursor.execute('''
+        INSERT INTO PlayerAggregates (PlayerID, Matches, Kills, Deaths, CombatEffectiveness)
+        SELECT PlayerID, COUNT(DISTINCT ResultID), SUM(Kills), SUM(Deaths), SUM(CombatEffectiveness)
+        FROM MatchPerformance
+        GROUP BY PlayerID
+    ''')
+    cursor.execute('''
+        INSERT INTO TeamAggregates (TeamID, Matches, PlayerAppearances, Kills, Deaths, CombatEffectiveness)
+        SELECT TeamID, COUNT(DISTINCT ResultID), COUNT(*), SUM(Kills), SUM(Deaths), SUM(CombatEffectiveness)
+        FROM MatchPerformance
+        WHERE TeamID IS NOT NULL
+        GROUP BY TeamID
+    ''')
+    cursor.execute('''
+        INSERT INTO MapAggregates (MapName, Side, Matches, PlayerAppearances, Kills, Deaths, CombatEffectiveness)
+        SELECT pr.MapName, mp.Side, COUNT(DISTINCT mp.ResultID), COUNT(*), SUM(mp.Kills), SUM(mp.Deaths),
+               SUM(mp.CombatEffectiveness)
+        FROM MatchPerformance mp
+        JOIN ParsedResults pr ON mp.ResultID = pr.ResultID
+        WHERE mp.TeamID IS NOT NULL
+        GROUP BY pr.MapName, mp.Side
+    ''')
+    cursor.execute('''
+        WITH SideTotals AS (
+            SELECT ResultID, Side, TeamID, SUM(Kills) AS Kills, SUM(Deaths) AS Deaths
+            FROM MatchPerformance
+            WHERE TeamID IS NOT NULL
+            GROUP BY ResultID, Side, TeamID
+        )
+        INSERT INTO TeamMapAggregates (TeamID, MapName, Matches, KillWins, KillLosses, Kills, Deaths)
+        SELECT s.TeamID, pr.MapName, COUNT(*), SUM(s.Kills > COALESCE(o.Kills, 0)),
+               SUM(s.Kills < COALESCE(o.Kills, 0)), SUM(s.Kills), SUM(s.Deaths)
+        FROM SideTotals s
+        LEFT JOIN SideTotals o ON o.ResultID = s.ResultID AND o.Side <> s.Side
+        JOIN ParsedResults pr ON pr.ResultID = s.ResultID
+        GROUP BY s.TeamID, pr.MapName
+    ''')
+    cursor.execute('''
+        INSERT INTO PlayerWeaponAggregates (PlayerID, WeaponID, Kills, Deaths)
+        SELECT PlayerID, WeaponID, SUM(Kills), SUM(Deaths)
+        FROM (
+            SELECT PlayerID, WeaponID, Kills, 0 AS Deaths FROM WeaponKills
+            UNION ALL
+            SELECT PlayerID, WeaponID, 0, Deaths FROM WeaponDeaths
+        )
+        GROUP BY PlayerID, WeaponID
+    ''')
+    cursor.execute('''
+        INSERT INTO PlayerWeaponGroupAggregates (WeaponGroup, PlayerID, Kills)
+        SELECT g.WeaponGroup, pwa.PlayerID, SUM(pwa.Kills)
+        FROM (
+            SELECT WeaponID, WeaponGroup FROM Weapons WHERE WeaponGroup IS NOT NULL
+            UNION ALL
+            SELECT WeaponID, ? FROM Weapons WHERE IsMachineGun = 1
+        ) AS g
+        JOIN PlayerWeaponAggregates pwa ON pwa.WeaponID = g.WeaponID
+        WHERE pwa.Kills > 0
+        GROUP BY g.WeaponGroup, pwa.PlayerID
+    ''', (MACHINE_GUN_GROUP,))
+    cursor.execute('''
+        INSERT INTO WeaponAggregates (WeaponID, Kills, Deaths)
+        SELECT WeaponID, SUM(Kills), SUM(Deaths)
+        FROM PlayerWeaponAggregates
+        GROUP BY WeaponID
+    ''')
+
+def rebuild_aggregates(conn):
+    """Recompute every aggregate table from MatchPerformance in one set-based pass, and replay the ratings."""
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        conn.execute('BEGIN')
+    try:
+        _rebuild_aggregate_tables(conn)
+        ratings.replay_ratings(conn)
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+    if owns_transaction:
+        conn.commit()
+
+def retract_match(conn, result_id):
+    """Remove one match and undo its contribution to the totals and aggregates.
+
+    Player name history is left as is, since it only records names that were seen.
+    Ratings are replayed from the last checkpoint before the match.
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT MatchTimestamp, ResultID FROM ParsedResults WHERE ResultID = ?', (result_id,))
+    position = cursor.fetchone()
+    update_aggregates(conn, [result_id], sign=-1)
+
+    cursor.execute('''
+        UPDATE Players SET
+        TotalKills = Players.TotalKills - s.Kills,
+        TotalDeaths = Players.TotalDeaths - s.Deaths,
+        TotalMatches = Players.TotalMatches - s.Matches,
+        TotalCombatEffectiveness = Players.TotalCombatEffectiveness - s.CombatEffectiveness,
+        AverageKills = COALESCE(ROUND(CAST((Players.TotalKills - s.Kills) AS REAL) / NULLIF(Players.TotalMatches - s.Matches, 0), 1), 0),
+        AverageDeaths = COALESCE(ROUND(CAST((Players.TotalDeaths - s.Deaths) AS REAL) / NULLIF(Players.TotalMatches - s.Matches, 0), 1), 0),
+        AverageCombatEffectiveness = COALESCE(ROUND(CAST((Players.TotalCombatEffectiveness - s.CombatEffectiveness) AS REAL) / NULLIF(Players.TotalMatches - s.Matches, 0), 1), 0)
+        FROM (
+            SELECT PlayerID, SUM(Kills) AS Kills, SUM(Deaths) AS Deaths, COUNT(*) AS Matches,
+                   SUM(CombatEffectiveness) AS CombatEffectiveness
+            FROM MatchPerformance
+            WHERE ResultID = ?
+            GROUP BY PlayerID
+        ) AS s
+        WHERE Players.PlayerID = s.PlayerID
+    ''', (result_id,))
+
+    cursor.execute('''
+        UPDATE PlayerTeamAffiliations SET MatchesPlayed = PlayerTeamAffiliations.MatchesPlayed - s.Matches
+        FROM (
+            SELECT PlayerID, TeamID, COUNT(*) AS Matches
+            FROM MatchPerformance
+            WHERE ResultID = ? AND TeamID IS NOT NULL
+            GROUP BY PlayerID, TeamID
+        ) AS s
+        WHERE PlayerTeamAffiliations.PlayerID = s.PlayerID AND PlayerTeamAffiliations.TeamID = s.TeamID
+    ''', (result_id,))
+    # Current team rows point at the affiliations about to go; refresh_current_player_state replaces them
+    cursor.execute('''
+        DELETE FROM PlayerCurrentTeam
+        WHERE AffiliationID IN (SELECT AffiliationID FROM PlayerTeamAffiliations WHERE MatchesPlayed <= 0)
+    ''')
+    cursor.execute('DELETE FROM PlayerTeamAffiliations WHERE MatchesPlayed <= 0')
+    # The remaining affiliations span only the matches that are left
+    cursor.execute('''
+        UPDATE PlayerTeamAffiliations SET FirstSeen = s.FirstSeen, LastSeen = s.LastSeen
+        FROM (
+            SELECT PlayerID, TeamID, MIN(MatchTimestamp) AS FirstSeen, MAX(MatchTimestamp) AS LastSeen
+            FROM MatchPerformance
+            WHERE ResultID != ? AND TeamID IS NOT NULL
+              AND PlayerID IN (SELECT PlayerID FROM MatchPerformance WHERE ResultID = ?)
+            GROUP BY PlayerID, TeamID
+        ) AS s
+        WHERE PlayerTeamAffiliations.PlayerID = s.PlayerID AND PlayerTeamAffiliations.TeamID = s.TeamID
+    ''', (result_id, result_id))
+    cursor.execute('SELECT DISTINCT PlayerID FROM MatchPerformance WHERE ResultID = ?', (result_id,))
+    refresh_current_player_state(conn, [row[0] for row in cursor.fetchall()])
+
+    cursor.execute('''
+        UPDATE Maps SET TimesPlayed = TimesPlayed - 1
+        WHERE MapName = (SELECT MapName FROM ParsedResults WHERE ResultID = ?)
+    ''', (result_id,))
+
+    for table in ['WeaponKills', 'WeaponDeaths', 'PlayerKillEdges', 'PlayerRatingHistory', 'TeamRatingHistory',
+                  'MatchPerformance', 'ParsedResults']:
+        cursor.execute(f'DELETE FROM {table} WHERE ResultID = ?', (result_id,))
+    if position is not None:
+        ratings.replay_ratings(conn, tuple(position))
+
+def get_result_id(conn, file_name):
+    cursor = conn.cursor()
+    cursor.execute('SELECT ResultID FROM ParsedResults WHERE FileName = ?', (file_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def reprocess_json_file(conn, file_path):
+    """Retract the previous load of a JSON file, if any, and load it again."""
+    result_id = get_result_id(conn, os.path.basename(file_path))
+    if result_id is not None:
+        retract_match(conn, result_id)
+    process_json_file(conn, file_path)
+
+def find_loaded_match(conn, file_name=None, source_hash=None, match_hash=None):
+    """FileName of a loaded match with the same file name, source CSV or payload, else None.
+
+    Each condition is a lookup on a unique index, so this is cheap enough to run
+    before parsing or loading anything.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT FileName FROM ParsedResults
+        WHERE FileName = ? OR SourceHash = ? OR PayloadHash = ?
+        LIMIT 1
+    ''', (file_name, source_hash, match_hash))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def backfill_payload_hashes(conn, folder):
+    """Hash the JSON files of matches loaded before content hashing, where they still exist."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT ResultID, FileName FROM ParsedResults WHERE PayloadHash IS NULL')
+    updates = []
+    for result_id, file_name in cursor.fetchall():
+        file_path = os.path.join(folder, file_name)
+        if os.path.exists(file_path):
+            updates.append((payload_hash(load_json_file(file_path)), result_id))
+    # A match that was already loaded twice keeps one hash; the copy stays NULL
+    cursor.executemany('UPDATE OR IGNORE ParsedResults SET PayloadHash = ? WHERE ResultID = ?', updates)
+    return len(updates)
+
+def backfill_match_points(conn, folder):
+    """Fill in the points of matches loaded before points were stored, from their JSON files where they still exist."""
+    cursor = conn.cursor()
+    # One indexed lookup per match rather than a scan of MatchPerformance
+    cursor.execute('''
+        SELECT pr.ResultID, pr.FileName
+        FROM ParsedResults pr
+        WHERE (SELECT mp.OffensivePoints IS NULL FROM MatchPerformance mp WHERE mp.ResultID = pr.ResultID LIMIT 1)
+    ''')
+    point_offsets = [8 + METRIC_NAMES.index(name) for name in POINT_NAMES]
+    updates = []
+    for result_id, file_name in cursor.fetchall():
+        file_path = os.path.join(folder, file_name)
+        if file_name.endswith('.json') and os.path.exists(file_path):
+            for row in prepare_match(file_name, load_json_file(file_path))[4]:
+                updates.append((*(row[offset] for offset in point_offsets), result_id, row[0]))
+    cursor.executemany(f'''
+        UPDATE MatchPerformance SET {', '.join(f'{name} = ?' for name in POINT_NAMES)}
+        WHERE ResultID = ? AND PlayerID = ?
+    ''', updates)
+    return len(updates)
 
 def get_processed_files(conn):
     cursor = conn.cursor()
@@ -357,15 +1475,124 @@ def get_team_roster(conn, team_id):
     ''', (team_id,))
     return cursor.fetchall()
 
+def get_team_roster_as_of(conn, team_id, as_of, days=90):
+    """Players who played for a team in the days before the MatchTimestamp as_of, most matches first.
+
+    A range scan of idx_match_performance_team_time.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT 
+            mp.PlayerID,
+            COALESCE(cn.PlayerName, MAX(mp.PlayerName)) AS PlayerName,
+            MIN(mp.MatchTimestamp) AS FirstSeen,
+            MAX(mp.MatchTimestamp) AS LastSeen,
+            COUNT(*) AS MatchesPlayed,
+            ROUND(AVG(mp.Kills), 1) AS AverageKills,
+            ROUND(AVG(mp.CombatEffectiveness), 1) AS AverageCombatEffectiveness
+        FROM MatchPerformance mp
+        LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = mp.PlayerID
+        WHERE mp.TeamID = ? AND mp.MatchTimestamp > datetime(?, ?) AND mp.MatchTimestamp <= ?
+        GROUP BY mp.PlayerID
+        ORDER BY MatchesPlayed DESC, LastSeen DESC
+    ''', (team_id, as_of, f'-{int(days)} days', as_of))
+    return cursor.fetchall()
+
+def get_player_form(conn, player_id, matches=10, before=None):
+    """The player's last matches played at or before the MatchTimestamp before, newest first.
+
+    A backwards range scan of idx_match_performance_player_time.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT 
+            mp.MatchTimestamp,
+            pr.FileName,
+            pr.MapName,
+            t.TeamName,
+            mp.PlayerGroup,
+            mp.Kills,
+            mp.Deaths,
+            mp.CombatEffectiveness,
+            CAST(ROUND(rh.RatingAfter) AS INTEGER) AS Rating
+        FROM MatchPerformance mp
+        JOIN ParsedResults pr ON pr.ResultID = mp.ResultID
+        LEFT JOIN Teams t ON t.TeamID = mp.TeamID
+        LEFT JOIN PlayerRatingHistory rh ON rh.ResultID = mp.ResultID AND rh.PlayerID = mp.PlayerID
+        WHERE mp.PlayerID = ? AND mp.MatchTimestamp <= ?
+        ORDER BY mp.MatchTimestamp DESC
+        LIMIT ?
+    ''', (player_id, before or '9999-12-31 23:59:59', matches))
+    return cursor.fetchall()
+
+@instrumentation.timed('process_json_file')
 def process_json_file(conn, file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
+    if file_path.endswith(NDJSON_EXTENSION):
+        return process_ndjson_file(conn, file_path)
+    return process_match_data(conn, os.path.basename(file_path), load_json_file(file_path))
+
+@instrumentation.timed('process_ndjson_file')
+def process_ndjson_file(conn, file_path):
+    """Load a streamed NDJSON match one player record at a time.
+
+    Returns the new ResultID, or None when the file or its contents were already loaded.
+    """
     file_name = os.path.basename(file_path)
+    records = read_ndjson_match(file_path)
+    match = next(records)
+    source_hash = match.get('Source Hash')
+    match_hash = ndjson_payload_hash(file_path)
+
+    duplicate = find_loaded_match(conn, file_name, source_hash, match_hash)
+    if duplicate is not None:
+        print(f"Skipping {file_name}: same match as already loaded {duplicate}")
+        return None
+
+    played_at = match_played_at(match['Match Date'])
+    result_id = insert_parsed_result(conn, file_name, match['Map'], match['Match Date'], source_hash, match_hash, played_at)
+    update_map_stats(conn, match['Map'])
+    team_ids = {
+        'Axis': insert_or_update_team(conn, match['Axis Team Name']),
+        'Allies': insert_or_update_team(conn, match['Allies Team Name'])
+    }
+
+    _create_raw_edge_table(conn)
+    cursor = conn.cursor()
+    for record in records:
+        if record['Record'] != 'Player':
+            continue
+        insert_or_update_player(conn, record, played_at)
+        insert_match_performance(conn, result_id, record, team_ids.get(record['Side']), played_at)
+        insert_weapon_stats(conn, result_id, record)
+        cursor.executemany('''
+            INSERT INTO StageRawEdges (PlayerID, PlayerName, OtherName, Kills, IsNemesis) VALUES (?, ?, ?, ?, ?)
+        ''', [(record['PlayerID'], record['Name'], name, int(kills), is_nemesis)
+              for is_nemesis, column in [(0, 'Victim'), (1, 'Nemesis')]
+              for name, kills in record.get(column, {}).items()])
+
+    _resolve_raw_edges(conn, result_id)
+    update_aggregates(conn, [result_id])
+    ratings.rate_new_matches(conn, [result_id])
+    return result_id
+
+@instrumentation.timed('process_match_data')
+def process_match_data(conn, file_name, data):
+    """Insert an already loaded match dict under the given JSON file name.
+
+    Returns the new ResultID, or None when the file or its contents were already loaded.
+    """
     map_name = data['Map']
     match_date = data['Match Date']
+    source_hash = data.get('Source Hash')
+    match_hash = payload_hash(data)
+    
+    duplicate = find_loaded_match(conn, file_name, source_hash, match_hash)
+    if duplicate is not None:
+        print(f"Skipping {file_name}: same match as already loaded {duplicate}")
+        return None
     
-    result_id = insert_parsed_result(conn, file_name, map_name, match_date)
+    played_at = match_played_at(match_date)
+    result_id = insert_parsed_result(conn, file_name, map_name, match_date, source_hash, match_hash, played_at)
     update_map_stats(conn, map_name)
     
     for side in ['Axis', 'Allies']:
@@ -374,26 +1601,515 @@ def process_json_file(conn, file_path):
         
         for group in ['Infantry', 'Artillery', 'Armor']:
             for player_data in data[side][group]['Players']:
-                insert_or_update_player(conn, player_data)
-                insert_match_performance(conn, result_id, player_data, team_id)
+                insert_or_update_player(conn, player_data, played_at)
+                insert_match_performance(conn, result_id, player_data, team_id, played_at)
+                insert_weapon_stats(conn, result_id, player_data)
     
     for player_data in data['Spectators']:
-        insert_or_update_player(conn, player_data)
-        insert_match_performance(conn, result_id, player_data, None)
+        insert_or_update_player(conn, player_data, played_at)
+        insert_match_performance(conn, result_id, player_data, None, played_at)
+        insert_weapon_stats(conn, result_id, player_data)
+
+    insert_kill_edges(conn, result_id, MatchAnalysis.for_match(data, match_hash).kill_edges)
+    update_aggregates(conn, [result_id])
+    ratings.rate_new_matches(conn, [result_id])
+    return result_id
+
+def _create_raw_edge_table(conn):
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageRawEdges (
+            PlayerID TEXT,
+            PlayerName TEXT,
+            OtherName TEXT,
+            Kills INTEGER,
+            IsNemesis INTEGER
+        )
+    ''')
+    conn.execute('DELETE FROM temp.StageRawEdges')
+
+def _resolve_raw_edges(conn, result_id):
+    """Turn streamed Victim/Nemesis entries into kill edges once every player is loaded.
+
+    Applies the same rules as MatchResults.kill_edges, resolving names through the
+    match's MatchPerformance rows instead of holding every player in memory.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO PlayerKillEdges (ResultID, KillerID, VictimID, KillerName, VictimName, Kills)
+        SELECT ?,
+               CASE WHEN e.IsNemesis THEN NULL ELSE e.PlayerID END,
+               CASE WHEN e.IsNemesis THEN e.PlayerID ELSE n.PlayerID END,
+               CASE WHEN e.IsNemesis THEN e.OtherName ELSE e.PlayerName END,
+               CASE WHEN e.IsNemesis THEN e.PlayerName ELSE e.OtherName END,
+               e.Kills
+        FROM StageRawEdges e
+        LEFT JOIN (
+            SELECT PlayerName, PlayerID, MIN(MatchPerformanceID)
+            FROM MatchPerformance
+            WHERE ResultID = ?
+            GROUP BY PlayerName
+        ) AS n ON n.PlayerName = e.OtherName
+        WHERE NOT (e.IsNemesis AND n.PlayerID IS NOT NULL)
+        ORDER BY e.rowid
+    ''', (result_id, result_id))
+    cursor.execute('DELETE FROM temp.StageRawEdges')
+
+@instrumentation.timed('prepare_match')
+def prepare_match(file_name, data):
+    """Flatten a match dict into the plain tuples staged by bulk_load_matches."""
+    team_names = (data['Axis']['Team Name'], data['Allies']['Team Name'])
+    rows = []
+    weapon_rows = []
+    for side, team_name in zip(['Axis', 'Allies'], team_names):
+        for group in ['Infantry', 'Artillery', 'Armor']:
+            for player_data in data[side][group]['Players']:
+                rows.append(_performance_row(player_data, team_name))
+                weapon_rows.extend(_weapon_rows(player_data))
+    for player_data in data['Spectators']:
+        rows.append(_performance_row(player_data, None))
+        weapon_rows.extend(_weapon_rows(player_data))
+    match_hash = payload_hash(data)
+    return (file_name, data['Map'], data['Match Date'], team_names, rows, weapon_rows,
+            data.get('Source Hash'), match_hash, MatchAnalysis.for_match(data, match_hash).kill_edges)
+
+def _weapon_rows(player_data):
+    """(PlayerID, WeaponName, IsDeath, Count) tuples for the weapon fact tables."""
+    rows = [(player_data['PlayerID'], weapon, 0, int(count)) for weapon, count in player_data.get('Weapons', {}).items()]
+    rows.extend((player_data['PlayerID'], weapon, 1, int(count)) for weapon, count in player_data.get('DeathByWeapons', {}).items())
+    return rows
+
+def _performance_row(player_data, team_name):
+    return (
+        player_data['PlayerID'],
+        player_data['Name'],
+        team_name,
+        player_data['Side'],
+        player_data['Group'],
+        player_data['Kills'],
+        player_data['Deaths'],
+        player_data['CombatEffectiveness'],
+        *(player_data.get(name) for name in METRIC_NAMES),
+        player_data.get('GroupSource')
+    )
+
+def _create_staging_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageMatches (
+            MatchSeq INTEGER PRIMARY KEY,
+            FileName TEXT,
+            MapName TEXT,
+            MatchDate TEXT,
+            MatchTimestamp TEXT,
+            AxisTeam TEXT,
+            AlliesTeam TEXT,
+            SourceHash TEXT,
+            PayloadHash TEXT
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TEMP TABLE IF NOT EXISTS StagePerformance (
+            RowSeq INTEGER PRIMARY KEY,
+            MatchSeq INTEGER,
+            PlayerID TEXT,
+            PlayerName TEXT,
+            TeamName TEXT,
+            Side TEXT,
+            PlayerGroup TEXT,
+            Kills INTEGER,
+            Deaths INTEGER,
+            CombatEffectiveness INTEGER,
+            {', '.join(f'{name} {column_type}' for name, column_type in METRIC_COLUMNS)},
+            GroupSource TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageWeapons (
+            MatchSeq INTEGER,
+            PlayerID TEXT,
+            WeaponName TEXT,
+            IsDeath INTEGER,
+            WeaponCount INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageEdges (
+            MatchSeq INTEGER,
+            KillerID TEXT,
+            VictimID TEXT,
+            KillerName TEXT,
+            VictimName TEXT,
+            Kills INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageNames (
+            NameSeq INTEGER PRIMARY KEY,
+            PlayerID TEXT,
+            PlayerName TEXT,
+            RunIndex INTEGER,
+            FirstSeen TEXT,
+            LastSeen TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS StageLatestName (
+            PlayerID TEXT PRIMARY KEY,
+            PlayerName TEXT,
+            NameHistoryID INTEGER,
+            LastSeen TEXT
+        )
+    ''')
+    for table in ['StageMatches', 'StagePerformance', 'StageWeapons', 'StageEdges', 'StageNames', 'StageLatestName']:
+        cursor.execute(f'DELETE FROM temp.{table}')
+
+def _stage_matches(conn, prepared_matches, current_date):
+    cursor = conn.cursor()
+    played_at = [match_timestamp(prepared[2]) or current_date for prepared in prepared_matches]
+    cursor.executemany('''
+        INSERT INTO StageMatches (MatchSeq, FileName, MapName, MatchDate, MatchTimestamp, AxisTeam, AlliesTeam, SourceHash, PayloadHash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        (match_seq, file_name, map_name, match_date, played_at[match_seq], team_names[0], team_names[1], source_hash, match_hash)
+        for match_seq, (file_name, map_name, match_date, team_names, _, _, source_hash, match_hash, _) in enumerate(prepared_matches)
+    ))
+
+    # Files or contents already in the database, or repeated within the batch, are not loaded again
+    cursor.execute('''
+        DELETE FROM StageMatches
+        WHERE FileName IN (SELECT FileName FROM ParsedResults)
+           OR SourceHash IN (SELECT SourceHash FROM ParsedResults)
+           OR PayloadHash IN (SELECT PayloadHash FROM ParsedResults)
+           OR MatchSeq NOT IN (SELECT MIN(MatchSeq) FROM StageMatches GROUP BY FileName)
+           OR MatchSeq NOT IN (SELECT MIN(MatchSeq) FROM StageMatches GROUP BY PayloadHash)
+           OR (SourceHash IS NOT NULL AND MatchSeq NOT IN (
+               SELECT MIN(MatchSeq) FROM StageMatches WHERE SourceHash IS NOT NULL GROUP BY SourceHash
+           ))
+    ''')
+    cursor.execute('SELECT MatchSeq FROM StageMatches')
+    kept = set(row[0] for row in cursor.fetchall())
+
+    cursor.executemany(f'''
+        INSERT INTO StagePerformance (
+            MatchSeq, PlayerID, PlayerName, TeamName, Side, PlayerGroup, Kills, Deaths, CombatEffectiveness,
+            {', '.join(METRIC_NAMES)}, GroupSource
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?{', ?' * len(METRIC_NAMES)}, ?)
+    ''', (
+        (match_seq,) + row
+        for match_seq, prepared in enumerate(prepared_matches) if match_seq in kept
+        for row in prepared[4]
+    ))
 
+    cursor.executemany('''
+        INSERT INTO StageWeapons (MatchSeq, PlayerID, WeaponName, IsDeath, WeaponCount)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (match_seq,) + row
+        for match_seq, prepared in enumerate(prepared_matches) if match_seq in kept
+        for row in prepared[5]
+    ))
+
+    cursor.executemany('''
+        INSERT INTO StageEdges (MatchSeq, KillerID, VictimID, KillerName, VictimName, Kills)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        (match_seq,) + edge
+        for match_seq, prepared in enumerate(prepared_matches) if match_seq in kept
+        for edge in prepared[8]
+    ))
+
+    # Collapse each player's names, in order of play, into runs so only actual name changes become history rows
+    name_runs = {}
+    for match_seq in sorted(kept, key=lambda match_seq: (played_at[match_seq], match_seq)):
+        for row in prepared_matches[match_seq][4]:
+            runs = name_runs.setdefault(row[0], [])
+            if runs and runs[-1][0] == row[1]:
+                runs[-1][2] = played_at[match_seq]
+            else:
+                runs.append([row[1], played_at[match_seq], played_at[match_seq]])
+    cursor.executemany('''
+        INSERT INTO StageNames (PlayerID, PlayerName, RunIndex, FirstSeen, LastSeen) VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (player_id, player_name, run_index, first_seen, last_seen)
+        for player_id, runs in name_runs.items()
+        for run_index, (player_name, first_seen, last_seen) in enumerate(runs)
+    ))
+
+    return len(kept)
+
+def _merge_staged_matches(conn, current_date):
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        INSERT INTO ParsedResults (FileName, ParseDate, MapName, MatchDate, SourceHash, PayloadHash, MatchTimestamp)
+        SELECT FileName, ?, MapName, MatchDate, SourceHash, PayloadHash, MatchTimestamp
+        FROM StageMatches
+        ORDER BY MatchSeq
+    ''', (current_date,))
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO Maps (MapName, TimesPlayed)
+        SELECT DISTINCT MapName, 0 FROM StageMatches
+    ''')
+    cursor.execute('''
+        UPDATE Maps SET TimesPlayed = Maps.TimesPlayed + s.Played
+        FROM (SELECT MapName, COUNT(*) AS Played FROM StageMatches GROUP BY MapName) AS s
+        WHERE Maps.MapName = s.MapName
+    ''')
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO Teams (TeamName)
+        SELECT AxisTeam FROM StageMatches
+        UNION ALL
+        SELECT AlliesTeam FROM StageMatches
+    ''')
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO Players (PlayerID, PlayerName, TotalKills, TotalDeaths, TotalMatches, TotalCombatEffectiveness)
+        SELECT PlayerID, PlayerName, 0, 0, 0, 0
+        FROM StagePerformance
+        WHERE RowSeq IN (SELECT MIN(RowSeq) FROM StagePerformance GROUP BY PlayerID)
+        ORDER BY RowSeq
+    ''')
+    cursor.execute('''
+        UPDATE Players SET
+        TotalKills = Players.TotalKills + s.Kills,
+        TotalDeaths = Players.TotalDeaths + s.Deaths,
+        TotalMatches = Players.TotalMatches + s.Matches,
+        TotalCombatEffectiveness = Players.TotalCombatEffectiveness + s.CombatEffectiveness,
+        AverageKills = ROUND(CAST((Players.TotalKills + s.Kills) AS REAL) / (Players.TotalMatches + s.Matches), 1),
+        AverageDeaths = ROUND(CAST((Players.TotalDeaths + s.Deaths) AS REAL) / (Players.TotalMatches + s.Matches), 1),
+        AverageCombatEffectiveness = ROUND(CAST((Players.TotalCombatEffectiveness + s.CombatEffectiveness) AS REAL) / (Players.TotalMatches + s.Matches), 1)
+        FROM (
+            SELECT PlayerID, SUM(Kills) AS Kills, SUM(Deaths) AS Deaths, COUNT(*) AS Matches,
+                   SUM(CombatEffectiveness) AS CombatEffectiveness
+            FROM StagePerformance
+            GROUP BY PlayerID
+        ) AS s
+        WHERE Players.PlayerID = s.PlayerID
+    ''')
+
+    # Name history: extend the current name if it is unchanged, otherwise add each new name
+    cursor.execute('''
+        INSERT INTO StageLatestName (PlayerID, PlayerName, NameHistoryID, LastSeen)
+        SELECT PlayerID, PlayerName, NameHistoryID, LastSeen
+        FROM (
+            SELECT PlayerID, PlayerName, NameHistoryID, LastSeen,
+                   ROW_NUMBER() OVER (PARTITION BY PlayerID ORDER BY LastSeen DESC, NameHistoryID DESC) AS Recency
+            FROM PlayerNameHistory
+            WHERE PlayerID IN (SELECT PlayerID FROM StageNames)
+        )
+        WHERE Recency = 1
+    ''')
+    # Runs that start before the player's latest name belong to older matches loaded late;
+    # they are merged one at a time into the runs around them
+    cursor.execute('''
+        DELETE FROM StageLatestName
+        WHERE PlayerID IN (
+            SELECT sn.PlayerID
+            FROM StageNames sn
+            JOIN StageLatestName ln ON ln.PlayerID = sn.PlayerID
+            WHERE sn.FirstSeen < ln.LastSeen
+        )
+    ''')
+    cursor.execute('''
+        SELECT PlayerID, PlayerName, FirstSeen, LastSeen
+        FROM StageNames
+        WHERE PlayerID IN (SELECT PlayerID FROM PlayerNameHistory)
+          AND PlayerID NOT IN (SELECT PlayerID FROM StageLatestName)
+        ORDER BY NameSeq
+    ''')
+    for player_id, player_name, first_seen, last_seen in cursor.fetchall():
+        _merge_name_run(cursor, player_id, player_name, first_seen, last_seen)
+    cursor.execute('''
+        UPDATE PlayerNameHistory SET
+        FirstSeen = MIN(PlayerNameHistory.FirstSeen, s.FirstSeen),
+        LastSeen = MAX(PlayerNameHistory.LastSeen, s.LastSeen)
+        FROM (
+            SELECT ln.NameHistoryID, sn.FirstSeen, sn.LastSeen
+            FROM StageLatestName ln
+            JOIN StageNames sn ON sn.PlayerID = ln.PlayerID AND sn.RunIndex = 0
+            WHERE sn.PlayerName = ln.PlayerName
+        ) AS s
+        WHERE PlayerNameHistory.NameHistoryID = s.NameHistoryID
+    ''')
+    cursor.execute('''
+        INSERT INTO PlayerNameHistory (PlayerID, PlayerName, FirstSeen, LastSeen)
+        SELECT sn.PlayerID, sn.PlayerName, sn.FirstSeen, sn.LastSeen
+        FROM StageNames sn
+        LEFT JOIN StageLatestName ln ON ln.PlayerID = sn.PlayerID
+        WHERE NOT (sn.RunIndex = 0 AND ln.PlayerName IS NOT NULL AND ln.PlayerName = sn.PlayerName)
+          AND (ln.PlayerID IS NOT NULL OR sn.PlayerID NOT IN (SELECT PlayerID FROM PlayerNameHistory))
+        ORDER BY sn.NameSeq
+    ''')
+    cursor.execute('''
+        INSERT INTO PlayerCurrentName (PlayerID, NameHistoryID, PlayerName, LastSeen)
+        SELECT PlayerID, NameHistoryID, PlayerName, LastSeen
+        FROM (
+            SELECT PlayerID, NameHistoryID, PlayerName, LastSeen,
+                   ROW_NUMBER() OVER (PARTITION BY PlayerID ORDER BY LastSeen DESC, NameHistoryID DESC) AS Recency
+            FROM PlayerNameHistory
+            WHERE PlayerID IN (SELECT PlayerID FROM StageNames)
+        )
+        WHERE Recency = 1
+        ON CONFLICT(PlayerID) DO UPDATE SET
+            NameHistoryID = excluded.NameHistoryID,
+            PlayerName = excluded.PlayerName,
+            LastSeen = excluded.LastSeen
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO MatchPerformance (
+            ResultID, MatchTimestamp, PlayerID, PlayerName, TeamID, Side, PlayerGroup, Kills, Deaths, CombatEffectiveness,
+            {', '.join(METRIC_NAMES)}, GroupSource
+        )
+        SELECT pr.ResultID, sm.MatchTimestamp, sp.PlayerID, sp.PlayerName, t.TeamID, sp.Side, sp.PlayerGroup,
+               sp.Kills, sp.Deaths, sp.CombatEffectiveness, {', '.join(f'sp.{name}' for name in METRIC_NAMES)},
+               sp.GroupSource
+        FROM StagePerformance sp
+        JOIN StageMatches sm ON sm.MatchSeq = sp.MatchSeq
+        JOIN ParsedResults pr ON pr.FileName = sm.FileName
+        LEFT JOIN Teams t ON t.TeamName = sp.TeamName
+        ORDER BY sp.RowSeq
+    ''')
+
+    cursor.execute('''
+        INSERT INTO PlayerTeamAffiliations (PlayerID, TeamID, FirstSeen, LastSeen, MatchesPlayed)
+        SELECT sp.PlayerID, t.TeamID, MIN(sm.MatchTimestamp), MAX(sm.MatchTimestamp), COUNT(*)
+        FROM StagePerformance sp
+        JOIN StageMatches sm ON sm.MatchSeq = sp.MatchSeq
+        JOIN Teams t ON t.TeamName = sp.TeamName
+        GROUP BY sp.PlayerID, t.TeamID
+        ON CONFLICT(PlayerID, TeamID) DO UPDATE SET
+            FirstSeen = MIN(FirstSeen, excluded.FirstSeen),
+            LastSeen = MAX(LastSeen, excluded.LastSeen),
+            MatchesPlayed = MatchesPlayed + excluded.MatchesPlayed
+    ''')
+
+    # The affiliation played most recently becomes the current team, however old the staged matches are
+    cursor.execute('''
+        INSERT INTO PlayerCurrentTeam (PlayerID, AffiliationID, TeamID, LastSeen)
+        SELECT PlayerID, AffiliationID, TeamID, LastSeen
+        FROM (
+            SELECT PlayerID, AffiliationID, TeamID, LastSeen,
+                   ROW_NUMBER() OVER (PARTITION BY PlayerID ORDER BY LastSeen DESC, AffiliationID DESC) AS Recency
+            FROM PlayerTeamAffiliations
+            WHERE PlayerID IN (SELECT PlayerID FROM StagePerformance WHERE TeamName IS NOT NULL)
+        )
+        WHERE Recency = 1
+        ON CONFLICT(PlayerID) DO UPDATE SET
+            AffiliationID = excluded.AffiliationID,
+            TeamID = excluded.TeamID,
+            LastSeen = excluded.LastSeen
+    ''')
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO Weapons (WeaponName)
+        SELECT DISTINCT WeaponName FROM StageWeapons
+    ''')
+    for table, column, is_death in [('WeaponKills', 'Kills', 0), ('WeaponDeaths', 'Deaths', 1)]:
+        cursor.execute(f'''
+            INSERT INTO {table} (ResultID, PlayerID, WeaponID, {column})
+            SELECT pr.ResultID, sw.PlayerID, w.WeaponID, SUM(sw.WeaponCount)
+            FROM StageWeapons sw
+            JOIN StageMatches sm ON sm.MatchSeq = sw.MatchSeq
+            JOIN ParsedResults pr ON pr.FileName = sm.FileName
+            JOIN Weapons w ON w.WeaponName = sw.WeaponName
+            WHERE sw.IsDeath = ?
+            GROUP BY pr.ResultID, sw.PlayerID, w.WeaponID
+        ''', (is_death,))
+
+    cursor.execute('''
+        INSERT INTO PlayerKillEdges (ResultID, KillerID, VictimID, KillerName, VictimName, Kills)
+        SELECT pr.ResultID, se.KillerID, se.VictimID, se.KillerName, se.VictimName, se.Kills
+        FROM StageEdges se
+        JOIN StageMatches sm ON sm.MatchSeq = se.MatchSeq
+        JOIN ParsedResults pr ON pr.FileName = sm.FileName
+        ORDER BY se.rowid
+    ''')
+
+    cursor.execute('''
+        SELECT pr.ResultID
+        FROM StageMatches sm
+        JOIN ParsedResults pr ON pr.FileName = sm.FileName
+    ''')
+    result_ids = [row[0] for row in cursor.fetchall()]
+    update_aggregates(conn, result_ids)
+    ratings.rate_new_matches(conn, result_ids)
+
+@instrumentation.timed('bulk_load_matches')
+def bulk_load_matches(conn, prepared_matches):
+    """Load matches built by prepare_match inside one explicit transaction.
+
+    Rows go into temporary staging tables with executemany and are merged into the
+    real tables with set-based statements, so the number of statements does not grow
+    with the number of players. Matches whose file name, source CSV hash or payload
+    hash is already in ParsedResults, or earlier in the batch, are skipped.
+    Returns the number of matches loaded.
+    """
+    if not prepared_matches:
+        return 0
+
+    current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        conn.execute('BEGIN')
+
+    try:
+        _create_staging_tables(conn)
+        loaded = _stage_matches(conn, prepared_matches, current_date)
+        if loaded:
+            _merge_staged_matches(conn, current_date)
+        _create_staging_tables(conn)  # Leave the staging tables empty
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+
+    if owns_transaction:
+        conn.commit()
+    return loaded
+
+def load_archive(conn, archive_path):
+    """Bulk load every match in a season archive. Returns the number of matches loaded."""
+    from match_archive import MatchArchive
+
+    with MatchArchive(archive_path) as archive:
+        prepared_matches = [match.prepared() for match in archive]
+    return bulk_load_matches(conn, prepared_matches)
+
+@instrumentation.timed('load_json_file')
+def load_json_file(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@instrumentation.timed('process_new_json_files')
 def process_new_json_files():
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     create_tables(conn)
-    
+
+    backfill_payload_hashes(conn, parsed_csvs_folder)
+    backfill_match_points(conn, parsed_csvs_folder)
+    conn.commit()
     processed_files = get_processed_files(conn)
-    
-    for filename in os.listdir(parsed_csvs_folder):
-        if filename.endswith('.json') and filename not in processed_files:
+
+    prepared_matches = []
+    for filename in match_files(parsed_csvs_folder):
+        if filename not in processed_files:
             file_path = os.path.join(parsed_csvs_folder, filename)
             print(f"Processing new file: {filename}")
-            process_json_file(conn, file_path)
-    
-    conn.commit()
+            prepared_matches.append(prepare_match(filename, load_json_file(file_path)))
+
+    loaded = bulk_load_matches(conn, prepared_matches)
+    if loaded < len(prepared_matches):
+        print(f"Skipped {len(prepared_matches) - loaded} file(s) containing matches that were already loaded.")
+
+    # Streamed matches can be larger than memory, so they are loaded record by record
+    for filename in match_files(parsed_csvs_folder, (NDJSON_EXTENSION,)):
+        if filename not in processed_files:
+            print(f"Processing new file: {filename}")
+            process_ndjson_file(conn, os.path.join(parsed_csvs_folder, filename))
+            conn.commit()
     conn.close()
 
 if __name__ == "__main__":
@@ -7,7 +7,9 @@ from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 from matplotlib.pyplot import subplot
 from typing import List, Dict, Any, Union, Tuple, cast
-from weapon_data import WeaponData
+from match_analysis import MatchAnalysis
+from match_output import unique_output_path
+import instrumentation
 
 def sanitize_filename(text: str) -> str:
     invalid_chars = '<>:"/\\|?*'
@@ -31,77 +33,7 @@ def format_with_commas(x: float, p: Any) -> str:
 
 def analyze_mg_deaths(data: Dict[str, Any]) -> Tuple[Dict[str, int], Dict[str, int]]:
     """Analyze MG player deaths for both teams."""
-    # Initialize death categories for both teams
-    death_categories = ['Small Arms', 'Sniper', 'Tank', 'Artillery', 'Explosives']
-    
-    mg_deaths = {
-        'Axis': dict.fromkeys(death_categories, 0),
-        'Allies': dict.fromkeys(death_categories, 0)
-    }
-    
-    def categorize_weapon(weapon: str) -> str:
-        """Categorize weapon into death source category."""
-        weapon_upper = weapon.upper()
-        
-        # Artillery weapons
-        if any(artillery in weapon_upper for artillery in ['HOWITZER', '155MM', '150MM', '122MM']):
-            return 'Artillery'
-            
-        # Tank weapons
-        elif any(tank in weapon_upper for tank in ['SHERMAN', 'TIGER', 'PANZER', 'T34', 'CHURCHILL', 'STUART', 
-                                                 'LUCHS', 'PUMA', 'CANNON', 'MM GUN', 'KWK']):
-            return 'Tank'
-            
-        # Sniper weapons
-        elif any(sniper in weapon_upper for sniper in ['SCOPED', 'SNIPER', 'X8', 'X4']):
-            return 'Sniper'
-            
-        # Explosive weapons
-        elif any(explosive in weapon_upper for explosive in ['GRENADE', 'MINE', 'PANZERSCHRECK', 'BAZOOKA', 
-                                                          'STIELHANDGRANATE', 'DYNAMITE', 'TNT']):
-            return 'Explosives'
-            
-        # Default to small arms
-        else:
-            return 'Small Arms'
-
-    def is_mg_player(weapons: Dict[str, int]) -> bool:
-        """Determine if a player is primarily an MG player."""
-        if not weapons:  # Handle empty weapons dict
-            return False
-            
-        total_kills = sum(weapons.values())
-        if total_kills == 0:
-            return False
-            
-        mg_kills = sum(count for weapon, count in weapons.items() 
-                      if weapon in WeaponData.MACHINE_GUNS)
-        return (mg_kills / total_kills * 100) >= 50.0
-
-    # Process each team's data
-    for side in ['Axis', 'Allies']:
-        if side not in data:  # Skip if team data is missing
-            continue
-            
-        for group in ['Infantry', 'Artillery', 'Armor']:
-            if group not in data[side]:  # Skip if group data is missing
-                continue
-                
-            if 'Players' not in data[side][group]:  # Skip if player data is missing
-                continue
-                
-            for player in data[side][group]['Players']:
-                if not is_mg_player(player.get('Weapons', {})):
-                    continue
-                    
-                # Process death sources
-                for weapon, count in player.get('DeathByWeapons', {}).items():
-                    if not isinstance(count, (int, float)):  # Skip invalid count data
-                        continue
-                        
-                    category = categorize_weapon(weapon)
-                    mg_deaths[side][category] += int(count)  # Explicitly convert to int
-
+    mg_deaths = MatchAnalysis.for_match(data).mg_deaths
     return mg_deaths['Axis'], mg_deaths['Allies']
 
 def create_mg_death_subplot(ax: Any, axis_deaths: Dict[str, int], allies_deaths: Dict[str, int],
@@ -158,25 +90,19 @@ def create_subplot(ax: Any, data: Dict[str, Any], category: str, team1_name: str
     ax1 = ax
     ax2 = ax1.twinx()
     
-    # Create empty lists to store bar containers for legend
-    team1_bars = []
-    team2_bars = []
-    
-    # Plot bars on appropriate axes
-    for i, (metric, t1_val, t2_val) in enumerate(zip(full_metrics, team1_values, team2_values)):
-        if metric in high_value_metrics:
-            ax_to_use = ax2
-            alpha = 0.7  # Slightly transparent for high-value bars
-        else:
-            ax_to_use = ax1
-            alpha = 1.0  # Solid for low-value bars
-            
-        t1_bar = ax_to_use.bar(x[i] - width/2, t1_val, width, color=colors[0], alpha=alpha)
-        t2_bar = ax_to_use.bar(x[i] + width/2, t2_val, width, color=colors[1], alpha=alpha)
-        
-        if i == 0:  # Only store one set of bars for the legend
-            team1_bars.append(t1_bar)
-            team2_bars.append(t2_bar)
+    # One bar call per team and axis; high-value metrics go on the secondary axis
+    is_high = np.array([metric in high_value_metrics for metric in full_metrics])
+    team1_array = np.array(team1_values, dtype=float)
+    team2_array = np.array(team2_values, dtype=float)
+
+    legend_bars = []
+    for ax_to_use, mask, alpha in [(ax1, ~is_high, 1.0), (ax2, is_high, 0.7)]:  # High-value bars slightly transparent
+        if not mask.any():
+            continue
+        t1_bar = ax_to_use.bar(x[mask] - width/2, team1_array[mask], width, color=colors[0], alpha=alpha)
+        t2_bar = ax_to_use.bar(x[mask] + width/2, team2_array[mask], width, color=colors[1], alpha=alpha)
+        if not legend_bars:  # Only store one set of bars for the legend
+            legend_bars = [t1_bar, t2_bar]
 
     # Configure primary y-axis (low values)
     ax1.set_ylabel('Kills/Deaths/Combat Effectiveness', color='white', fontsize=10)
@@ -208,10 +134,18 @@ def create_subplot(ax: Any, data: Dict[str, Any], category: str, team1_name: str
                               fontsize=8, color='white')
     
     # Add legend using the first set of bars
-    ax1.legend([team1_bars[0], team2_bars[0]], [team1_name, team2_name],
+    ax1.legend(legend_bars, [team1_name, team2_name],
                loc='upper right', framealpha=0.8, facecolor='#333333', edgecolor='none')
     
-def create_comprehensive_comparison(data: Dict[str, Any], directory: str) -> str:
+@instrumentation.timed('create_comprehensive_comparison')
+def create_comprehensive_comparison(data: Dict[str, Any], directory: str, dpi: int = 300,
+                                    file_format: str = 'png', name_suffix: str | None = None) -> str:
+    """Draw the comparison graph of a match and return the path of the file.
+
+    The file name ends in name_suffix when given, so a caller that names files after the
+    match content gets one file per match; otherwise it ends in the current time and is
+    numbered if that name is already taken.
+    """
     plt.style.use('dark_background')
     
     # Setup
@@ -254,12 +188,16 @@ def create_comprehensive_comparison(data: Dict[str, Any], directory: str) -> str
              bbox=dict(facecolor='#333333', edgecolor='none', alpha=0.8))
     
     # Adjust layout and save
-    plt.tight_layout(rect=(0, 0.04, 1, 0.94))
-    
-    timestamp = int(time.time())
-    output_file = os.path.join(directory, 
-                              f'match_comparison_{team1_name_safe}_vs_{team2_name_safe}_{timestamp}.png')
-    plt.savefig(output_file, dpi=300, facecolor='#1c1c1c', edgecolor='none', bbox_inches='tight')
+    with instrumentation.span('tight_layout'):
+        plt.tight_layout(rect=(0, 0.04, 1, 0.94))
+    
+    file_name = f'match_comparison_{team1_name_safe}_vs_{team2_name_safe}_{name_suffix or int(time.time())}.{file_format}'
+    if name_suffix is None:
+        output_file = unique_output_path(directory, file_name)
+    else:
+        output_file = os.path.join(directory, file_name)
+    with instrumentation.span('savefig'):
+        plt.savefig(output_file, dpi=dpi, format=file_format, facecolor='#1c1c1c', edgecolor='none', bbox_inches='tight')
     plt.close()
     
     return output_file
\ No newline at end of file
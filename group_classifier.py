@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import numpy as np
+from typing import Any, NamedTuple
+import db_operations
+from weapon_data import weapon_index
+
+GROUPS: list[str] = ['Infantry', 'Artillery', 'Armor']
+# Kills, deaths and points as stored on MatchPerformance and in the player dicts
+NUMBER_COLUMNS: list[str] = ['Kills', 'Deaths', 'CombatEffectiveness', 'OffensivePoints', 'DefensivePoints', 'SupportPoints']
+
+CACHE_SUFFIX = '.groups.npz'
+REVIEW_CONFIDENCE = 0.8
+MIN_TRAINING_ROWS = 200
+MAX_TRAINING_ROWS = 50000
+MAX_WEAPONS = 160
+HOLDOUT_SHARE = 0.2
+# Groups a person confirmed; the model's own predictions and the unreviewed weapon heuristic would
+# teach it its own mistakes. Rows without a GroupSource predate the classifier and are kept.
+TRAINING_SOURCES: list[str] = ['reviewed', 'override']
+
+def cache_path_for(db_file: str) -> str:
+    """Default model file kept next to the database."""
+    return os.path.splitext(db_file)[0] + CACHE_SUFFIX
+
+class GroupPrediction(NamedTuple):
+    group: str
+    confidence: float
+    probabilities: dict[str, float]
+
+class GroupClassifier:
+    """Multinomial logistic regression from weapon kills and points to Infantry, Artillery or Armor.
+
+    A player's features are the log-scaled kills with each of the most used weapons, the
+    share of kills with Infantry, Artillery, Armor and unknown weapons, and the log-scaled
+    kills, deaths and points, standardized with the training mean and spread. classify()
+    scores a whole match with one matrix product; the highest probability is the confidence.
+    """
+
+    def __init__(self, weapons: list[str], mean: np.ndarray, scale: np.ndarray, weights: np.ndarray,
+                 bias: np.ndarray, accuracy: float = 0.0, rows: int = 0, generation: int = 0) -> None:
+        self.weapons = weapons
+        self.weapon_columns: dict[str, int] = {weapon: column for column, weapon in enumerate(weapons)}
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.bias = bias
+        self.accuracy = accuracy
+        self.rows = rows
+        self.generation = generation
+        self.review_confidence = REVIEW_CONFIDENCE
+
+    @classmethod
+    def train(cls, conn: sqlite3.Connection, l2: float = 1e-3, iterations: int = 400,
+              learning_rate: float = 0.5) -> 'GroupClassifier | None':
+        """Fit on the confirmed MatchPerformance groups; None when there are too few rows to learn from.
+
+        The latest matches are held out to measure accuracy, then the model is refitted on every row.
+        """
+        generation = db_operations.get_ingest_generation(conn)
+        data = load_training_data(conn)
+        if data is None:
+            return None
+        weapons, weapon_counts, group_kills, numbers, labels, result_ids, _ = data
+
+        features = _raw_features(weapon_counts, group_kills, numbers)
+        holdout = result_ids >= np.quantile(np.unique(result_ids), 1 - HOLDOUT_SHARE)
+        accuracy = 0.0
+        if holdout.any() and not holdout.all():
+            model = cls._fit(weapons, features[~holdout], labels[~holdout], l2, iterations, learning_rate)
+            accuracy = float((model._probabilities(features[holdout]).argmax(axis=1) == labels[holdout]).mean())
+
+        model = cls._fit(weapons, features, labels, l2, iterations, learning_rate)
+        model.accuracy = accuracy
+        model.rows = len(labels)
+        model.generation = generation
+        return model
+
+    @classmethod
+    def _fit(cls, weapons: list[str], features: np.ndarray, labels: np.ndarray, l2: float,
+             iterations: int, learning_rate: float) -> 'GroupClassifier':
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        standardized = (features - mean) / scale
+
+        # Full-batch gradient descent on the mean cross-entropy; standardized features keep one step size stable
+        targets = np.eye(len(GROUPS))[labels]
+        weights = np.zeros((features.shape[1], len(GROUPS)))
+        bias = np.zeros(len(GROUPS))
+        for _ in range(iterations):
+            error = (_softmax(standardized @ weights + bias) - targets) / len(labels)
+            weights -= learning_rate * (standardized.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(weapons, mean, scale, weights, bias)
+
+    def _probabilities(self, features: np.ndarray) -> np.ndarray:
+        return _softmax(((features - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def classify(self, players: list[dict[str, Any]]) -> list[GroupPrediction]:
+        """Score players in the PlayerData.to_dict shape, in order."""
+        weapon_counts = np.zeros((len(players), len(self.weapons)))
+        group_kills = np.zeros((len(players), len(GROUPS) + 1))
+        numbers = np.array([[player.get(column) or 0 for column in NUMBER_COLUMNS] for player in players],
+                           dtype=np.float64).reshape(len(players), len(NUMBER_COLUMNS))
+        for index, player in enumerate(players):
+            for weapon, count in player['Weapons'].items():
+                column = self.weapon_columns.get(weapon)
+                if column is not None:
+                    weapon_counts[index, column] += int(count)
+                group_kills[index, _weapon_group(weapon)] += int(count)
+
+        probabilities = self._probabilities(_raw_features(weapon_counts, group_kills, numbers))
+        choices = probabilities.argmax(axis=1).tolist()
+        return [GroupPrediction(GROUPS[choice], float(row[choice]), dict(zip(GROUPS, row)))
+                for choice, row in zip(choices, probabilities.tolist())]
+
+    def save(self, cache_file: str) -> None:
+        np.savez(
+            cache_file,
+            weapons=np.array(self.weapons, dtype=str),
+            mean=self.mean, scale=self.scale, weights=self.weights, bias=self.bias,
+            accuracy=np.array(self.accuracy), rows=np.array(self.rows), generation=np.array(self.generation)
+        )
+
+    @classmethod
+    def load(cls, cache_file: str) -> 'GroupClassifier':
+        with np.load(cache_file) as cache:
+            return cls(cache['weapons'].tolist(), cache['mean'], cache['scale'], cache['weights'], cache['bias'],
+                       float(cache['accuracy']), int(cache['rows']), int(cache['generation']))
+
+    @classmethod
+    def load_or_train(cls, conn: sqlite3.Connection, cache_file: str) -> 'GroupClassifier | None':
+        """The cached model if no match was loaded or retracted since it was trained, else a retrained one."""
+        try:
+            model = cls.load(cache_file)
+        except (OSError, KeyError, ValueError):
+            model = None
+        if model is not None and model.generation == db_operations.get_ingest_generation(conn):
+            return model
+        model = cls.train(conn)
+        if model is not None:
+            model.save(cache_file)
+        return model
+
+def load_training_data(conn: sqlite3.Connection, max_rows: int = MAX_TRAINING_ROWS,
+                       confirmed_only: bool = True) -> tuple | None:
+    """Weapon vocabulary, per-weapon kills, per-group kills, numbers, labels, ResultIDs and MatchPerformanceIDs of the latest rows.
+
+    Only players on a side with a known group and stored points are used, and with confirmed_only
+    only those whose group has a TRAINING_SOURCES or no recorded source.
+    """
+    source_filter = ''
+    if confirmed_only:
+        source_filter = f"AND (GroupSource IS NULL OR GroupSource IN ({', '.join('?' * len(TRAINING_SOURCES))}))"
+    rows = conn.execute(f'''
+        SELECT MatchPerformanceID, ResultID, PlayerGroup, {', '.join(NUMBER_COLUMNS)}
+        FROM MatchPerformance
+        WHERE Side IN ('Axis', 'Allies') AND PlayerGroup IN ('Infantry', 'Artillery', 'Armor')
+          AND OffensivePoints IS NOT NULL {source_filter}
+        ORDER BY MatchPerformanceID DESC
+        LIMIT ?
+    ''', (*(TRAINING_SOURCES if confirmed_only else []), max_rows)).fetchall()
+    labels = np.array([GROUPS.index(row[2]) for row in rows], dtype=np.int64)
+    if len(rows) < MIN_TRAINING_ROWS or len(np.unique(labels)) < 2:
+        return None
+
+    performance_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    order = np.argsort(performance_ids)
+    performance_ids = performance_ids[order]
+    labels = labels[order]
+    result_ids = np.array([row[1] for row in rows], dtype=np.int64)[order]
+    numbers = np.array([row[3:] for row in rows], dtype=np.float64)[order]
+
+    kills = np.array(conn.execute('''
+        SELECT mp.MatchPerformanceID, wk.WeaponID, wk.Kills
+        FROM MatchPerformance mp
+        JOIN WeaponKills wk ON wk.ResultID = mp.ResultID AND wk.PlayerID = mp.PlayerID
+        WHERE mp.MatchPerformanceID >= ?
+    ''', (int(performance_ids[0]),)).fetchall(), dtype=np.int64).reshape(-1, 3)
+    positions = np.searchsorted(performance_ids, kills[:, 0])
+    kept = positions < len(performance_ids)
+    kept[kept] = performance_ids[positions[kept]] == kills[kept, 0]
+    positions, weapon_ids, counts = positions[kept], kills[kept, 1], kills[kept, 2]
+
+    weapon_names = dict(conn.execute('SELECT WeaponID, WeaponName FROM Weapons').fetchall())
+    top_weapon_ids = np.argsort(-np.bincount(weapon_ids, weights=counts), kind='stable')[:MAX_WEAPONS]
+    top_weapon_ids = [weapon_id for weapon_id in top_weapon_ids.tolist() if weapon_id in weapon_names]
+    columns = np.full(max(weapon_names, default=0) + 1, -1, dtype=np.int64)
+    columns[top_weapon_ids] = np.arange(len(top_weapon_ids))
+    groups = np.array([_weapon_group(weapon_names[weapon_id]) if weapon_id in weapon_names else len(GROUPS)
+                       for weapon_id in range(len(columns))], dtype=np.int64)
+
+    weapon_counts = np.zeros((len(performance_ids), len(top_weapon_ids)))
+    in_vocabulary = columns[weapon_ids] >= 0
+    np.add.at(weapon_counts, (positions[in_vocabulary], columns[weapon_ids[in_vocabulary]]), counts[in_vocabulary])
+    group_kills = np.zeros((len(performance_ids), len(GROUPS) + 1))
+    np.add.at(group_kills, (positions, groups[weapon_ids]), counts)
+
+    weapons = [weapon_names[weapon_id] for weapon_id in top_weapon_ids]
+    return weapons, weapon_counts, group_kills, numbers, labels, result_ids, performance_ids
+
+def review_stored_groups(conn: sqlite3.Connection, model: GroupClassifier, limit: int = 20) -> list[tuple]:
+    """Stored players the model disagrees with or is unsure about, least confident first.
+
+    Every stored group is checked, including the unconfirmed ones the model was not trained on.
+    Rows are (FileName, PlayerID, PlayerName, stored group, predicted group, confidence).
+    """
+    data = load_training_data(conn, confirmed_only=False)
+    if data is None:
+        return []
+    weapons, weapon_counts, group_kills, numbers, labels, _, performance_ids = data
+    # The loaded columns follow the current weapon ranking, which can differ from the model's
+    model_counts = np.zeros((len(labels), len(model.weapons)))
+    for column, weapon in enumerate(weapons):
+        model_column = model.weapon_columns.get(weapon)
+        if model_column is not None:
+            model_counts[:, model_column] = weapon_counts[:, column]
+
+    probabilities = model._probabilities(_raw_features(model_counts, group_kills, numbers))
+    choices = probabilities.argmax(axis=1)
+    confidence = probabilities.max(axis=1)
+    flagged = np.flatnonzero((choices != labels) | (confidence < model.review_confidence))
+    flagged = flagged[np.argsort(confidence[flagged], kind='stable')][:limit]
+
+    review = []
+    for index in flagged.tolist():
+        file_name, player_id, player_name = conn.execute('''
+            SELECT pr.FileName, mp.PlayerID, mp.PlayerName
+            FROM MatchPerformance mp
+            JOIN ParsedResults pr ON pr.ResultID = mp.ResultID
+            WHERE mp.MatchPerformanceID = ?
+        ''', (int(performance_ids[index]),)).fetchone()
+        review.append((file_name, player_id, player_name, GROUPS[labels[index]], GROUPS[choices[index]], float(confidence[index])))
+    return review
+
+def print_group_review(conn: sqlite3.Connection, model: GroupClassifier, limit: int = 20) -> None:
+    print(f"Group classifier trained on {model.rows} players, {model.accuracy:.1%} accurate on the latest matches.")
+    review = review_stored_groups(conn, model, limit)
+    if not review:
+        print("No stored groups need review.")
+        return
+    print("\nStored groups to review (least confident first):")
+    for file_name, player_id, player_name, stored, predicted, confidence in review:
+        print(f"  {player_name} ({player_id}) in {file_name}: stored {stored}, classifier says {predicted} at {confidence:.0%}")
+
+def _weapon_group(weapon: str) -> int:
+    """Index of the weapon's WeaponData group, with unknown weapons last."""
+    info = weapon_index.lookup(weapon)
+    return GROUPS.index(info.group) if info.is_known else len(GROUPS)
+
+def _raw_features(weapon_counts: np.ndarray, group_kills: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    group_shares = group_kills / np.maximum(group_kills.sum(axis=1, keepdims=True), 1)
+    return np.hstack([np.log1p(weapon_counts), group_shares, np.log1p(np.maximum(numbers, 0))])
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    exponentials = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return exponentials / exponentials.sum(axis=1, keepdims=True)
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+import db_operations
+from batch_ingest import MANIFEST_FILENAME, ManifestError, load_manifest, parse_manifest_entry
+from match_output import write_match_json, source_hash, payload_hash, is_match_file
+from stream_parser import NDJSON_EXTENSION
+
+class DirectoryPoller:
+    """Finds files in a folder that are new since the last poll and have stopped changing.
+
+    The folder is only listed again when its modification time changes, which happens
+    whenever a file is created, renamed or deleted in it. Between listings a poll costs
+    one stat of the folder plus one stat per file still being written.
+    """
+
+    def __init__(self, folder: str, extensions: tuple[str, ...], settle_seconds: float) -> None:
+        self.folder = folder
+        self.extensions = extensions
+        self.settle_seconds = settle_seconds
+        self._folder_mtime: int | None = None
+        self._seen: set[str] = set()
+        self._pending: set[str] = set()
+
+    def mark_seen(self, file_names: list[str] | set[str]) -> None:
+        self._seen.update(file_names)
+        self._pending.difference_update(file_names)
+
+    def poll(self) -> list[tuple[str, float]]:
+        """(file name, modification time) of every new file that has settled."""
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if folder_mtime != self._folder_mtime:
+            self._folder_mtime = folder_mtime
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name not in self._seen and is_match_file(entry.name, self.extensions) and entry.is_file():
+                        self._pending.add(entry.name)
+
+        ready = []
+        now = time.time()
+        for file_name in sorted(self._pending):
+            try:
+                mtime = os.stat(os.path.join(self.folder, file_name)).st_mtime
+            except FileNotFoundError:
+                self._pending.discard(file_name)
+                continue
+            # A file modified within the settle time may still be being written or copied
+            if now - mtime >= self.settle_seconds:
+                ready.append((file_name, mtime))
+        self.mark_seen([file_name for file_name, _ in ready])
+        return ready
+
+class IngestService:
+    """Watches the CSV and JSON drop folders and loads new matches as they arrive.
+
+    New CSVs are parsed in worker processes using their entry in the folder's
+    manifest.json, written to the JSON folder and queued. JSON and NDJSON files dropped
+    straight into the JSON folder are queued as they are. One writer thread owns the
+    database connection and commits the queue in micro-batches: it waits at most
+    batch_window seconds for more matches after the first one arrives.
+    """
+
+    def __init__(self, csv_folder: str, json_folder: str, db_file: str | None = None, poll_interval: float = 1.0,
+                 settle_seconds: float = 2.0, batch_size: int = 50, batch_window: float = 1.0,
+                 workers: int | None = None, engine: str = 'rows', health_port: int | None = None,
+                 classify: bool = False) -> None:
+        self.csv_folder = csv_folder
+        self.json_folder = json_folder
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.engine = engine
+        self.classify = classify
+        self.health_port = health_port
+        self.csv_poller = DirectoryPoller(csv_folder, ('.csv',), settle_seconds)
+        self.json_poller = DirectoryPoller(json_folder, ('.json', NDJSON_EXTENSION), settle_seconds)
+
+        # Spawned workers do not inherit the health server socket or the database connection
+        self._parse_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        # SQLite connections belong to one thread, so every database call goes through this one
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-db')
+        self._conn = None
+        self._classifier = None
+        self._queue: asyncio.Queue | None = None
+        self._manifest: dict[str, dict[str, Any]] = {}
+        self._manifest_mtime: float | None = None
+        self._waiting_for_manifest: dict[str, float] = {}
+        self._in_progress = 0
+        self._started = time.time()
+        self.metrics: dict[str, Any] = {
+            'files_detected': 0,
+            'csvs_parsed': 0,
+            'matches_loaded': 0,
+            'duplicates_skipped': 0,
+            'failures': 0,
+            'batches_committed': 0,
+            'last_commit_at': None,
+            'last_lag_seconds': None,
+            'max_lag_seconds': None,
+            'last_error': None,
+        }
+
+    def health(self) -> dict[str, Any]:
+        """Counters plus queue depth and lag, served as JSON on the health port."""
+        return {
+            'status': 'degraded' if self.metrics['last_error'] else 'ok',
+            'uptime_seconds': round(time.time() - self._started, 1),
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'parsing': self._in_progress,
+            'waiting_for_manifest': sorted(self._waiting_for_manifest),
+            **self.metrics,
+        }
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        await loop.run_in_executor(self._db_executor, self._open_database)
+        print(f"Watching {self.csv_folder} and {self.json_folder} every {self.poll_interval:g}s")
+
+        server = None
+        if self.health_port:
+            server = await asyncio.start_server(self._serve_health, '127.0.0.1', self.health_port)
+            print(f"Health and lag metrics on http://127.0.0.1:{self.health_port}/health")
+
+        try:
+            # Stop cleanly when a service manager sends SIGTERM
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass  # Windows event loops have no signal handlers; Ctrl+C still works
+
+        writer = asyncio.create_task(self._write_batches())
+        try:
+            while True:
+                self._poll_folders()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            writer.cancel()
+            if server is not None:
+                server.close()
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            await loop.run_in_executor(self._db_executor, self._close_database)
+            self._db_executor.shutdown(wait=True)
+
+    def _open_database(self) -> None:
+        self._conn = db_operations.connect(self.db_file)
+        db_operations.create_tables(self._conn)
+        db_operations.backfill_payload_hashes(self._conn, self.json_folder)
+        db_operations.backfill_match_points(self._conn, self.json_folder)
+        self._conn.commit()
+        # Loaded files are read once at startup; afterwards the pollers only report new ones
+        self.json_poller.mark_seen(db_operations.get_processed_files(self._conn))
+        if self.classify:
+            # Trained once at startup; the matches loaded while watching are used on the next start
+            from group_classifier import GroupClassifier, cache_path_for
+            self._classifier = GroupClassifier.load_or_train(self._conn, cache_path_for(self.db_file or db_operations.db_path))
+            if self._classifier is None:
+                print("Not enough classified matches to train the group classifier; using the weapon heuristic.")
+
+    def _close_database(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _poll_folders(self) -> None:
+        # Lag is measured from when a file landed, or from startup for files that were already waiting
+        for file_name, mtime in self.json_poller.poll():
+            self.metrics['files_detected'] += 1
+            self._start(self._queue_json(file_name, max(mtime, self._started)))
+
+        manifest_path = os.path.join(self.csv_folder, MANIFEST_FILENAME)
+        try:
+            manifest_mtime = os.stat(manifest_path).st_mtime
+        except FileNotFoundError:
+            manifest_mtime = None
+        if manifest_mtime != self._manifest_mtime:
+            self._manifest_mtime = manifest_mtime
+            self._reload_manifest(manifest_path)
+
+        ready = self.csv_poller.poll()
+        self.metrics['files_detected'] += len(ready)
+        for file_name, mtime in ready:
+            self._waiting_for_manifest[file_name] = max(mtime, self._started)
+        for file_name, mtime in list(self._waiting_for_manifest.items()):
+            if file_name in self._manifest:
+                del self._waiting_for_manifest[file_name]
+                self._start(self._parse_csv(file_name, mtime))
+
+    def _reload_manifest(self, manifest_path: str) -> None:
+        if self._manifest_mtime is None:
+            self._manifest = {}
+            return
+        try:
+            self._manifest = load_manifest(manifest_path)
+        except ManifestError as e:
+            # Keep the previous manifest until the file is fixed
+            self._record_error(str(e))
+
+    def _start(self, coroutine: Any) -> None:
+        self._in_progress += 1
+        task = asyncio.ensure_future(coroutine)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._in_progress -= 1
+        if not task.cancelled() and task.exception() is not None:
+            self._record_error(f"{type(task.exception()).__name__} - {task.exception()}")
+
+    async def _parse_csv(self, file_name: str, arrived: float) -> None:
+        loop = asyncio.get_running_loop()
+        csv_path = os.path.join(self.csv_folder, file_name)
+        csv_hash = await loop.run_in_executor(None, source_hash, csv_path)
+        loaded_as = await self._database(db_operations.find_loaded_match, source_hash=csv_hash)
+        if loaded_as is not None:
+            self.metrics['duplicates_skipped'] += 1
+            return
+
+        print(f"Parsing {file_name}")
+        parsed_results = await loop.run_in_executor(self._parse_executor, parse_manifest_entry,
+                                                    csv_path, self._manifest[file_name], self.engine, self._classifier)
+        parsed_results['Source Hash'] = csv_hash
+        self.metrics['csvs_parsed'] += 1
+        loaded_as = await self._database(db_operations.find_loaded_match, match_hash=payload_hash(parsed_results))
+        if loaded_as is not None:
+            self.metrics['duplicates_skipped'] += 1
+            return
+
+        output_file = await loop.run_in_executor(None, write_match_json, parsed_results, self.json_folder)
+        json_name = os.path.basename(output_file)
+        self.json_poller.mark_seen([json_name])
+        prepared = await loop.run_in_executor(None, db_operations.prepare_match, json_name, parsed_results)
+        await self._queue.put((arrived, prepared))
+
+    async def _queue_json(self, file_name: str, arrived: float) -> None:
+        file_path = os.path.join(self.json_folder, file_name)
+        if file_name.endswith(NDJSON_EXTENSION):
+            await self._queue.put((arrived, file_path))
+            return
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, db_operations.load_json_file, file_path)
+        prepared = await loop.run_in_executor(None, db_operations.prepare_match, file_name, data)
+        await self._queue.put((arrived, prepared))
+
+    async def _database(self, function: Any, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, lambda: function(self._conn, *args, **kwargs))
+
+    async def _write_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await loop.run_in_executor(self._db_executor, self._commit_batch, batch)
+            except Exception as e:
+                self.metrics['failures'] += len(batch)
+                self._record_error(f"Batch of {len(batch)} not loaded: {type(e).__name__} - {e}")
+
+    def _commit_batch(self, batch: list[tuple[float, Any]]) -> None:
+        """Load one micro-batch; runs on the database thread."""
+        prepared_matches = [item for _, item in batch if not isinstance(item, str)]
+        loaded = db_operations.bulk_load_matches(self._conn, prepared_matches)
+        skipped = len(prepared_matches) - loaded
+
+        # Streamed matches can be larger than memory, so they are loaded record by record
+        for _, file_path in batch:
+            if isinstance(file_path, str):
+                try:
+                    if db_operations.process_ndjson_file(self._conn, file_path) is None:
+                        skipped += 1
+                    else:
+                        loaded += 1
+                    self._conn.commit()
+                except Exception as e:
+                    self._conn.rollback()
+                    self.metrics['failures'] += 1
+                    self._record_error(f"{os.path.basename(file_path)} not loaded: {type(e).__name__} - {e}")
+
+        committed = time.time()
+        lag = max(committed - arrived for arrived, _ in batch)
+        self.metrics['matches_loaded'] += loaded
+        self.metrics['duplicates_skipped'] += skipped
+        self.metrics['batches_committed'] += 1
+        self.metrics['last_commit_at'] = datetime.fromtimestamp(committed).isoformat(timespec='seconds')
+        self.metrics['last_lag_seconds'] = round(lag, 2)
+        self.metrics['max_lag_seconds'] = round(max(lag, self.metrics['max_lag_seconds'] or 0), 2)
+        print(f"Loaded {loaded} match(es), skipped {skipped} duplicate(s), {lag:.1f}s after the oldest file in the batch arrived")
+
+    def _record_error(self, message: str) -> None:
+        print(f"Error: {message}")
+        self.metrics['last_error'] = message
+
+    async def _serve_health(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            path = request_line[1] if len(request_line) > 1 else '/'
+            if path in ('/', '/health', '/metrics'):
+                status, body = '200 OK', json.dumps(self.health(), indent=2)
+            else:
+                status, body = '404 Not Found', json.dumps({'error': f"Unknown path {path}"})
+            payload = body.encode('utf-8')
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode('latin-1') + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+def run_ingest_service(service: IngestService) -> int:
+    try:
+        asyncio.run(service.run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\nIngest service stopped.")
+    return 0
@@ -0,0 +1,174 @@
+import json
+import time
+import functools
+import pstats
+import cProfile
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable
+
+# Stage timings and counters for one run. Everything is a no-op until enable() is called,
+# so the spans can stay in the hot paths of the parser and the loaders.
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_spans: dict[str, list[float]] = {}  # path -> [calls, total seconds, max seconds]
+_counters: dict[str, int] = {}
+_started = time.perf_counter()
+
+class _Span:
+    __slots__ = ('name', 'path', 'start')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        stack = _stack()
+        self.path = f"{stack[-1]} > {self.name}" if stack else self.name
+        stack.append(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        _stack().pop()
+        _record(self.path, 1, elapsed, elapsed)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def _stack() -> list[str]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _record(path: str, calls: int, total: float, longest: float) -> None:
+    with _lock:
+        stats = _spans.get(path)
+        if stats is None:
+            _spans[path] = [calls, total, longest]
+        else:
+            stats[0] += calls
+            stats[1] += total
+            stats[2] = max(stats[2], longest)
+
+def enable() -> None:
+    global _enabled, _started
+    _enabled = True
+    _started = time.perf_counter()
+
+def is_enabled() -> bool:
+    return _enabled
+
+def span(name: str) -> Any:
+    """Context manager timing one stage; spans opened inside it are reported under its path."""
+    return _Span(name) if _enabled else _NO_SPAN
+
+def timed(name: str) -> Callable:
+    """Decorator that runs the whole function inside span(name)."""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name: str, amount: int = 1) -> None:
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+def trace_connection(conn: sqlite3.Connection) -> None:
+    """Count every SQL statement the connection runs, including each executemany row."""
+    if _enabled:
+        conn.set_trace_callback(lambda statement: count('sql_statements'))
+
+def snapshot() -> dict[str, Any]:
+    with _lock:
+        return {'spans': {path: list(stats) for path, stats in _spans.items()}, 'counters': dict(_counters)}
+
+def merge(recorded: dict[str, Any]) -> None:
+    """Add the spans and counters recorded by a worker process."""
+    for path, (calls, total, longest) in recorded['spans'].items():
+        _record(path, calls, total, longest)
+    for name, amount in recorded['counters'].items():
+        count(name, amount)
+
+def call_recorded(enabled: bool, func: Callable, *args: Any, **kwargs: Any) -> tuple[Any, dict[str, Any] | None]:
+    """Run func in a worker process and return its result with the spans it recorded.
+
+    Pass is_enabled() from the parent; the worker's spans start empty for every call.
+    """
+    if not enabled:
+        return func(*args, **kwargs), None
+    enable()
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+    result = func(*args, **kwargs)
+    return result, snapshot()
+
+def unwrap_recorded(recorded_result: tuple[Any, dict[str, Any] | None]) -> Any:
+    """The result of call_recorded, merging the worker's spans into this process."""
+    result, recorded = recorded_result
+    if recorded is not None:
+        merge(recorded)
+    return result
+
+def report(command: str | None = None) -> dict[str, Any]:
+    """Machine-readable timing report: wall time, per-stage totals and counters."""
+    recorded = snapshot()
+    return {
+        'command': command,
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'wall_seconds': round(time.perf_counter() - _started, 6),
+        'stages': [
+            {
+                'stage': path.rsplit(' > ', 1)[-1],
+                'path': path,
+                'calls': int(calls),
+                'total_seconds': round(total, 6),
+                'mean_ms': round(total / calls * 1000, 3),
+                'max_ms': round(longest * 1000, 3),
+            }
+            for path, (calls, total, longest) in sorted(recorded['spans'].items())
+        ],
+        'counters': dict(sorted(recorded['counters'].items())),
+    }
+
+def write_report(file_name: str, command: str | None = None) -> dict[str, Any]:
+    timing_report = report(command)
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump(timing_report, f, indent=4)
+    return timing_report
+
+def print_report(timing_report: dict[str, Any]) -> None:
+    print(f"\nTimings ({timing_report['wall_seconds']:.2f} s wall):")
+    for stage in timing_report['stages']:
+        depth = stage['path'].count(' > ')
+        print(f"  {'  ' * depth}{stage['stage']:<{40 - 2 * depth}} {stage['calls']:>7} calls {stage['total_seconds']:>9.3f} s")
+    for name, value in timing_report['counters'].items():
+        print(f"  {name:<40} {value:>7}")
+
+def run_profiled(profile_file: str, func: Callable, *args: Any, top: int = 20) -> Any:
+    """Run func under cProfile, dump the stats to profile_file and print the slowest calls."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(profile_file)
+        print(f"\nProfile written to {profile_file}; top {top} by cumulative time:")
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
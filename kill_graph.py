@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import numpy as np
+from scipy import sparse
+from typing import Any
+
+CACHE_SUFFIX = '.killgraph.npz'
+
+def cache_path_for(db_file: str) -> str:
+    """Default cache file kept next to the database."""
+    return os.path.splitext(db_file)[0] + CACHE_SUFFIX
+
+class KillGraph:
+    """Season-wide player x player kill matrix built from PlayerKillEdges.
+
+    Rows are killers and columns victims, both indexed by PlayerID in the order the
+    players were first seen. A team x team matrix of the same kills, keyed by the
+    TeamID each side had in that match, is kept alongside. update() folds in only
+    the matches loaded since the last call, and save()/load() keep the result on disk.
+    """
+
+    def __init__(self) -> None:
+        self.player_ids: list[str] = []
+        self.player_index: dict[str, int] = {}
+        self.team_ids: list[int] = []
+        self.team_index: dict[int, int] = {}
+        self.kills = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.team_kills = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.result_ids: set[int] = set()
+
+    @classmethod
+    def build(cls, conn: sqlite3.Connection) -> 'KillGraph':
+        graph = cls()
+        graph.update(conn)
+        return graph
+
+    def update(self, conn: sqlite3.Connection) -> int:
+        """Add the edges of matches loaded since the last update. Returns the number of new matches.
+
+        If a match that was already counted has since been retracted, the graph is rebuilt.
+        """
+        cursor = conn.cursor()
+        cursor.execute('SELECT ResultID FROM ParsedResults')
+        loaded = set(row[0] for row in cursor.fetchall())
+        last_result_id = max(self.result_ids, default=0)
+        new_result_ids = loaded - self.result_ids
+        # ResultIDs only ever grow, so anything else means the graph no longer matches the database
+        if not self.result_ids <= loaded or min(new_result_ids, default=last_result_id + 1) <= last_result_id:
+            self.__init__()
+            last_result_id, new_result_ids = 0, loaded
+        if not new_result_ids:
+            return 0
+
+        # Edges come back as Players rowids so no PlayerID strings cross into Python per edge
+        cursor.execute('SELECT rowid, PlayerID FROM Players')
+        players = cursor.fetchall()
+        rowid_lookup = np.zeros(max((rowid for rowid, _ in players), default=0) + 1, dtype=np.int64)
+        rowid_lookup[[rowid for rowid, _ in players]] = self._codes([player_id for _, player_id in players],
+                                                                    self.player_ids, self.player_index)
+        cursor.execute('''
+            SELECT e.ResultID, k.rowid, v.rowid, e.Kills
+            FROM PlayerKillEdges e
+            JOIN Players k ON k.PlayerID = e.KillerID
+            JOIN Players v ON v.PlayerID = e.VictimID
+            WHERE e.ResultID > ?
+        ''', (last_result_id,))
+        edges = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+        cursor.execute('''
+            SELECT mp.ResultID, p.rowid, mp.TeamID
+            FROM MatchPerformance mp
+            JOIN Players p ON p.PlayerID = mp.PlayerID
+            WHERE mp.ResultID > ? AND mp.TeamID IS NOT NULL
+        ''', (last_result_id,))
+        teams = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+        self.result_ids.update(new_result_ids)
+
+        result_ids, killers, victims, kills = edges.T
+        self.kills = self._add(self.kills, rowid_lookup[killers], rowid_lookup[victims], kills, len(self.player_ids))
+
+        # Look up each side's team for that match by (ResultID, rowid); spectators have
+        # no team, so their kills only count towards the player matrix
+        stride = len(rowid_lookup)
+        team_keys = teams[:, 0] * stride + teams[:, 1]
+        order = np.argsort(team_keys, kind='stable')
+        team_keys, key_teams = team_keys[order], teams[order, 2]
+        killer_teams = self._team_of(team_keys, key_teams, result_ids * stride + killers)
+        victim_teams = self._team_of(team_keys, key_teams, result_ids * stride + victims)
+        with_teams = (killer_teams >= 0) & (victim_teams >= 0)
+        if with_teams.any():
+            team_ids = np.unique(np.concatenate([killer_teams[with_teams], victim_teams[with_teams]]))
+            team_lookup = np.zeros(team_ids.max() + 1, dtype=np.int64)
+            team_lookup[team_ids] = self._codes(team_ids.tolist(), self.team_ids, self.team_index)
+            self.team_kills = self._add(self.team_kills, team_lookup[killer_teams[with_teams]],
+                                        team_lookup[victim_teams[with_teams]], kills[with_teams], len(self.team_ids))
+        return len(new_result_ids)
+
+    @staticmethod
+    def _team_of(team_keys: np.ndarray, key_teams: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """TeamID for each key in the sorted team_keys, or -1 where the player had no team."""
+        if not len(team_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(team_keys, keys), len(team_keys) - 1)
+        return np.where(team_keys[positions] == keys, key_teams[positions], -1)
+
+    @staticmethod
+    def _codes(keys: Any, known: list, index: dict) -> np.ndarray:
+        """Matrix indices for keys, registering keys seen for the first time."""
+        codes = np.empty(len(keys), dtype=np.int64)
+        for position, key in enumerate(keys):
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(known)
+                known.append(key)
+            codes[position] = code
+        return codes
+
+    @staticmethod
+    def _add(matrix: sparse.csr_matrix, rows: np.ndarray, columns: np.ndarray, values: Any, size: int) -> sparse.csr_matrix:
+        # Duplicate (row, column) pairs are summed when the COO matrix is converted
+        increment = sparse.coo_matrix((np.asarray(values, dtype=np.int64), (rows, columns)), shape=(size, size)).tocsr()
+        matrix = matrix.copy()
+        matrix.resize((size, size))
+        return (matrix + increment).tocsr()
+
+    def save(self, cache_file: str) -> None:
+        np.savez(
+            cache_file,
+            player_ids=np.array(self.player_ids, dtype=str),
+            team_ids=np.array(self.team_ids, dtype=np.int64),
+            result_ids=np.array(sorted(self.result_ids), dtype=np.int64),
+            kills_data=self.kills.data, kills_indices=self.kills.indices, kills_indptr=self.kills.indptr,
+            team_data=self.team_kills.data, team_indices=self.team_kills.indices, team_indptr=self.team_kills.indptr
+        )
+
+    @classmethod
+    def load(cls, cache_file: str) -> 'KillGraph':
+        graph = cls()
+        with np.load(cache_file) as cache:
+            graph.player_ids = cache['player_ids'].tolist()
+            graph.team_ids = cache['team_ids'].tolist()
+            graph.result_ids = set(cache['result_ids'].tolist())
+            players, teams = len(graph.player_ids), len(graph.team_ids)
+            graph.kills = sparse.csr_matrix((cache['kills_data'], cache['kills_indices'], cache['kills_indptr']), shape=(players, players))
+            graph.team_kills = sparse.csr_matrix((cache['team_data'], cache['team_indices'], cache['team_indptr']), shape=(teams, teams))
+        graph.player_index = {player_id: index for index, player_id in enumerate(graph.player_ids)}
+        graph.team_index = {team_id: index for index, team_id in enumerate(graph.team_ids)}
+        return graph
+
+    @classmethod
+    def load_or_build(cls, conn: sqlite3.Connection, cache_file: str) -> 'KillGraph':
+        """Load the cached graph if there is one, bring it up to date and save it again."""
+        try:
+            graph = cls.load(cache_file)
+        except (OSError, KeyError, ValueError):
+            graph = cls()
+        if graph.update(conn) or not os.path.exists(cache_file):
+            graph.save(cache_file)
+        return graph
+
+    def top_rivalries(self, limit: int = 10) -> list[tuple[str, str, int, int]]:
+        """Pairs of players with the most kills between them: (PlayerA, PlayerB, A on B, B on A)."""
+        total = sparse.triu(self.kills + self.kills.T, k=1).tocoo()
+        order = self._top(total.data, limit)
+        return [
+            (self.player_ids[a], self.player_ids[b], int(self.kills[a, b]), int(self.kills[b, a]))
+            for a, b in zip(total.row[order].tolist(), total.col[order].tolist())
+        ]
+
+    def team_feed(self, limit: int = 10) -> list[tuple[int, int, int, float]]:
+        """Teams feeding kills to an opponent: (VictimTeamID, KillerTeamID, Kills, share of the victim team's deaths)."""
+        team_kills = self.team_kills.tocoo()
+        opponents = team_kills.row != team_kills.col
+        rows, columns, kills = team_kills.row[opponents], team_kills.col[opponents], team_kills.data[opponents]
+        deaths = np.asarray(self.team_kills.sum(axis=0)).ravel()
+        order = self._top(kills, limit)
+        return [
+            (self.team_ids[victim], self.team_ids[killer], count, float(count / deaths[victim]))
+            for killer, victim, count in zip(rows[order].tolist(), columns[order].tolist(), kills[order].tolist())
+        ]
+
+    def threat_scores(self, damping: float = 0.85, tolerance: float = 1e-10, max_iterations: int = 200) -> np.ndarray:
+        """PageRank over the kill graph: every death passes score from the victim to the killer.
+
+        Killing players who themselves score highly is worth more than farming weak ones.
+        """
+        players = len(self.player_ids)
+        if players == 0:
+            return np.zeros(0)
+        deaths = np.asarray(self.kills.sum(axis=0)).ravel().astype(float)
+        # Column-normalised: each victim splits its score between its killers by kills
+        transition = self.kills @ sparse.diags(np.divide(1.0, deaths, out=np.zeros(players), where=deaths > 0))
+        never_killed = deaths == 0
+
+        scores = np.full(players, 1.0 / players)
+        for _ in range(max_iterations):
+            spread = damping * (transition @ scores + scores[never_killed].sum() / players) + (1 - damping) / players
+            if np.abs(spread - scores).sum() < tolerance:
+                return spread
+            scores = spread
+        return scores
+
+    def top_threats(self, limit: int = 10) -> list[tuple[str, float]]:
+        scores = self.threat_scores()
+        order = self._top(scores, limit)
+        return [(self.player_ids[index], float(scores[index])) for index in order.tolist()]
+
+    @staticmethod
+    def _top(values: np.ndarray, limit: int) -> np.ndarray:
+        """Indices of the largest values in descending order, without sorting everything."""
+        if len(values) > limit:
+            candidates = np.argpartition(values, -limit)[-limit:]
+        else:
+            candidates = np.arange(len(values))
+        return candidates[np.argsort(values[candidates], kind='stable')[::-1]]
+
+def player_names(conn: sqlite3.Connection, player_ids: list[str]) -> dict[str, str]:
+    cursor = conn.cursor()
+    names = {}
+    for player_id in set(player_ids):
+        cursor.execute('SELECT PlayerName FROM PlayerCurrentName WHERE PlayerID = ?', (player_id,))
+        row = cursor.fetchone()
+        names[player_id] = row[0] if row else player_id
+    return names
+
+def team_names(conn: sqlite3.Connection, team_ids: list[int]) -> dict[int, str]:
+    cursor = conn.cursor()
+    names = {}
+    for team_id in set(team_ids):
+        cursor.execute('SELECT TeamName FROM Teams WHERE TeamID = ?', (team_id,))
+        row = cursor.fetchone()
+        names[team_id] = row[0] if row else str(team_id)
+    return names
+
+def print_kill_graph_report(conn: sqlite3.Connection, graph: KillGraph, limit: int = 10) -> None:
+    rivalries = graph.top_rivalries(limit)
+    feed = graph.team_feed(limit)
+    threats = graph.top_threats(limit)
+    names = player_names(conn, [player_id for rivalry in rivalries for player_id in rivalry[:2]] +
+                         [player_id for player_id, _ in threats])
+    teams = team_names(conn, [team_id for row in feed for team_id in row[:2]])
+
+    print(f"Kill graph: {len(graph.player_ids)} players, {graph.kills.nnz} player pairs, {len(graph.result_ids)} matches")
+    print("\nTop rivalries:")
+    for player_a, player_b, a_kills, b_kills in rivalries:
+        print(f"  {names[player_a]} vs {names[player_b]}: {a_kills} - {b_kills}")
+    print("\nTeams feeding opponents:")
+    for victim_team, killer_team, kills, share in feed:
+        print(f"  {teams[victim_team]} -> {teams[killer_team]}: {kills} deaths ({share:.0%} of {teams[victim_team]}'s deaths)")
+    print("\nThreat ranking:")
+    for rank, (player_id, score) in enumerate(threats, start=1):
+        print(f"  {rank:>2}. {names[player_id]} ({score * len(graph.player_ids):.2f}x average)")
@@ -1,45 +1,41 @@
 import os
-import json
-import time
-from pathlib import Path
-from tkinter import filedialog
-import tkinter as tk
-from generate_comparison_graph import create_comprehensive_comparison
-from player_data import PlayerData
-from stats_parser import StatsParser
+import sys
+import argparse
+from stats_parser import StatsParser, PARSE_ENGINES
 from typing import Any
 from version import __version__
+import db_operations
+import instrumentation
 from db_operations import process_new_json_files
-from datetime import datetime
-
-class UnicodeJsonEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, PlayerData):
-            return obj.to_dict()
-        return super().default(obj)
-
-def ensure_parsed_jsons_folder(base_directory: str) -> str:
-    parsed_jsons_folder = Path(base_directory) / "parsed_jsons"
-    parsed_jsons_folder.mkdir(exist_ok=True)
-    return str(parsed_jsons_folder)
-
-def generate_descriptive_filename(parsed_results: dict[str, Any]) -> str:
-    team1_name = parsed_results['Axis']['Team Name']
-    team2_name = parsed_results['Allies']['Team Name']
-    map_name = parsed_results['Map']
-    match_date = parsed_results['Match Date']
-    processed_date = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Replace any characters that might not be suitable for filenames
-    team1_name = ''.join(c if c.isalnum() else '_' for c in team1_name)
-    team2_name = ''.join(c if c.isalnum() else '_' for c in team2_name)
-    map_name = ''.join(c if c.isalnum() else '_' for c in map_name)
-    match_date = ''.join(c if c.isalnum() else '_' for c in match_date)
-    
-    return f"{team1_name}_vs_{team2_name}_{map_name}_{match_date}_Processed_{processed_date}.json"
+from match_output import ensure_parsed_jsons_folder, write_match_json, source_hash
+from render_service import RenderService, RENDER_PRESETS
+from concurrent.futures import Future
+
+render_service = RenderService()
 
+def report_graph_result(future: Future) -> None:
+    try:
+        graph_file = future.result()
+        print(f"Comprehensive comparison graph has been saved as '{os.path.basename(graph_file)}'")
+    except Exception as e:
+        print(f"Warning: Could not generate comparison graph: {type(e).__name__} - {e}")
+
+def find_loaded_source(csv_hash: str) -> str | None:
+    """JSON file name of the match already loaded from this exact CSV, if any."""
+    conn = db_operations.connect()
+    try:
+        db_operations.create_tables(conn)
+        return db_operations.find_loaded_match(conn, source_hash=csv_hash)
+    finally:
+        conn.close()
+
+@instrumentation.timed('parse_new_match')
 def parse_new_match() -> bool:
     """Parse a new match CSV file into JSON. Returns True if file was parsed successfully."""
+    # Imported here so the headless commands work on machines without Tk
+    from tkinter import filedialog
+    import tkinter as tk
+
     root = tk.Tk()
     root.withdraw()
 
@@ -56,24 +52,28 @@ def parse_new_match() -> bool:
     parsed_jsons_folder: str = ensure_parsed_jsons_folder(base_directory)
     
     try:
-        parsed_results: dict[str, Any] = StatsParser.parse_stats_file(file_path)
+        with instrumentation.span('source_hash'):
+            csv_hash: str = source_hash(file_path)
+        with instrumentation.span('find_loaded_source'):
+            loaded_as = find_loaded_source(csv_hash)
+        if loaded_as is not None:
+            print(f"{os.path.basename(file_path)} has already been loaded as {loaded_as}. Skipping CSV parsing.")
+            return False
+
+        # With enough history the classifier assigns groups and only asks about uncertain players
+        from batch_ingest import load_group_classifier
+        with instrumentation.span('load_group_classifier'):
+            classifier = load_group_classifier()
+        parsed_results: dict[str, Any] = StatsParser.parse_stats_file(file_path, classifier=classifier)
+        parsed_results['Source Hash'] = csv_hash
         print(f"Successfully parsed {os.path.basename(file_path)}")
 
-        descriptive_filename = generate_descriptive_filename(parsed_results)
-        output_file: str = os.path.join(parsed_jsons_folder, descriptive_filename)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(parsed_results, f, cls=UnicodeJsonEncoder, ensure_ascii=False, indent=4)
+        output_file: str = write_match_json(parsed_results, parsed_jsons_folder)
 
         print(f"\nResults have been saved to {output_file}")
         
-        # Generate comparison graph
-        try:
-            graph_file = create_comprehensive_comparison(parsed_results, parsed_jsons_folder)
-            print(f"Comprehensive comparison graph has been saved as '{os.path.basename(graph_file)}'")
-        except Exception as e:
-            print(f"Warning: Could not generate comparison graph: {type(e).__name__} - {e}")
-            print("Continuing with database operations...")
+        # Generate comparison graph in a worker process while we carry on
+        render_service.render(parsed_results, parsed_jsons_folder).add_done_callback(report_graph_result)
 
         return True
 
@@ -81,7 +81,225 @@ def parse_new_match() -> bool:
         print(f"Error parsing {file_path}: {type(e).__name__} - {e}")
         return False
 
-def main() -> None:
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Hell Let Loose Stats Parser. Run without a command for the interactive menu.")
+    parser.add_argument('--timings', metavar='FILE', help='Time each stage, count rows, weapons and SQL statements and write a JSON report')
+    parser.add_argument('--profile', metavar='FILE', help='Run under cProfile and dump the pstats to this file')
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help='Parse a folder of CSV files non-interactively and load them into the database')
+    batch_parser.add_argument('csv_directory', help='Folder containing the CRCON CSV exports')
+    batch_parser.add_argument('--manifest', help='Manifest with team, map, date and armor overrides per file (default: <csv_directory>/manifest.json)')
+    batch_parser.add_argument('--output-dir', help='Folder for the parsed JSON files (default: parsed_jsons)')
+    batch_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+    batch_parser.add_argument('--workers', type=int, help='Number of parser processes (default: one per CPU)')
+    batch_parser.add_argument('--no-db', action='store_true', help='Only write the JSON files')
+    batch_parser.add_argument('--render', choices=list(RENDER_PRESETS), help='Also render comparison graphs with this preset')
+    batch_parser.add_argument('--archive', help='Also append the parsed matches to this season archive')
+    batch_parser.add_argument('--engine', choices=PARSE_ENGINES, default='rows', help='CSV parse engine (default: rows)')
+    batch_parser.add_argument('--classify', action='store_true', help='Assign groups with the classifier trained on the database')
+
+    stream_parser = subparsers.add_parser('stream', help='Parse one oversized CSV export with bounded memory into NDJSON and load it')
+    stream_parser.add_argument('csv_file', help='CRCON CSV export, possibly several exports concatenated')
+    stream_parser.add_argument('--axis', required=True, help='Axis team name')
+    stream_parser.add_argument('--allies', required=True, help='Allies team name')
+    stream_parser.add_argument('--map', required=True, help='Map name')
+    stream_parser.add_argument('--date', required=True, help='Match date')
+    stream_parser.add_argument('--armor', action='append', default=[], help='Player ID to classify as Armor (repeatable)')
+    stream_parser.add_argument('--output-dir', help='Folder for the NDJSON file (default: parsed_jsons)')
+    stream_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+    stream_parser.add_argument('--no-db', action='store_true', help='Only write the NDJSON file')
+
+    archive_parser = subparsers.add_parser('archive', help='Append parsed match JSONs to a compact season archive')
+    archive_parser.add_argument('archive_file', help='Season archive to create or append to (.hllarc)')
+    archive_parser.add_argument('--source', help='Folder of parsed match JSONs (default: parsed_jsons)')
+
+    load_archive_parser = subparsers.add_parser('load-archive', help='Load every match in a season archive into the database')
+    load_archive_parser.add_argument('archive_file', help='Season archive (.hllarc)')
+    load_archive_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+
+    rebuild_parser = subparsers.add_parser('rebuild', help='Rebuild the database from every parsed JSON, in match date order, with worker processes')
+    rebuild_parser.add_argument('--json-dir', help='Folder of parsed match JSONs (default: parsed_jsons)')
+    rebuild_parser.add_argument('--db', help='SQLite database to rebuild (default: hell_let_loose.db); the old one is kept as .bak')
+    rebuild_parser.add_argument('--workers', type=int, help='Number of JSON decoding processes (default: one per CPU)')
+    rebuild_parser.add_argument('--chunk-size', type=int, default=250, help='Matches per transaction')
+
+    aggregates_parser = subparsers.add_parser('rebuild-aggregates', help='Recompute the player, team and map aggregate tables')
+    aggregates_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+
+    retract_parser = subparsers.add_parser('retract', help='Remove a loaded match and undo its totals')
+    retract_parser.add_argument('json_file', help='File name of the parsed JSON as stored in the database')
+    retract_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+
+    reprocess_parser = subparsers.add_parser('reprocess', help='Reload a corrected JSON file, replacing its earlier load')
+    reprocess_parser.add_argument('json_file', help='Path of the corrected JSON file')
+    reprocess_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+
+    kill_graph_parser = subparsers.add_parser('kill-graph', help='Rank rivalries, team feeds and threat scores from the kill graph')
+    kill_graph_parser.add_argument('--db', help='SQLite database to read (default: hell_let_loose.db)')
+    kill_graph_parser.add_argument('--limit', type=int, default=10, help='Rows per ranking')
+    kill_graph_parser.add_argument('--rebuild', action='store_true', help='Ignore the cached graph and rebuild it from scratch')
+
+    watch_parser = subparsers.add_parser('watch', help='Keep running and load CSVs and JSONs as they are dropped into their folders')
+    watch_parser.add_argument('--csv-dir', help='Folder to watch for CSV exports, with their manifest.json (default: Raw_csvs)')
+    watch_parser.add_argument('--json-dir', help='Folder to watch for parsed JSON and NDJSON files (default: parsed_jsons)')
+    watch_parser.add_argument('--db', help='SQLite database to update (default: hell_let_loose.db)')
+    watch_parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls of the folders (default: 1)')
+    watch_parser.add_argument('--settle', type=float, default=2.0, help='Seconds a file must be unchanged before it is read (default: 2)')
+    watch_parser.add_argument('--batch-size', type=int, default=50, help='Most matches committed in one transaction (default: 50)')
+    watch_parser.add_argument('--batch-window', type=float, default=1.0, help='Seconds to wait for more matches before committing (default: 1)')
+    watch_parser.add_argument('--health-port', type=int, default=8765, help='Port for the JSON health and lag endpoint, 0 to disable (default: 8765)')
+    watch_parser.add_argument('--workers', type=int, help='Number of parser processes (default: one per CPU)')
+    watch_parser.add_argument('--engine', choices=PARSE_ENGINES, default='rows', help='CSV parse engine (default: rows)')
+    watch_parser.add_argument('--classify', action='store_true', help='Assign groups with the classifier trained on the database')
+
+    serve_parser = subparsers.add_parser('serve', help='Serve match, player, team and map stats as a cached JSON HTTP API')
+    serve_parser.add_argument('--db', help='SQLite database to read (default: hell_let_loose.db)')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    serve_parser.add_argument('--workers', type=int, default=4, help='Database reader threads (default: 4)')
+    serve_parser.add_argument('--cache-entries', type=int, default=1024, help='Responses kept in the LRU cache, 0 to disable (default: 1024)')
+
+    dashboard_parser = subparsers.add_parser('dashboard', help='Render a season dashboard of trends and distributions per team')
+    dashboard_parser.add_argument('--team', action='append', help='Only this team (repeatable; default: every team)')
+    dashboard_parser.add_argument('--output-dir', help='Folder for the dashboards (default: dashboards)')
+    dashboard_parser.add_argument('--preset', choices=list(RENDER_PRESETS), default='print', help='Render preset (default: print)')
+    dashboard_parser.add_argument('--workers', type=int, default=1, help='Render processes (default: 1)')
+    dashboard_parser.add_argument('--db', help='SQLite database to read (default: hell_let_loose.db)')
+
+    classify_parser = subparsers.add_parser('classify-groups', help='Train the group classifier and list stored players whose group needs review')
+    classify_parser.add_argument('--db', help='SQLite database to read (default: hell_let_loose.db)')
+    classify_parser.add_argument('--limit', type=int, default=20, help='Players to list (default: 20)')
+
+    report_parser = subparsers.add_parser('report', help='Print a player, roster, map or weapon report as a table, JSON or CSV')
+    report_subparsers = report_parser.add_subparsers(dest='report', required=True)
+    player_report = report_subparsers.add_parser('player', help='Player card: totals, best matches, teams, weapons, victims and nemeses')
+    player_report.add_argument('player', help='Player ID or current player name')
+    roster_report = report_subparsers.add_parser('roster', help='Team totals and every player who played for the team')
+    roster_report.add_argument('team', help='Team name or ID')
+    roster_report.add_argument('--as-of', help='Only players who played for the team in the --days before this match date')
+    roster_report.add_argument('--days', type=int, default=90, help='Window for --as-of (default: 90)')
+    maps_report = report_subparsers.add_parser('maps', help='Per team and map record; the side with more kills counts as the winner')
+    maps_report.add_argument('--team', help='Only this team')
+    weapons_report = report_subparsers.add_parser('weapons', help='Weapon leaderboards; the top weapons when no filter is given')
+    weapons_filter = weapons_report.add_mutually_exclusive_group()
+    weapons_filter.add_argument('--weapon', help='Top players with this weapon')
+    weapons_filter.add_argument('--group', help='Top players with a weapon group (Infantry, Armor, Artillery)')
+    weapons_filter.add_argument('--machine-guns', action='store_true', help='Top players with machine guns')
+    ratings_report = report_subparsers.add_parser('ratings', help='Highest rated players and every rated team')
+    ratings_report.add_argument('--min-matches', type=int, default=10, help='Only players with this many rated matches (default: 10)')
+    for report in [player_report, roster_report, maps_report, weapons_report, ratings_report]:
+        report.add_argument('--format', choices=['table', 'json', 'csv'], default='table', help='Output format (default: table)')
+        report.add_argument('--output', help='Write the report to this file instead of printing it')
+        report.add_argument('--limit', type=int, default=10, help='Rows per leaderboard')
+        report.add_argument('--db', help='SQLite database to read (default: hell_let_loose.db)')
+
+    return parser
+
+def run_database_command(args: argparse.Namespace) -> int:
+    conn = db_operations.connect(args.db)
+    try:
+        db_operations.create_tables(conn)
+        if args.command == 'rebuild-aggregates':
+            db_operations.rebuild_aggregates(conn)
+            print("Aggregate tables rebuilt.")
+        elif args.command == 'retract':
+            result_id = db_operations.get_result_id(conn, os.path.basename(args.json_file))
+            if result_id is None:
+                print(f"Error: {args.json_file} has not been loaded into the database")
+                return 1
+            db_operations.retract_match(conn, result_id)
+            print(f"Retracted {os.path.basename(args.json_file)}.")
+        elif args.command == 'load-archive':
+            loaded = db_operations.load_archive(conn, args.archive_file)
+            print(f"Loaded {loaded} new match(es) from {os.path.basename(args.archive_file)}.")
+        elif args.command == 'reprocess':
+            db_operations.reprocess_json_file(conn, args.json_file)
+            print(f"Reprocessed {os.path.basename(args.json_file)}.")
+        elif args.command == 'dashboard':
+            from season_dashboard import render_dashboards
+            output_dir = args.output_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboards')
+            output_files = render_dashboards(conn, output_dir, args.team, preset=args.preset, workers=args.workers)
+            print(f"Rendered {len(output_files)} dashboard(s) into {output_dir}.")
+        elif args.command == 'classify-groups':
+            from group_classifier import GroupClassifier, cache_path_for, print_group_review
+            classifier = GroupClassifier.load_or_train(conn, cache_path_for(args.db or db_operations.db_path))
+            if classifier is None:
+                print("Not enough classified matches to train the group classifier.")
+                return 1
+            print_group_review(conn, classifier, args.limit)
+        elif args.command == 'kill-graph':
+            from kill_graph import KillGraph, cache_path_for, print_kill_graph_report
+            cache_file = cache_path_for(args.db or db_operations.db_path)
+            if args.rebuild and os.path.exists(cache_file):
+                os.remove(cache_file)
+            print_kill_graph_report(conn, KillGraph.load_or_build(conn, cache_file), args.limit)
+        conn.commit()
+    finally:
+        conn.close()
+    return 0
+
+def run_command(args: argparse.Namespace) -> int:
+    if args.command == 'batch':
+        from batch_ingest import run_batch
+        return run_batch(args.csv_directory, manifest_path=args.manifest, output_directory=args.output_dir,
+                         db_file=args.db, workers=args.workers, update_database=not args.no_db,
+                         engine=args.engine, render_preset=args.render, archive_file=args.archive,
+                         classify=args.classify)
+    if args.command == 'stream':
+        from batch_ingest import run_stream
+        return run_stream(args.csv_file, args.axis, args.allies, args.map, args.date,
+                          armor_player_overrides=set(args.armor), output_directory=args.output_dir,
+                          db_file=args.db, update_database=not args.no_db)
+    if args.command == 'archive':
+        from match_archive import convert_directory
+        source = args.source or ensure_parsed_jsons_folder(os.path.dirname(os.path.abspath(__file__)))
+        appended = convert_directory(source, args.archive_file)
+        print(f"Appended {appended} match(es) to {args.archive_file}.")
+        return 0
+    if args.command == 'rebuild':
+        from season_rebuild import run_rebuild
+        return run_rebuild(args.json_dir, db_file=args.db, workers=args.workers, chunk_size=args.chunk_size)
+    if args.command == 'watch':
+        from ingest_service import IngestService, run_ingest_service
+        base_directory = os.path.dirname(os.path.abspath(__file__))
+        service = IngestService(args.csv_dir or os.path.join(base_directory, 'Raw_csvs'),
+                                args.json_dir or ensure_parsed_jsons_folder(base_directory), db_file=args.db,
+                                poll_interval=args.interval, settle_seconds=args.settle, batch_size=args.batch_size,
+                                batch_window=args.batch_window, workers=args.workers, engine=args.engine,
+                                health_port=args.health_port, classify=args.classify)
+        return run_ingest_service(service)
+    if args.command == 'serve':
+        from stats_api import run_server
+        return run_server(args.db, host=args.host, port=args.port, workers=args.workers, cache_entries=args.cache_entries)
+    if args.command == 'report':
+        from reports import run_report_command
+        return run_report_command(args)
+    if args.command in ('rebuild-aggregates', 'retract', 'reprocess', 'load-archive', 'kill-graph', 'dashboard', 'classify-groups'):
+        return run_database_command(args)
+    raise ValueError(f"Unknown command: {args.command}")
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.timings:
+        instrumentation.enable()
+    try:
+        if args.profile:
+            return instrumentation.run_profiled(args.profile, run, args)
+        return run(args)
+    finally:
+        if args.timings:
+            instrumentation.print_report(instrumentation.write_report(args.timings, args.command))
+            print(f"Timing report written to {args.timings}")
+
+def run(args: argparse.Namespace) -> int:
+    if args.command:
+        return run_command(args)
+
+    interactive_menu()
+    return 0
+
+def interactive_menu() -> None:
     print(f"Welcome to the Hell Let Loose Stats Parser version {__version__}!")
     print("This project was started by -TL- Grekker and has been updated by -TL- JVCK.")
     
@@ -110,7 +328,8 @@ def main() -> None:
         else:
             print("Invalid choice. Please try again.")
 
+    render_service.shutdown(wait=True)
     print("\nThank you for using the Hell Let Loose Stats Parser!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,128 @@
+from functools import cached_property
+from typing import Any
+from player_data import PlayerData
+from match_results import MatchResults
+from weapon_data import WeaponIndex, weapon_index
+from match_output import ANALYSIS_KEY, payload_hash
+
+# Stored beside the match in its parsed JSON; bump ANALYSIS_VERSION when a stored metric changes meaning
+ANALYSIS_VERSION = 1
+SIDES: list[str] = ['Axis', 'Allies']
+PLAYER_GROUPS: list[str] = ['Infantry', 'Artillery', 'Armor']
+TOTAL_GROUPS: list[str] = ['Total', 'Infantry', 'Artillery', 'Armor', 'Unknown']
+# A player is an MG player when at least this share of their weapon kills came from machine guns
+MG_PLAYER_SHARE = 0.5
+
+class MatchAnalysis:
+    """Metrics derived from one parsed match, each computed once on first use.
+
+    The comparison graph, the JSON writer and the database loaders all read them from here.
+    to_dict() is stored under 'Analysis' in the parsed JSON and for_match() reads it back,
+    so rendering or loading a match again takes the stored numbers instead of recomputing
+    them. The stored form carries the payload hash of the match it was computed from, and is
+    ignored once the match has been edited. Numbers stay numbers: KDRs are floats, not the
+    '.2f' strings of the match dict.
+    """
+
+    def __init__(self, data: dict[str, Any], stored: dict[str, Any] | None = None,
+                 match_hash: str | None = None) -> None:
+        self.data = data
+        self.stored = stored or {}
+        self._match_hash = match_hash
+
+    @classmethod
+    def for_match(cls, data: dict[str, Any], match_hash: str | None = None) -> 'MatchAnalysis':
+        """The analysis of a match dict, from its stored 'Analysis' when that is current.
+
+        match_hash is the match's payload_hash when the caller already has it.
+        """
+        match_hash = match_hash or payload_hash(data)
+        stored = data.get(ANALYSIS_KEY)
+        if (isinstance(stored, dict) and stored.get('Version') == ANALYSIS_VERSION
+                and stored.get('Payload Hash') == match_hash):
+            return cls(data, stored, match_hash)
+        return cls(data, match_hash=match_hash)
+
+    @classmethod
+    def attach(cls, data: dict[str, Any]) -> 'MatchAnalysis':
+        """Analyse a match and store the result under 'Analysis' in its dict."""
+        analysis = cls.for_match(data)
+        data[ANALYSIS_KEY] = analysis.to_dict()
+        return analysis
+
+    @property
+    def match_hash(self) -> str:
+        """payload_hash of the match the analysis belongs to."""
+        if self._match_hash is None:
+            self._match_hash = payload_hash(self.data)
+        return self._match_hash
+
+    @cached_property
+    def players(self) -> list[dict[str, Any]]:
+        """Every player of the match, team players first, in the order they are loaded."""
+        players = [player for side in SIDES for group in PLAYER_GROUPS
+                   for player in self.data.get(side, {}).get(group, {}).get('Players', [])]
+        players.extend(self.data.get('Spectators', []))
+        return players
+
+    @cached_property
+    def kdrs(self) -> dict[str, dict[str, float]]:
+        """Kills per death of each side's total and groups."""
+        if 'KDR' in self.stored:
+            return self.stored['KDR']
+        return {side: {group: PlayerData.kill_death_ratio(self.data[side][group]['Kills'], self.data[side][group]['Deaths'])
+                       for group in TOTAL_GROUPS if group in self.data.get(side, {})}
+                for side in SIDES}
+
+    @cached_property
+    def mg_players(self) -> list[str]:
+        """PlayerIDs of the team players who got most of their kills with machine guns."""
+        if 'MachineGunPlayers' in self.stored:
+            return self.stored['MachineGunPlayers']
+        return [player['PlayerID'] for side in SIDES for group in PLAYER_GROUPS
+                for player in self.data.get(side, {}).get(group, {}).get('Players', [])
+                if self._is_mg_player(player)]
+
+    @staticmethod
+    def _is_mg_player(player: dict[str, Any]) -> bool:
+        weapons: dict[str, int] = player.get('Weapons', {})
+        total_kills = sum(weapons.values())
+        if total_kills == 0:
+            return False
+        mg_kills = player.get('MachineGunKills')
+        if mg_kills is None:
+            mg_kills = sum(count for weapon, count in weapons.items() if weapon_index.lookup(weapon).is_machine_gun)
+        return mg_kills / total_kills >= MG_PLAYER_SHARE
+
+    @cached_property
+    def mg_deaths(self) -> dict[str, dict[str, int]]:
+        """Deaths of each side's MG players per WeaponIndex.DEATH_CATEGORIES category."""
+        if 'MachineGunDeaths' in self.stored:
+            return self.stored['MachineGunDeaths']
+        mg_players = set(self.mg_players)
+        mg_deaths = {side: dict.fromkeys(WeaponIndex.DEATH_CATEGORIES, 0) for side in SIDES}
+        for side in SIDES:
+            for group in PLAYER_GROUPS:
+                for player in self.data.get(side, {}).get(group, {}).get('Players', []):
+                    if player['PlayerID'] not in mg_players:
+                        continue
+                    for weapon, count in player.get('DeathByWeapons', {}).items():
+                        if isinstance(count, (int, float)):
+                            mg_deaths[side][weapon_index.lookup(weapon).category] += int(count)
+        return mg_deaths
+
+    @cached_property
+    def kill_edges(self) -> list[tuple[str | None, str | None, str, str, int]]:
+        """MatchResults.kill_edges of every player of the match."""
+        return MatchResults.kill_edges(self.players)
+
+    def to_dict(self) -> dict[str, Any]:
+        """The stored form. Kill edges are left out: decoding them from the JSON costs more
+        than rebuilding them from the Nemesis and Victim maps."""
+        return {
+            'Version': ANALYSIS_VERSION,
+            'Payload Hash': self.match_hash,
+            'KDR': self.kdrs,
+            'MachineGunPlayers': self.mg_players,
+            'MachineGunDeaths': self.mg_deaths,
+        }
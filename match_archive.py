@@ -0,0 +1,344 @@
+import os
+import json
+import mmap
+import struct
+import numpy as np
+from typing import Any, Iterator
+from match_results import MatchResults
+from match_output import payload_hash, match_files
+from player_data import METRIC_COLUMNS
+
+ARCHIVE_EXTENSION = '.hllarc'
+FILE_MAGIC = b'HLLARC1\n'
+BLOCK_MAGIC = b'MTCH'
+# Block magic, metadata length and column data length in bytes
+BLOCK_HEADER = struct.Struct('<4sII')
+
+SIDES: list[str] = ['Axis', 'Allies', 'Spectators']
+GROUPS: list[str] = ['Infantry', 'Artillery', 'Armor', 'Unknown']
+# One int64 column per field, stored column after column
+PLAYER_COLUMNS: list[str] = [
+    'PlayerID', 'Name', 'Kills', 'Deaths', 'CombatEffectiveness', 'OffensivePoints', 'DefensivePoints',
+    'SupportPoints', 'MachineGunKills', 'SideAxis', 'SideAllies', 'GroupInfantry', 'GroupArtillery',
+    'GroupArmor', 'Side', 'Group'
+]
+# Rate and streak metrics follow the base columns in blocks that have them; rates are
+# stored in hundredths and a missing value as -1
+METRIC_NAMES: list[str] = [key for _, key, _ in METRIC_COLUMNS]
+# Last in blocks that have it, as an index into the string table
+GROUP_SOURCE_COLUMN = 'GroupSource'
+RATE_METRICS: set[str] = {key for _, key, value_type in METRIC_COLUMNS if value_type is float}
+WEAPON_COLUMNS: list[str] = ['PlayerRow', 'Weapon', 'Count', 'IsDeath']
+EDGE_COLUMNS: list[str] = ['PlayerRow', 'OtherName', 'Kills', 'IsNemesis']
+WEAPON_COLUMN = {name: index for index, name in enumerate(WEAPON_COLUMNS)}
+
+def _encode_metric(key: str, value: int | float | None) -> int:
+    if value is None:
+        return -1
+    return round(value * 100) if key in RATE_METRICS else value
+
+def _decode_metric(key: str, value: int) -> int | float | None:
+    if value == -1:
+        return None
+    return value / 100 if key in RATE_METRICS else value
+
+def _match_players(data: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Players in the order they appear in the match JSON."""
+    for side in ['Axis', 'Allies']:
+        for group in GROUPS:
+            yield from data[side][group]['Players']
+    yield from data['Spectators']
+
+def encode_match(file_name: str, data: dict[str, Any]) -> bytes:
+    """Encode one match dict as an archive block.
+
+    Player IDs, names and weapon names go into a per-block string table and are
+    stored as indices into it, so every remaining value is a fixed-width integer.
+    """
+    strings: dict[str, int] = {}
+
+    def code(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    players = list(_match_players(data))
+    # Matches parsed before the metrics or group sources existed keep the shorter layout
+    has_metrics = bool(players) and all('Victim' in player for player in players)
+    has_group_sources = bool(players) and all('GroupSource' in player for player in players)
+    player_columns = (PLAYER_COLUMNS + (METRIC_NAMES if has_metrics else [])
+                      + ([GROUP_SOURCE_COLUMN] if has_group_sources else []))
+
+    player_rows = []
+    weapon_rows = []
+    edge_rows = []
+    for player in players:
+        player_row = len(player_rows)
+        player_rows.append([
+            code(player['PlayerID']), code(player['Name']), player['Kills'], player['Deaths'],
+            player['CombatEffectiveness'], player['OffensivePoints'], player['DefensivePoints'],
+            player['SupportPoints'], player['MachineGunKills'],
+            player['sideLikelihood']['Axis'], player['sideLikelihood']['Allies'],
+            player['groupLikelihood']['Infantry'], player['groupLikelihood']['Artillery'],
+            player['groupLikelihood']['Armor'], SIDES.index(player['Side']), GROUPS.index(player['Group'])
+        ])
+        for is_death, weapons in [(0, player['Weapons']), (1, player['DeathByWeapons'])]:
+            for weapon, count in weapons.items():
+                weapon_rows.append([player_row, code(weapon), int(count), is_death])
+        if has_metrics:
+            player_rows[-1].extend(_encode_metric(key, player[key]) for key in METRIC_NAMES)
+            for is_nemesis, names in [(1, player['Nemesis']), (0, player['Victim'])]:
+                for name, kills in names.items():
+                    edge_rows.append([player_row, code(name), int(kills), is_nemesis])
+        if has_group_sources:
+            player_rows[-1].append(code(player['GroupSource']))
+
+    columns = b''.join(
+        np.ascontiguousarray(np.array(rows, dtype='<i8').reshape(-1, width).T).tobytes()
+        for rows, width in [(player_rows, len(player_columns)), (weapon_rows, len(WEAPON_COLUMNS)),
+                            (edge_rows, len(EDGE_COLUMNS))]
+    )
+
+    metadata = json.dumps({
+        'File Name': file_name,
+        'Map': data['Map'],
+        'Match Date': data['Match Date'],
+        'Axis Team Name': data['Axis']['Team Name'],
+        'Allies Team Name': data['Allies']['Team Name'],
+        'Source Hash': data.get('Source Hash'),
+        'Payload Hash': payload_hash(data),
+        'Players': len(player_rows),
+        'Player Columns': player_columns,
+        'Weapon Rows': len(weapon_rows),
+        'Edge Rows': len(edge_rows),
+        'Strings': list(strings)
+    }, ensure_ascii=False).encode('utf-8')
+    # Pad so the column data of every block starts 8-byte aligned
+    metadata += b' ' * (-(BLOCK_HEADER.size + len(metadata)) % 8)
+
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, len(metadata), len(columns)) + metadata + columns
+
+def append_matches(archive_path: str, matches: list[tuple[str, dict[str, Any]]]) -> int:
+    """Append (file name, match dict) pairs to an archive, creating it if needed.
+
+    Matches whose file name is already archived are skipped. Returns the number appended.
+    """
+    archived = set()
+    if os.path.exists(archive_path):
+        with MatchArchive(archive_path) as archive:
+            archived = set(match.file_name for match in archive)
+
+    appended = 0
+    with open(archive_path, 'ab') as f:
+        if f.tell() == 0:
+            f.write(FILE_MAGIC)
+        for file_name, data in matches:
+            if file_name in archived:
+                continue
+            f.write(encode_match(file_name, data))
+            archived.add(file_name)
+            appended += 1
+    return appended
+
+def convert_directory(json_folder: str, archive_path: str) -> int:
+    """Append every match JSON in json_folder to archive_path, oldest file name first."""
+    matches = []
+    for file_name in match_files(json_folder):
+        with open(os.path.join(json_folder, file_name), 'r', encoding='utf-8') as f:
+            matches.append((file_name, json.load(f)))
+    return append_matches(archive_path, matches)
+
+class ArchivedMatch:
+    """One match in an archive, with its columns as read-only views of the mapped file."""
+
+    def __init__(self, metadata: dict[str, Any], players: np.ndarray, weapons: np.ndarray, edges: np.ndarray) -> None:
+        self.metadata = metadata
+        self.file_name: str = metadata['File Name']
+        self.strings: list[str] = metadata['Strings']
+        self.player_columns: list[str] = metadata.get('Player Columns', PLAYER_COLUMNS)
+        self.has_metrics = METRIC_NAMES[0] in self.player_columns
+        self.has_group_sources = GROUP_SOURCE_COLUMN in self.player_columns
+        self.players = players
+        self.weapons = weapons
+        self.edges = edges
+
+    def __len__(self) -> int:
+        return self.players.shape[1]
+
+    def column(self, name: str) -> np.ndarray:
+        return self.players[self.player_columns.index(name)]
+
+    def _metrics(self, player: list[int]) -> dict[str, int | float | None]:
+        if not self.has_metrics:
+            return {key: None for key in METRIC_NAMES}
+        return {key: _decode_metric(key, value) for key, value in zip(METRIC_NAMES, player[len(PLAYER_COLUMNS):])}
+
+    def _group_source(self, player: list[int]) -> str | None:
+        return self.strings[player[-1]] if self.has_group_sources else None
+
+    def _opponents(self) -> tuple[list[dict[str, int]], list[dict[str, int]]]:
+        """Per-player Nemesis and Victim maps, in their original order."""
+        nemesis: list[dict[str, int]] = [{} for _ in range(len(self))]
+        victim: list[dict[str, int]] = [{} for _ in range(len(self))]
+        for player_row, name, kills, is_nemesis in self.edges.T.tolist():
+            (nemesis if is_nemesis else victim)[player_row][self.strings[name]] = kills
+        return nemesis, victim
+
+    def player_ids(self) -> list[str]:
+        return [self.strings[index] for index in self.column('PlayerID').tolist()]
+
+    def prepared(self) -> tuple:
+        """The tuple prepare_match would build from the original JSON, for bulk_load_matches."""
+        strings = self.strings
+        team_names = (self.metadata['Axis Team Name'], self.metadata['Allies Team Name'])
+        players = self.players.T.tolist()
+        rows = [
+            (strings[player[0]], strings[player[1]],
+             team_names[player[14]] if player[14] < 2 else None, SIDES[player[14]], GROUPS[player[15]],
+             player[2], player[3], player[4], *self._metrics(player).values(),
+             player[5], player[6], player[7], player[8], self._group_source(player))
+            for player in players
+        ]
+        weapon_rows = [
+            (strings[players[player_row][0]], strings[weapon], is_death, count)
+            for player_row, weapon, count, is_death in self.weapons.T.tolist()
+        ]
+        nemesis, victim = self._opponents()
+        edges = MatchResults.kill_edges(
+            {'PlayerID': strings[player[0]], 'Name': strings[player[1]], 'Nemesis': nemesis[row], 'Victim': victim[row]}
+            for row, player in enumerate(players)
+        )
+        return (self.file_name, self.metadata['Map'], self.metadata['Match Date'], team_names, rows, weapon_rows,
+                self.metadata['Source Hash'], self.metadata['Payload Hash'], edges)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Rebuild the match dict exactly as the parser produced it."""
+        strings = self.strings
+        players = self.players.T.tolist()
+        weapons: list[dict[str, int]] = [{} for _ in players]
+        death_by_weapons: list[dict[str, int]] = [{} for _ in players]
+        for player_row, weapon, count, is_death in self.weapons.T.tolist():
+            (death_by_weapons if is_death else weapons)[player_row][strings[weapon]] = count
+
+        nemesis, victim = self._opponents()
+
+        match_results = MatchResults(self.metadata['Axis Team Name'], self.metadata['Allies Team Name'],
+                                     self.metadata['Map'], self.metadata['Match Date'])
+        for row, player in enumerate(players):
+            kills, deaths = player[2], player[3]
+            player_dict = {
+                'PlayerID': strings[player[0]],
+                'Name': strings[player[1]],
+                'Kills': kills,
+                'Deaths': deaths,
+                'KDR': MatchResults.calculate_kdr(kills, deaths),
+                'CombatEffectiveness': player[4],
+                'OffensivePoints': player[5],
+                'DefensivePoints': player[6],
+                'SupportPoints': player[7],
+                'Weapons': weapons[row],
+                'DeathByWeapons': death_by_weapons[row],
+                'MachineGunKills': player[8],
+                'sideLikelihood': {'Axis': player[9], 'Allies': player[10]},
+                'groupLikelihood': {'Infantry': player[11], 'Artillery': player[12], 'Armor': player[13]},
+                'Side': SIDES[player[14]],
+                'Group': GROUPS[player[15]]
+            }
+            if self.has_group_sources:
+                player_dict['GroupSource'] = self._group_source(player)
+            if self.has_metrics:
+                player_dict.update(self._metrics(player))
+                player_dict['Nemesis'] = nemesis[row]
+                player_dict['Victim'] = victim[row]
+            match_results.add_player_dict(player_dict)
+        match_results.calculate_kdrs()
+        data = match_results.to_dict()
+        if self.metadata['Source Hash'] is not None:
+            data['Source Hash'] = self.metadata['Source Hash']
+        return data
+
+class MatchArchive:
+    """Memory-mapped reader for an append-only season archive.
+
+    Opening the archive only walks the block headers; the numeric columns of each
+    match are NumPy views into the mapped file and are not copied until used.
+    """
+
+    def __init__(self, archive_path: str) -> None:
+        self.archive_path = archive_path
+        self.matches: list[ArchivedMatch] = []
+        self._file = None
+        self._map: mmap.mmap | None = None
+
+    def __enter__(self) -> 'MatchArchive':
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[ArchivedMatch]:
+        return iter(self.matches)
+
+    def __len__(self) -> int:
+        return len(self.matches)
+
+    def open(self) -> None:
+        self._file = open(self.archive_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = self._map
+        if buffer[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{self.archive_path} is not a match archive")
+
+        offset = len(FILE_MAGIC)
+        while offset < len(buffer):
+            magic, metadata_length, columns_length = BLOCK_HEADER.unpack_from(buffer, offset)
+            if magic != BLOCK_MAGIC or offset + BLOCK_HEADER.size + metadata_length + columns_length > len(buffer):
+                # A torn final block from an interrupted append is ignored
+                print(f"Warning: ignoring incomplete data at byte {offset} of {self.archive_path}")
+                break
+            offset += BLOCK_HEADER.size
+            metadata = json.loads(bytes(buffer[offset:offset + metadata_length]))
+            offset += metadata_length
+            arrays = []
+            column_offset = offset
+            for width, count in [(len(metadata.get('Player Columns', PLAYER_COLUMNS)), metadata['Players']),
+                                 (len(WEAPON_COLUMNS), metadata['Weapon Rows']),
+                                 (len(EDGE_COLUMNS), metadata.get('Edge Rows', 0))]:
+                array = np.frombuffer(buffer, dtype='<i8', count=width * count, offset=column_offset)
+                arrays.append(array.reshape(width, count))
+                column_offset += array.nbytes
+            self.matches.append(ArchivedMatch(metadata, *arrays))
+            offset += columns_length
+
+    def close(self) -> None:
+        # Views into the map must be released before it can be closed
+        self.matches = []
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # Columns still referenced by the caller keep the map alive until they are freed
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def player_totals(self) -> dict[str, dict[str, int]]:
+        """Season Kills, Deaths, CombatEffectiveness and Matches per player, computed with NumPy."""
+        player_ids: list[str] = []
+        for match in self.matches:
+            player_ids.extend(match.player_ids())
+        if not player_ids:
+            return {}
+
+        unique_ids, codes = np.unique(np.array(player_ids), return_inverse=True)
+        totals = {'Matches': np.bincount(codes, minlength=len(unique_ids))}
+        for name in ['Kills', 'Deaths', 'CombatEffectiveness']:
+            values = np.concatenate([match.column(name) for match in self.matches])
+            totals[name] = np.bincount(codes, weights=values, minlength=len(unique_ids)).astype(np.int64)
+
+        columns = {name: values.tolist() for name, values in totals.items()}
+        return {
+            player_id: {name: columns[name][index] for name in columns}
+            for index, player_id in enumerate(unique_ids.tolist())
+        }
@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Any
+from datetime import datetime
+from player_data import PlayerData
+import instrumentation
+
+class UnicodeJsonEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, PlayerData):
+            return obj.to_dict()
+        return super().default(obj)
+
+# Key of the stored MatchAnalysis in a parsed match
+ANALYSIS_KEY = 'Analysis'
+# Keys describing where a match came from, or derived from it, rather than what happened in it
+HASH_EXCLUDED_KEYS: set[str] = {'Source Hash', ANALYSIS_KEY}
+
+def source_hash(file_path: str) -> str:
+    """SHA-256 of the raw CSV bytes, stored as 'Source Hash' in the parsed JSON."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def payload_hash(parsed_results: dict[str, Any]) -> str:
+    """SHA-256 of the match contents, independent of key order and of the JSON file name."""
+    match = {key: value for key, value in parsed_results.items() if key not in HASH_EXCLUDED_KEYS}
+    payload = json.dumps(match, cls=UnicodeJsonEncoder, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Match Date as typed at the prompt or in a manifest; CRCON servers and the prompts use US dates
+MATCH_DATE_FORMATS: list[str] = ['%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def match_timestamp(match_date: str | None) -> str | None:
+    """Normalize a free-text Match Date to 'YYYY-MM-DD HH:MM:SS'; None when it cannot be read."""
+    if not match_date:
+        return None
+    for date_format in MATCH_DATE_FORMATS:
+        try:
+            return datetime.strptime(match_date.strip(), date_format).strftime(TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+    return None
+
+# Per-folder files that share a match folder's extensions but are not matches
+MANIFEST_FILENAME = 'manifest.json'
+NON_MATCH_FILE_NAMES: set[str] = {MANIFEST_FILENAME}
+
+def is_match_file(file_name: str, extensions: tuple[str, ...] = ('.json',)) -> bool:
+    """Whether a file in a match folder holds a match or an export.
+
+    Dot files, such as cache indexes, and manifests are skipped.
+    """
+    return (not file_name.startswith('.') and file_name.lower().endswith(extensions)
+            and file_name not in NON_MATCH_FILE_NAMES)
+
+def match_files(folder: str, extensions: tuple[str, ...] = ('.json',)) -> list[str]:
+    """Names of the match files in folder, sorted."""
+    return sorted(file_name for file_name in os.listdir(folder) if is_match_file(file_name, extensions))
+
+def ensure_parsed_jsons_folder(base_directory: str) -> str:
+    parsed_jsons_folder = Path(base_directory) / "parsed_jsons"
+    parsed_jsons_folder.mkdir(exist_ok=True)
+    return str(parsed_jsons_folder)
+
+def generate_descriptive_filename(parsed_results: dict[str, Any], extension: str = '.json') -> str:
+    team1_name = parsed_results['Axis']['Team Name']
+    team2_name = parsed_results['Allies']['Team Name']
+    map_name = parsed_results['Map']
+    match_date = parsed_results['Match Date']
+    processed_date = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Replace any characters that might not be suitable for filenames
+    team1_name = ''.join(c if c.isalnum() else '_' for c in team1_name)
+    team2_name = ''.join(c if c.isalnum() else '_' for c in team2_name)
+    map_name = ''.join(c if c.isalnum() else '_' for c in map_name)
+    match_date = ''.join(c if c.isalnum() else '_' for c in match_date)
+
+    return f"{team1_name}_vs_{team2_name}_{map_name}_{match_date}_Processed_{processed_date}{extension}"
+
+def unique_output_path(folder: str, file_name: str) -> str:
+    """Path for file_name in folder, numbered _2, _3, ... if the name is taken."""
+    output_file: str = os.path.join(folder, file_name)
+
+    # Batch runs can produce the same name for two matches within one second
+    stem, extension = os.path.splitext(output_file)
+    suffix = 2
+    while os.path.exists(output_file):
+        output_file = f"{stem}_{suffix}{extension}"
+        suffix += 1
+    return output_file
+
+def write_match_json(parsed_results: dict[str, Any], parsed_jsons_folder: str) -> str:
+    """Write a parsed match to parsed_jsons_folder and return the path of the new file.
+
+    The match's MatchAnalysis is stored in parsed_results and the file, so the graph and
+    database load that follow read it instead of computing it again.
+    """
+    from match_analysis import MatchAnalysis
+
+    output_file = unique_output_path(parsed_jsons_folder, generate_descriptive_filename(parsed_results))
+    with instrumentation.span('match_analysis'):
+        MatchAnalysis.attach(parsed_results)
+
+    with instrumentation.span('write_match_json'), open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(parsed_results, f, cls=UnicodeJsonEncoder, ensure_ascii=False, indent=4)
+
+    return output_file
@@ -1,8 +1,12 @@
-from typing import Any
+from typing import Any, Iterable
 from player_data import PlayerData
 
 class MatchResults:
-    def __init__(self, axis_team_name: str, allies_team_name: str, map_name: str, match_date: str) -> None:
+    def __init__(self, axis_team_name: str, allies_team_name: str, map_name: str, match_date: str,
+                 keep_players: bool = True) -> None:
+        # With keep_players False only the totals are kept, for streaming large exports
+        self.keep_players = keep_players
+        self.spectator_count = 0
         self.results: dict[str, Any] = {
             'Axis': self._create_team_dict(axis_team_name),
             'Allies': self._create_team_dict(allies_team_name),
@@ -40,25 +44,55 @@ class MatchResults:
         return stats
 
     def add_player(self, player: PlayerData) -> None:
-        if player.side == 'Spectators':
-            self.results['Spectators'].append(player.to_dict())
+        self.add_player_dict(player.to_dict())
+
+    def add_player_dict(self, player: dict[str, Any]) -> None:
+        """Add a player in the PlayerData.to_dict shape."""
+        if player['Side'] == 'Spectators':
+            self.spectator_count += 1
+            if self.keep_players:
+                self.results['Spectators'].append(player)
         else:
-            side = self.results[player.side]
-            group = side[player.group]
+            side = self.results[player['Side']]
+            group = side[player['Group']]
             self._update_stats(group, player)
-            group['Players'].append(player.to_dict())
+            if self.keep_players:
+                group['Players'].append(player)
             self._update_stats(side['Total'], player)
 
     @staticmethod
-    def _update_stats(stats: dict[str, Any], player: PlayerData) -> None:
+    def _update_stats(stats: dict[str, Any], player: dict[str, Any]) -> None:
         stats['PlayerCount'] += 1
-        stats['Kills'] += player.kills
-        stats['Deaths'] += player.deaths
-        stats['CombatEffectiveness'] += player.combat_effectiveness
-        stats['OffensivePoints'] += player.offensive_points
-        stats['DefensivePoints'] += player.defensive_points
-        stats['SupportPoints'] += player.support_points
-        stats['MachineGunKills'] += player.machine_gun_kills
+        stats['Kills'] += player['Kills']
+        stats['Deaths'] += player['Deaths']
+        stats['CombatEffectiveness'] += player['CombatEffectiveness']
+        stats['OffensivePoints'] += player['OffensivePoints']
+        stats['DefensivePoints'] += player['DefensivePoints']
+        stats['SupportPoints'] += player['SupportPoints']
+        stats['MachineGunKills'] += player['MachineGunKills']
+
+    @staticmethod
+    def kill_edges(players: Iterable[dict[str, Any]]) -> list[tuple[str | None, str | None, str, str, int]]:
+        """(KillerID, VictimID, KillerName, VictimName, Kills) edges from the Nemesis and Victim maps.
+
+        The maps are keyed by player name, so names are resolved to IDs among the match's
+        players; a name that is not in the match (a renamed or departed player) gets a None
+        ID. Kills between two players of the match come from the killer's Victim map only,
+        so no kill is counted twice.
+        """
+        players = list(players)
+        ids_by_name: dict[str, str] = {}
+        for player in players:
+            ids_by_name.setdefault(player['Name'], player['PlayerID'])
+
+        edges = []
+        for player in players:
+            for victim_name, kills in player.get('Victim', {}).items():
+                edges.append((player['PlayerID'], ids_by_name.get(victim_name), player['Name'], victim_name, int(kills)))
+            for killer_name, kills in player.get('Nemesis', {}).items():
+                if killer_name not in ids_by_name:
+                    edges.append((None, player['PlayerID'], killer_name, player['Name'], int(kills)))
+        return edges
 
     def calculate_kdrs(self) -> None:
         for side in ['Axis', 'Allies']:
@@ -70,8 +104,7 @@ class MatchResults:
 
     @staticmethod
     def calculate_kdr(kills: int, deaths: int) -> str:
-        denominator: int = 1 if deaths == 0 else deaths
-        return format(kills / denominator, '.2f')
+        return format(PlayerData.kill_death_ratio(kills, deaths), '.2f')
 
     def to_dict(self) -> dict[str, Any]:
         return self.results
\ No newline at end of file
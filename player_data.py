@@ -1,7 +1,23 @@
 import json
 from typing import Any
 
-from weapon_data import WeaponData
+from weapon_data import weapon_index
+
+# Optional per-player rate and streak columns: (CSV header, to_dict key, type)
+METRIC_COLUMNS: list[tuple[str, str, type]] = [
+    ('Max kill streak', 'MaxKillStreak', int),
+    ('Kill(s) / minute', 'KillsPerMinute', float),
+    ('Death(s) / minute', 'DeathsPerMinute', float),
+    ('Max death streak', 'MaxDeathStreak', int),
+    ('Max TK streak', 'MaxTKStreak', int),
+    ('Death by TK', 'DeathByTK', int),
+    ('Death by TK Streak', 'DeathByTKStreak', int),
+    ('(aprox.) Longest life min.', 'LongestLifeMinutes', int),
+    ('(aprox.) Shortest life secs.', 'ShortestLifeSeconds', int),
+]
+# Where a player's Group came from: the weapon heuristic, a confident GroupClassifier
+# prediction, a person answering a review prompt, or an armor override
+GROUP_SOURCES: list[str] = ['heuristic', 'classifier', 'reviewed', 'override']
 
 class PlayerData:
     def __init__(self, row: list[str], column_indices: dict[str, int]) -> None:
@@ -16,11 +32,16 @@ class PlayerData:
         self.support_points = int(row[column_indices['Support Points']])
         self.weapons: dict[str, int] = self.parse_json_field(row[column_indices['Weapons']])
         self.death_by_weapons: dict[str, int] = self.parse_json_field(row[column_indices['Death by Weapons']])
+        self.metrics: dict[str, int | float | None] = self.parse_metrics(row, column_indices)
+        # Names of the players who killed this player, and of those this player killed, with counts
+        self.nemesis: dict[str, int] = self.parse_optional_json_field(row, column_indices, 'Nemesis')
+        self.victim: dict[str, int] = self.parse_optional_json_field(row, column_indices, 'Victim')
         self.machine_gun_kills = 0
         self.side_likelihood: dict[str, int] = {'Axis': 0, 'Allies': 0}
         self.group_likelihood: dict[str, int] = {'Infantry': 0, 'Artillery': 0, 'Armor': 0}
         self.side = 'Spectators'
         self.group = 'Unknown'
+        self.group_source = 'heuristic'
 
     
     def _get_id_from_row(self, row: list[str], column_indices: dict[str, int]) -> str:
@@ -40,29 +61,47 @@ class PlayerData:
             print(f"Warning: Could not parse JSON field: {field}")
             return {}
 
+    @staticmethod
+    def parse_metrics(row: list[str], column_indices: dict[str, int]) -> dict[str, int | float | None]:
+        """Rate and streak metrics keyed by their to_dict name; None where the export lacks the column."""
+        metrics: dict[str, int | float | None] = {}
+        for column, key, value_type in METRIC_COLUMNS:
+            metrics[key] = value_type(row[column_indices[column]]) if column in column_indices else None
+        return metrics
+
+    @staticmethod
+    def parse_optional_json_field(row: list[str], column_indices: dict[str, int], column: str) -> dict[str, int]:
+        if column not in column_indices:
+            return {}
+        return PlayerData.parse_json_field(row[column_indices[column]])
+
     def calculate_kdr(self) -> str:
-        denominator: int = 1 if self.deaths == 0 else self.deaths
-        return format(self.kills / denominator, '.2f')
+        return format(self.kill_death_ratio(self.kills, self.deaths), '.2f')
+
+    @staticmethod
+    def kill_death_ratio(kills: int, deaths: int) -> float:
+        """Kills per death, counting no deaths as one."""
+        return kills / (deaths or 1)
 
     def process_weapons(self) -> set[str]:
         unknown_weapons = set()
         
         for weapon, count in self.weapons.items():
             count = int(count)
-            if weapon in WeaponData.WEAPONS:
-                ref: dict[str, str] = WeaponData.WEAPONS[weapon]
-                self.side_likelihood[ref['side']] += count
-                self.group_likelihood[ref['group']] += count
+            info = weapon_index.lookup(weapon)
+            if info.is_known:
+                self.side_likelihood[info.side] += count
+                self.group_likelihood[info.group] += count
             else:
                 unknown_weapons.add(weapon)
-            if weapon in WeaponData.MACHINE_GUNS:
+            if info.is_machine_gun:
                 self.machine_gun_kills += count
 
         for weapon, count in self.death_by_weapons.items():
             count = int(count)
-            if weapon in WeaponData.WEAPONS:
-                ref = WeaponData.WEAPONS[weapon]
-                side_inverse = 'Axis' if ref['side'] == 'Allies' else 'Allies'
+            info = weapon_index.lookup(weapon)
+            if info.is_known:
+                side_inverse = 'Axis' if info.side == 'Allies' else 'Allies'
                 self.side_likelihood[side_inverse] += count
             else:
                 unknown_weapons.add(weapon)
@@ -100,5 +139,9 @@ class PlayerData:
             'sideLikelihood': self.side_likelihood,
             'groupLikelihood': self.group_likelihood,
             'Side': self.side,
-            'Group': self.group
+            'Group': self.group,
+            'GroupSource': self.group_source,
+            **self.metrics,
+            'Nemesis': self.nemesis,
+            'Victim': self.victim
         }
@@ -0,0 +1,280 @@
+import sqlite3
+import numpy as np
+from itertools import groupby
+from typing import Iterable, NamedTuple
+import instrumentation
+
+INITIAL_RATING = 1500.0
+# Elo scale: a 400 point lead means winning ten comparisons for every one lost
+RATING_SCALE = 400.0
+PLAYER_K = 24.0
+# New players move faster until their rating has settled
+PROVISIONAL_K = 48.0
+PROVISIONAL_MATCHES = 10
+TEAM_K = 32.0
+# Share of a player's change that comes from their side's result rather than their standing in their group
+SIDE_WEIGHT = 0.3
+# A snapshot of every rating is kept at least this often, for replays after a backfill or retraction
+CHECKPOINT_INTERVAL = 500
+# Matches rated per pass: their rows are read and their ratings written in a few statements
+RATING_CHUNK = 1000
+
+class PlayerResult(NamedTuple):
+    player_id: str
+    team_id: int
+    side: str
+    group: str
+    kills: int
+    combat_effectiveness: int
+
+def expected_score(rating: float | np.ndarray, opponent: float | np.ndarray) -> float | np.ndarray:
+    """Expected share of comparisons won against an opponent, from the rating difference."""
+    return 1.0 / (1.0 + 10.0 ** ((opponent - rating) / RATING_SCALE))
+
+class RatingEngine:
+    """Elo-style player and team ratings, updated one match at a time in memory.
+
+    CRCON exports carry no match result, so each match is scored from what they do carry:
+
+    * Side result: a side's share of the match's kills against the share expected from
+      the rating difference. Teams are rated on this alone; for players the expectation
+      comes from the average rating of the two lineups.
+    * Standing: every player is compared with every other player of the same group on
+      either side, on kills and on combat effectiveness. The share of comparisons won is
+      set against the share expected from the players' ratings.
+
+    A player's change is their K factor times the two, weighted by SIDE_WEIGHT. Only the
+    players and teams of the matches being rated need to be loaded.
+    """
+
+    def __init__(self, players: dict[str, tuple[float, int]] | None = None,
+                 teams: dict[int, tuple[float, int]] | None = None) -> None:
+        # (Rating, Matches) per PlayerID and TeamID
+        self.players = players if players is not None else {}
+        self.teams = teams if teams is not None else {}
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> 'RatingEngine':
+        """Ratings of the players and teams of the matches in temp.RatingResults."""
+        players = conn.execute('''
+            SELECT PlayerID, Rating, Matches FROM PlayerRatings
+            WHERE PlayerID IN (
+                SELECT PlayerID FROM MatchPerformance WHERE ResultID IN (SELECT ResultID FROM RatingResults)
+            )
+        ''').fetchall()
+        teams = conn.execute('''
+            SELECT TeamID, Rating, Matches FROM TeamRatings
+            WHERE TeamID IN (
+                SELECT TeamID FROM MatchPerformance WHERE ResultID IN (SELECT ResultID FROM RatingResults)
+            )
+        ''').fetchall()
+        return cls({row[0]: (row[1], row[2]) for row in players}, {row[0]: (row[1], row[2]) for row in teams})
+
+    def rate_match(self, results: list[PlayerResult]) -> tuple[list[tuple], list[tuple]]:
+        """Rate one match and update the ratings held.
+
+        Returns (PlayerID, TeamID, RatingBefore, RatingAfter) rows and
+        (Side, TeamID, RatingBefore, RatingAfter, KillShare) rows for the history tables.
+        """
+        is_axis = np.array([result.side == 'Axis' for result in results], dtype=bool)
+        if not is_axis.any() or is_axis.all():
+            # A match with one side says nothing about anyone's strength
+            return [], []
+
+        before = [self.players.get(result.player_id, (INITIAL_RATING, 0)) for result in results]
+        ratings = np.array([rating for rating, _ in before])
+        matches = np.array([count for _, count in before])
+        kills = np.array([result.kills for result in results], dtype=float)
+        combat = np.array([result.combat_effectiveness for result in results], dtype=float)
+
+        axis_kills, allies_kills = kills[is_axis].sum(), kills[~is_axis].sum()
+        axis_share = axis_kills / (axis_kills + allies_kills) if axis_kills + allies_kills else 0.5
+        axis_expected = expected_score(ratings[is_axis].mean(), ratings[~is_axis].mean())
+        side_change = np.where(is_axis, axis_share - axis_expected, axis_expected - axis_share)
+
+        standing_change = np.zeros(len(results))
+        groups = np.array([result.group for result in results])
+        for group in np.unique(groups):
+            members = np.flatnonzero(groups == group)
+            if len(members) < 2:
+                continue
+            group_kills, group_combat, group_ratings = kills[members], combat[members], ratings[members]
+            won = (np.sign(group_kills[:, None] - group_kills[None, :])
+                   + np.sign(group_combat[:, None] - group_combat[None, :])) / 4 + 0.5
+            expected = expected_score(group_ratings[:, None], group_ratings[None, :])
+            # The diagonal compares each player with themselves, 0.5 won against 0.5 expected
+            standing_change[members] = (won.sum(axis=1) - expected.sum(axis=1)) / (len(members) - 1)
+
+        k_factor = np.where(matches < PROVISIONAL_MATCHES, PROVISIONAL_K, PLAYER_K)
+        after = ratings + k_factor * ((1 - SIDE_WEIGHT) * standing_change + SIDE_WEIGHT * side_change)
+
+        player_rows = []
+        for result, rating_before, rating_after, count in zip(results, ratings.tolist(), after.tolist(), matches.tolist()):
+            self.players[result.player_id] = (rating_after, count + 1)
+            player_rows.append((result.player_id, result.team_id, rating_before, rating_after))
+
+        team_rows = []
+        axis_team = results[int(np.argmax(is_axis))].team_id
+        allies_team = results[int(np.argmin(is_axis))].team_id
+        if axis_team != allies_team:
+            axis_rating, axis_matches = self.teams.get(axis_team, (INITIAL_RATING, 0))
+            allies_rating, allies_matches = self.teams.get(allies_team, (INITIAL_RATING, 0))
+            change = TEAM_K * (axis_share - expected_score(axis_rating, allies_rating))
+            self.teams[axis_team] = (axis_rating + change, axis_matches + 1)
+            self.teams[allies_team] = (allies_rating - change, allies_matches + 1)
+            team_rows = [('Axis', axis_team, axis_rating, axis_rating + change, axis_share),
+                         ('Allies', allies_team, allies_rating, allies_rating - change, 1 - axis_share)]
+        return player_rows, team_rows
+
+    def save(self, conn: sqlite3.Connection) -> None:
+        conn.executemany('''
+            INSERT INTO PlayerRatings (PlayerID, Rating, Matches) VALUES (?, ?, ?)
+            ON CONFLICT(PlayerID) DO UPDATE SET Rating = excluded.Rating, Matches = excluded.Matches
+        ''', ((player_id, rating, count) for player_id, (rating, count) in self.players.items()))
+        conn.executemany('''
+            INSERT INTO TeamRatings (TeamID, Rating, Matches) VALUES (?, ?, ?)
+            ON CONFLICT(TeamID) DO UPDATE SET Rating = excluded.Rating, Matches = excluded.Matches
+        ''', ((team_id, rating, count) for team_id, (rating, count) in self.teams.items()))
+
+def _fill_rating_results(conn: sqlite3.Connection, result_ids: Iterable[int]) -> None:
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS RatingResults (ResultID INTEGER PRIMARY KEY)')
+    conn.execute('DELETE FROM temp.RatingResults')
+    conn.executemany('INSERT OR IGNORE INTO RatingResults (ResultID) VALUES (?)', ((result_id,) for result_id in result_ids))
+
+def last_rated(conn: sqlite3.Connection) -> tuple[str, int] | None:
+    """(MatchTimestamp, ResultID) of the last match folded into the ratings; None before the first."""
+    row = conn.execute('SELECT MatchTimestamp, ResultID FROM RatingState WHERE StateID = 1').fetchone()
+    return (row[0], row[1]) if row is not None and row[1] is not None else None
+
+@instrumentation.timed('rate_new_matches')
+def rate_new_matches(conn: sqlite3.Connection, result_ids: Iterable[int]) -> None:
+    """Fold newly loaded matches into the ratings.
+
+    Matches played after the last rated one are rated on top of the current ratings.
+    When any of them was played earlier, a backfill, the ratings are replayed from the
+    last checkpoint before it.
+    """
+    _fill_rating_results(conn, result_ids)
+    positions = conn.execute('''
+        SELECT MatchTimestamp, ResultID FROM ParsedResults
+        WHERE ResultID IN (SELECT ResultID FROM RatingResults)
+        ORDER BY MatchTimestamp, ResultID
+    ''').fetchall()
+    if not positions:
+        return
+    last = last_rated(conn)
+    if last is not None and tuple(positions[0]) < last:
+        replay_ratings(conn, tuple(positions[0]))
+    else:
+        _rate_in_order(conn, positions)
+
+@instrumentation.timed('replay_ratings')
+def replay_ratings(conn: sqlite3.Connection, since: tuple[str, int] | None = None) -> int:
+    """Re-rate every match from the last checkpoint before since, or from the start without it.
+
+    since is the (MatchTimestamp, ResultID) of the earliest match that was added or
+    retracted; everything rated from the checkpoint on is discarded and rated again.
+    Returns the number of matches rated.
+    """
+    checkpoint = None
+    if since is not None:
+        checkpoint = conn.execute('''
+            SELECT CheckpointID, MatchTimestamp, ResultID FROM RatingCheckpoints
+            WHERE (MatchTimestamp, ResultID) < (?, ?)
+            ORDER BY MatchTimestamp DESC, ResultID DESC
+            LIMIT 1
+        ''', since).fetchone()
+
+    # Checkpoints are only ever added after the last one, so their IDs are in match order
+    checkpoint_id = checkpoint[0] if checkpoint is not None else 0
+    for table in ['PlayerRatingCheckpoints', 'TeamRatingCheckpoints', 'RatingCheckpoints']:
+        conn.execute(f'DELETE FROM {table} WHERE CheckpointID > ?', (checkpoint_id,))
+    for table in ['PlayerRatings', 'TeamRatings']:
+        conn.execute(f'DELETE FROM {table}')
+
+    if checkpoint is None:
+        for table in ['PlayerRatingHistory', 'TeamRatingHistory']:
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute('UPDATE RatingState SET MatchTimestamp = NULL, ResultID = NULL, MatchesSinceCheckpoint = 0')
+        positions = conn.execute('SELECT MatchTimestamp, ResultID FROM ParsedResults ORDER BY MatchTimestamp, ResultID').fetchall()
+    else:
+        conn.execute('''
+            INSERT INTO PlayerRatings (PlayerID, Rating, Matches)
+            SELECT PlayerID, Rating, Matches FROM PlayerRatingCheckpoints WHERE CheckpointID = ?
+        ''', (checkpoint_id,))
+        conn.execute('''
+            INSERT INTO TeamRatings (TeamID, Rating, Matches)
+            SELECT TeamID, Rating, Matches FROM TeamRatingCheckpoints WHERE CheckpointID = ?
+        ''', (checkpoint_id,))
+        position = (checkpoint[1], checkpoint[2])
+        # Retracted matches are already gone from ParsedResults, and retract_match drops their history itself
+        for table in ['PlayerRatingHistory', 'TeamRatingHistory']:
+            conn.execute(f'''
+                DELETE FROM {table}
+                WHERE ResultID IN (SELECT ResultID FROM ParsedResults WHERE (MatchTimestamp, ResultID) > (?, ?))
+            ''', position)
+        conn.execute('UPDATE RatingState SET MatchTimestamp = ?, ResultID = ?, MatchesSinceCheckpoint = 0', position)
+        positions = conn.execute('''
+            SELECT MatchTimestamp, ResultID FROM ParsedResults
+            WHERE (MatchTimestamp, ResultID) > (?, ?)
+            ORDER BY MatchTimestamp, ResultID
+        ''', position).fetchall()
+
+    _rate_in_order(conn, positions)
+    return len(positions)
+
+def _rate_in_order(conn: sqlite3.Connection, positions: list[tuple[str, int]]) -> None:
+    """Rate matches, given as (MatchTimestamp, ResultID) in that order, after the last rated match."""
+    for start in range(0, len(positions), RATING_CHUNK):
+        chunk = positions[start:start + RATING_CHUNK]
+        _fill_rating_results(conn, (result_id for _, result_id in chunk))
+        engine = RatingEngine.load(conn)
+        # A player listed twice in one export is rated once, on their first row's side and group
+        rows = conn.execute('''
+            SELECT mp.ResultID, pr.MatchTimestamp, mp.PlayerID, mp.TeamID, mp.Side, mp.PlayerGroup,
+                   SUM(mp.Kills), SUM(mp.CombatEffectiveness), MIN(mp.MatchPerformanceID)
+            FROM MatchPerformance mp
+            JOIN ParsedResults pr ON pr.ResultID = mp.ResultID
+            WHERE mp.ResultID IN (SELECT ResultID FROM RatingResults)
+              AND mp.TeamID IS NOT NULL AND mp.Side IN ('Axis', 'Allies')
+            GROUP BY mp.ResultID, mp.PlayerID
+            ORDER BY pr.MatchTimestamp, mp.ResultID, MIN(mp.MatchPerformanceID)
+        ''')
+
+        player_history = []
+        team_history = []
+        for (result_id, timestamp), match_rows in groupby(rows, key=lambda row: (row[0], row[1])):
+            player_rows, team_rows = engine.rate_match([PlayerResult(*row[2:8]) for row in match_rows])
+            player_history.extend((result_id, timestamp) + row for row in player_rows)
+            team_history.extend((result_id, timestamp) + row for row in team_rows)
+
+        conn.executemany('''
+            INSERT OR REPLACE INTO PlayerRatingHistory (ResultID, MatchTimestamp, PlayerID, TeamID, RatingBefore, RatingAfter)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', player_history)
+        conn.executemany('''
+            INSERT OR REPLACE INTO TeamRatingHistory (ResultID, MatchTimestamp, Side, TeamID, RatingBefore, RatingAfter, KillShare)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', team_history)
+        engine.save(conn)
+        instrumentation.count('rated_matches', len(chunk))
+
+        conn.execute('''
+            UPDATE RatingState SET MatchTimestamp = ?, ResultID = ?, MatchesSinceCheckpoint = MatchesSinceCheckpoint + ?
+        ''', (chunk[-1][0], chunk[-1][1], len(chunk)))
+        since_checkpoint = conn.execute('SELECT MatchesSinceCheckpoint FROM RatingState').fetchone()[0]
+        if since_checkpoint >= CHECKPOINT_INTERVAL:
+            _save_checkpoint(conn, chunk[-1])
+
+def _save_checkpoint(conn: sqlite3.Connection, position: tuple[str, int]) -> None:
+    """Snapshot every current rating as of the match at position."""
+    checkpoint_id = conn.execute('INSERT INTO RatingCheckpoints (MatchTimestamp, ResultID) VALUES (?, ?)', position).lastrowid
+    conn.execute('''
+        INSERT INTO PlayerRatingCheckpoints (CheckpointID, PlayerID, Rating, Matches)
+        SELECT ?, PlayerID, Rating, Matches FROM PlayerRatings
+    ''', (checkpoint_id,))
+    conn.execute('''
+        INSERT INTO TeamRatingCheckpoints (CheckpointID, TeamID, Rating, Matches)
+        SELECT ?, TeamID, Rating, Matches FROM TeamRatings
+    ''', (checkpoint_id,))
+    conn.execute('UPDATE RatingState SET MatchesSinceCheckpoint = 0')
@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any
+import instrumentation
+from match_output import ANALYSIS_KEY
+
+# dpi and file format per preset; 'print' matches the original single-match render
+RENDER_PRESETS: dict[str, dict[str, Any]] = {
+    'preview': {'dpi': 100, 'format': 'png'},
+    'print': {'dpi': 300, 'format': 'png'},
+    'vector': {'dpi': 300, 'format': 'pdf'},
+}
+DEFAULT_PRESET = 'print'
+# The index lives in a subfolder so folder scans for match JSON never see it
+CACHE_DIRECTORY = '.render_cache'
+CACHE_INDEX_FILENAME = 'index.json'
+# Hex digits of the content hash used in output file names
+OUTPUT_KEY_LENGTH = 16
+
+def _init_render_worker() -> None:
+    import matplotlib
+    matplotlib.use('Agg')
+
+def _render_in_worker(data: dict[str, Any], directory: str, dpi: int, file_format: str, key: str) -> str:
+    from generate_comparison_graph import create_comprehensive_comparison
+    # Named after the cache key: workers rendering two matches of the same teams at once never share a file
+    return create_comprehensive_comparison(data, directory, dpi=dpi, file_format=file_format,
+                                           name_suffix=key[:OUTPUT_KEY_LENGTH])
+
+def content_hash(data: dict[str, Any], dpi: int, file_format: str) -> str:
+    """Hash of the match dict and render settings; equal hashes render identical figures.
+
+    The stored MatchAnalysis is derived from the rest of the dict, so it is left out.
+    """
+    payload = json.dumps({key: value for key, value in data.items() if key != ANALYSIS_KEY}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(f"{dpi}|{file_format}|{payload}".encode('utf-8')).hexdigest()
+
+class RenderService:
+    """Renders comparison graphs in worker processes using the Agg backend.
+
+    Each render is keyed on a content hash of the match dict and its dpi/format;
+    when the same content was already rendered into the same directory and the
+    file still exists, the earlier file is returned without rendering again.
+    """
+
+    def __init__(self, workers: int = 1, preset: str = DEFAULT_PRESET) -> None:
+        if preset not in RENDER_PRESETS:
+            raise ValueError(f"Unknown render preset '{preset}', expected one of {', '.join(RENDER_PRESETS)}")
+        self.workers = workers
+        self.preset = preset
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers never inherit a Tk or interactive backend from the parent
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_render_worker)
+        return self._executor
+
+    def render(self, data: dict[str, Any], directory: str, preset: str | None = None,
+               dpi: int | None = None, file_format: str | None = None) -> 'Future[str]':
+        """Queue a render and return a Future with the output path."""
+        settings = RENDER_PRESETS[preset or self.preset]
+        dpi = dpi or settings['dpi']
+        file_format = file_format or settings['format']
+        key = content_hash(data, dpi, file_format)
+
+        cached_file = self._cached_output(directory, key)
+        if cached_file is not None:
+            future: Future[str] = Future()
+            future.set_result(cached_file)
+            return future
+
+        future = Future()
+        recorded = self._get_executor().submit(instrumentation.call_recorded, instrumentation.is_enabled(),
+                                               _render_in_worker, data, directory, dpi, file_format, key)
+        recorded.add_done_callback(lambda done: self._finish_render(done, future))
+        future.add_done_callback(lambda done: self._remember_output(directory, key, done))
+        return future
+
+    @staticmethod
+    def _finish_render(recorded: Future, future: 'Future[str]') -> None:
+        # Worker timings are merged here so a run's report includes the render stages
+        try:
+            future.set_result(instrumentation.unwrap_recorded(recorded.result()))
+        except Exception as e:
+            future.set_exception(e)
+
+    def render_sync(self, data: dict[str, Any], directory: str, preset: str | None = None,
+                    dpi: int | None = None, file_format: str | None = None) -> str:
+        return self.render(data, directory, preset, dpi, file_format).result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _cached_output(self, directory: str, key: str) -> str | None:
+        with self._lock:
+            file_name = self._read_index(directory).get(key)
+        if file_name is None:
+            return None
+        output_file = os.path.join(directory, file_name)
+        return output_file if os.path.exists(output_file) else None
+
+    def _remember_output(self, directory: str, key: str, future: 'Future[str]') -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            index = self._read_index(directory)
+            index[key] = os.path.basename(future.result())
+            os.makedirs(os.path.join(directory, CACHE_DIRECTORY), exist_ok=True)
+            with open(os.path.join(directory, CACHE_DIRECTORY, CACHE_INDEX_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=4)
+
+    @staticmethod
+    def _read_index(directory: str) -> dict[str, str]:
+        try:
+            with open(os.path.join(directory, CACHE_DIRECTORY, CACHE_INDEX_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
@@ -0,0 +1,340 @@
+import os
+import io
+import csv
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Any
+import db_operations
+import ratings
+from match_output import match_timestamp
+
+REPORT_FORMATS = ['table', 'json', 'csv']
+STATEMENT_CACHE_SIZE = 256
+
+Report = dict[str, list[dict[str, Any]]]
+
+# What the reports read that older databases lack; an empty list only needs the table or view
+REQUIRED_SCHEMA: dict[str, list[str]] = {
+    'MatchPerformance': ['MatchTimestamp', 'PlayerGroup'],
+    'ParsedResults': ['MatchTimestamp'],
+    'PlayerCurrentName': [],
+    'PlayerCurrentTeam': [],
+    'PlayerAggregates': [],
+    'TeamMapAggregates': ['KillWins', 'KillLosses'],
+    'WeaponAggregates': [],
+    'PlayerWeaponAggregates': [],
+    'PlayerWeaponGroupAggregates': [],
+    'PlayerKillEdges': [],
+    'PlayerRatings': [],
+    'TeamRatings': [],
+    'PlayerRatingHistory': [],
+    'TeamSummary': [],
+}
+
+_connections: dict[str, sqlite3.Connection] = {}
+_connections_lock = threading.Lock()
+
+class ReportError(Exception):
+    pass
+
+def get_connection(db_file: str | None = None) -> sqlite3.Connection:
+    """The shared read-only connection for a database file, opened on first use.
+
+    Reusing one connection keeps the sqlite3 statement cache warm, so every report
+    statement after the first skips parsing and planning. Reports never migrate the
+    database, so they do not wait for or block an ingest; a database older than
+    REQUIRED_SCHEMA raises ReportError.
+    """
+    db_file = os.path.abspath(db_file or db_operations.db_path)
+    with _connections_lock:
+        conn = _connections.get(db_file)
+        if conn is None:
+            if not os.path.exists(db_file):
+                raise ReportError(f"Database {db_file} does not exist")
+            conn = db_operations.connect(db_file, read_only=True, cached_statements=STATEMENT_CACHE_SIZE,
+                                         check_same_thread=False)
+            try:
+                _check_schema(conn, db_file)
+            except ReportError:
+                conn.close()
+                raise
+            _connections[db_file] = conn
+    return conn
+
+def _check_schema(conn: sqlite3.Connection, db_file: str) -> None:
+    missing = []
+    for table, columns in REQUIRED_SCHEMA.items():
+        existing = set(row[1] for row in conn.execute(f'PRAGMA table_info({table})'))
+        if not existing:
+            missing.append(table)
+        missing.extend(f"{table}.{column}" for column in columns if existing and column not in existing)
+    if missing:
+        raise ReportError(f"Database {db_file} needs upgrading before it can be reported on (missing {', '.join(missing)}). "
+                          f"Run 'python main.py rebuild-aggregates' or load a match to upgrade it.")
+
+def close_connections() -> None:
+    with _connections_lock:
+        for conn in _connections.values():
+            conn.close()
+        _connections.clear()
+
+def _query(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _as_dicts(columns: list[str], rows: list[tuple]) -> list[dict[str, Any]]:
+    return [dict(zip(columns, row)) for row in rows]
+
+def resolve_player(conn: sqlite3.Connection, player: str) -> str:
+    """PlayerID for a Player ID or current player name."""
+    row = conn.execute('SELECT PlayerID FROM Players WHERE PlayerID = ?', (player,)).fetchone()
+    if row is None:
+        row = conn.execute('''
+            SELECT PlayerID FROM PlayerCurrentName
+            WHERE PlayerName = ? COLLATE NOCASE
+            ORDER BY LastSeen DESC
+            LIMIT 1
+        ''', (player,)).fetchone()
+    if row is None:
+        raise ReportError(f"No player with ID or current name '{player}'")
+    return row[0]
+
+def resolve_team(conn: sqlite3.Connection, team: str) -> int:
+    """TeamID for a team name or TeamID."""
+    row = conn.execute('SELECT TeamID FROM Teams WHERE TeamName = ? COLLATE NOCASE', (team,)).fetchone()
+    if row is None and team.isdigit():
+        row = conn.execute('SELECT TeamID FROM Teams WHERE TeamID = ?', (int(team),)).fetchone()
+    if row is None:
+        raise ReportError(f"No team named '{team}'")
+    return row[0]
+
+def player_card(conn: sqlite3.Connection, player: str, limit: int = 5) -> Report:
+    """Totals, rating, best single-match metrics, team history, form, weapons, victims and nemeses of one player."""
+    player_id = resolve_player(conn, player)
+    summary = _query(conn, '''
+        SELECT
+            p.PlayerID,
+            COALESCE(cn.PlayerName, p.PlayerName) AS CurrentName,
+            t.TeamName AS CurrentTeam,
+            COALESCE(pa.Matches, 0) AS Matches,
+            COALESCE(pa.Kills, 0) AS Kills,
+            COALESCE(pa.Deaths, 0) AS Deaths,
+            COALESCE(pa.CombatEffectiveness, 0) AS CombatEffectiveness,
+            ROUND(CAST(pa.Kills AS REAL) / NULLIF(pa.Matches, 0), 1) AS AverageKills,
+            ROUND(CAST(pa.Deaths AS REAL) / NULLIF(pa.Matches, 0), 1) AS AverageDeaths,
+            ROUND(CAST(pa.Kills AS REAL) / NULLIF(pa.Deaths, 0), 2) AS KDR,
+            CAST(ROUND(r.Rating) AS INTEGER) AS Rating
+        FROM Players p
+        LEFT JOIN PlayerAggregates pa ON pa.PlayerID = p.PlayerID
+        LEFT JOIN PlayerRatings r ON r.PlayerID = p.PlayerID
+        LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = p.PlayerID
+        LEFT JOIN PlayerCurrentTeam ct ON ct.PlayerID = p.PlayerID
+        LEFT JOIN Teams t ON t.TeamID = ct.TeamID
+        WHERE p.PlayerID = ?
+    ''', (player_id,))
+    bests = _query(conn, '''
+        SELECT
+            MAX(MaxKillStreak) AS BestKillStreak,
+            MAX(KillsPerMinute) AS BestKillsPerMinute,
+            MAX(LongestLifeMinutes) AS LongestLifeMinutes,
+            MAX(Kills) AS MostKills,
+            MAX(CombatEffectiveness) AS BestCombatEffectiveness
+        FROM MatchPerformance
+        WHERE PlayerID = ?
+    ''', (player_id,))
+    summary[0].update(bests[0])
+
+    return {
+        'Player': summary,
+        'Teams': _as_dicts(['TeamName', 'FirstSeen', 'LastSeen', 'MatchesPlayed'],
+                           db_operations.get_player_team_history(conn, player_id)),
+        'Form': _as_dicts(['MatchTimestamp', 'FileName', 'MapName', 'TeamName', 'PlayerGroup', 'Kills', 'Deaths',
+                           'CombatEffectiveness', 'Rating'], db_operations.get_player_form(conn, player_id, limit)),
+        'Weapons': _query(conn, '''
+            SELECT w.WeaponName, pwa.Kills, pwa.Deaths
+            FROM PlayerWeaponAggregates pwa
+            JOIN Weapons w ON w.WeaponID = pwa.WeaponID
+            WHERE pwa.PlayerID = ? AND pwa.Kills > 0
+            ORDER BY pwa.Kills DESC
+            LIMIT ?
+        ''', (player_id, limit)),
+        'Victims': _as_dicts(['PlayerID', 'PlayerName', 'Kills', 'Matches'],
+                             db_operations.get_top_victims(conn, player_id, limit)),
+        'Nemeses': _as_dicts(['PlayerID', 'PlayerName', 'Kills', 'Matches'],
+                             db_operations.get_nemeses(conn, player_id, limit)),
+    }
+
+def team_roster(conn: sqlite3.Connection, team: str, as_of: str | None = None, days: int = 90) -> Report:
+    """Team totals and every player who has played for the team.
+
+    With as_of, the roster is the players who played for the team in the days before that date.
+    """
+    team_id = resolve_team(conn, team)
+    if as_of is not None:
+        as_of_timestamp = match_timestamp(as_of)
+        if as_of_timestamp is None:
+            raise ReportError(f"Could not read the date '{as_of}'")
+        roster = _as_dicts(['PlayerID', 'PlayerName', 'FirstSeen', 'LastSeen', 'MatchesPlayed', 'AverageKills', 'AverageCombatEffectiveness'],
+                           db_operations.get_team_roster_as_of(conn, team_id, as_of_timestamp, days))
+    else:
+        roster = _as_dicts(['PlayerName', 'FirstSeen', 'LastSeen', 'MatchesPlayed', 'AverageKills', 'AverageCombatEffectiveness'],
+                           db_operations.get_team_roster(conn, team_id))
+    return {
+        'Team': _query(conn, '''
+            SELECT t.TeamID, t.TeamName, ts.Matches, ts.PlayerAppearances, ts.Kills, ts.Deaths,
+                   ROUND(ts.AverageKills, 1) AS AverageKills, ROUND(ts.AverageDeaths, 1) AS AverageDeaths
+            FROM Teams t
+            LEFT JOIN TeamSummary ts ON ts.TeamID = t.TeamID
+            WHERE t.TeamID = ?
+        ''', (team_id,)),
+        'Roster': roster,
+    }
+
+def map_table(conn: sqlite3.Connection, team: str | None = None) -> Report:
+    """Per team and map record, counting the side with more kills as the winner.
+
+    CRCON exports carry no match result, so KillWins/KillLosses are a proxy, not the score.
+    """
+    if team is None:
+        rows = _query(conn, '''
+            SELECT t.TeamName, tma.MapName, tma.Matches, tma.KillWins, tma.KillLosses,
+                   ROUND(CAST(tma.KillWins AS REAL) / tma.Matches, 3) AS KillWinRate, tma.Kills, tma.Deaths
+            FROM TeamMapAggregates tma
+            JOIN Teams t ON t.TeamID = tma.TeamID
+            ORDER BY tma.MapName, KillWinRate DESC, tma.Matches DESC
+        ''')
+    else:
+        rows = _query(conn, '''
+            SELECT t.TeamName, tma.MapName, tma.Matches, tma.KillWins, tma.KillLosses,
+                   ROUND(CAST(tma.KillWins AS REAL) / tma.Matches, 3) AS KillWinRate, tma.Kills, tma.Deaths
+            FROM TeamMapAggregates tma
+            JOIN Teams t ON t.TeamID = tma.TeamID
+            WHERE tma.TeamID = ?
+            ORDER BY KillWinRate DESC, tma.Matches DESC
+        ''', (resolve_team(conn, team),))
+    return {'Maps': rows}
+
+def rating_table(conn: sqlite3.Connection, min_matches: int = ratings.PROVISIONAL_MATCHES, limit: int = 10) -> Report:
+    """Highest rated players with at least min_matches rated matches, and every rated team."""
+    return {
+        'Players': _query(conn, '''
+            SELECT r.PlayerID, COALESCE(cn.PlayerName, r.PlayerID) AS PlayerName, t.TeamName AS CurrentTeam,
+                   CAST(ROUND(r.Rating) AS INTEGER) AS Rating, r.Matches
+            FROM PlayerRatings r
+            LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = r.PlayerID
+            LEFT JOIN PlayerCurrentTeam ct ON ct.PlayerID = r.PlayerID
+            LEFT JOIN Teams t ON t.TeamID = ct.TeamID
+            WHERE r.Matches >= ?
+            ORDER BY r.Rating DESC
+            LIMIT ?
+        ''', (min_matches, limit)),
+        'Teams': _query(conn, '''
+            SELECT t.TeamName, CAST(ROUND(r.Rating) AS INTEGER) AS Rating, r.Matches
+            FROM TeamRatings r
+            JOIN Teams t ON t.TeamID = r.TeamID
+            ORDER BY r.Rating DESC
+        '''),
+    }
+
+def weapon_leaderboard(conn: sqlite3.Connection, weapon: str | None = None, group: str | None = None,
+                       machine_guns: bool = False, limit: int = 10) -> Report:
+    """Top players with one weapon, a weapon group or machine guns; the top weapons when no filter is given."""
+    if weapon is not None:
+        row = conn.execute('SELECT WeaponID FROM Weapons WHERE WeaponName = ? COLLATE NOCASE', (weapon,)).fetchone()
+        if row is None:
+            raise ReportError(f"No weapon named '{weapon}'")
+        rows = _query(conn, '''
+            SELECT pwa.PlayerID, COALESCE(cn.PlayerName, pwa.PlayerID) AS PlayerName, pwa.Kills
+            FROM PlayerWeaponAggregates pwa
+            LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = pwa.PlayerID
+            WHERE pwa.WeaponID = ? AND pwa.Kills > 0
+            ORDER BY pwa.Kills DESC
+            LIMIT ?
+        ''', (row[0], limit))
+    elif machine_guns or group is not None:
+        if machine_guns:
+            group = db_operations.MACHINE_GUN_GROUP
+        else:
+            row = conn.execute('SELECT WeaponGroup FROM Weapons WHERE WeaponGroup = ? COLLATE NOCASE LIMIT 1', (group,)).fetchone()
+            if row is None:
+                raise ReportError(f"No weapon group named '{group}'")
+            group = row[0]
+        rows = _query(conn, '''
+            SELECT pwga.PlayerID, COALESCE(cn.PlayerName, pwga.PlayerID) AS PlayerName, pwga.Kills
+            FROM PlayerWeaponGroupAggregates pwga
+            LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = pwga.PlayerID
+            WHERE pwga.WeaponGroup = ? AND pwga.Kills > 0
+            ORDER BY pwga.Kills DESC
+            LIMIT ?
+        ''', (group, limit))
+    else:
+        rows = _query(conn, '''
+            SELECT w.WeaponName, w.WeaponGroup, wa.Kills, wa.Deaths
+            FROM WeaponAggregates wa
+            JOIN Weapons w ON w.WeaponID = wa.WeaponID
+            WHERE wa.Kills > 0
+            ORDER BY wa.Kills DESC
+            LIMIT ?
+        ''', (limit,))
+    return {'Weapons': rows}
+
+def format_report(report: Report, output_format: str = 'table') -> str:
+    if output_format == 'json':
+        return json.dumps(report, indent=2, ensure_ascii=False)
+    if output_format == 'csv':
+        output = io.StringIO()
+        for index, (section, rows) in enumerate(report.items()):
+            # Multi-section reports mark where each table starts
+            if len(report) > 1:
+                if index:
+                    output.write('\n')
+                output.write(f"# {section}\n")
+            if rows:
+                writer = csv.DictWriter(output, fieldnames=list(rows[0]), lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(rows)
+        return output.getvalue()
+
+    lines = []
+    for section, rows in report.items():
+        lines.append(f"{section}:")
+        if not rows:
+            lines.append("  (none)")
+        else:
+            columns = list(rows[0])
+            cells = [[('' if row[column] is None else str(row[column])) for column in columns] for row in rows]
+            widths = [max(len(column), *(len(row[index]) for row in cells)) for index, column in enumerate(columns)]
+            lines.append('  ' + '  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+            lines.extend('  ' + '  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in cells)
+        lines.append('')
+    return '\n'.join(lines)
+
+def build_report(conn: sqlite3.Connection, args: argparse.Namespace) -> Report:
+    if args.report == 'player':
+        return player_card(conn, args.player, args.limit)
+    if args.report == 'roster':
+        return team_roster(conn, args.team, args.as_of, args.days)
+    if args.report == 'maps':
+        return map_table(conn, args.team)
+    if args.report == 'weapons':
+        return weapon_leaderboard(conn, args.weapon, args.group, args.machine_guns, args.limit)
+    if args.report == 'ratings':
+        return rating_table(conn, args.min_matches, args.limit)
+    raise ValueError(f"Unknown report: {args.report}")
+
+def run_report_command(args: argparse.Namespace) -> int:
+    try:
+        report = build_report(get_connection(args.db), args)
+    except ReportError as e:
+        print(f"Error: {e}")
+        return 1
+    output = format_report(report, args.format)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
@@ -0,0 +1,263 @@
+import os
+import sqlite3
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator, PercentFormatter
+from generate_comparison_graph import sanitize_filename
+from render_service import RENDER_PRESETS, DEFAULT_PRESET
+
+TREND_PLAYERS = 5
+LEADERBOARD_PLAYERS = 10
+DISTRIBUTION_BINS = 20
+COLORS = ['#ff6b6b', '#4dabf7', '#69db7c', '#ffd43b', '#da77f2']
+BACKGROUND = '#1c1c1c'
+
+class TeamSeason(NamedTuple):
+    team_id: int
+    team_name: str
+    matches: int
+    kills: int
+    deaths: int
+    match_kills: np.ndarray  # Team kills per match, in load order
+    match_deaths: np.ndarray
+    leader_names: list[str]  # Players with the most kills for the team
+    leader_kills: np.ndarray
+    trend_names: list[str]
+    trend_kills: np.ndarray  # TREND_PLAYERS x matches, NaN where the player sat out
+    kill_distribution: np.ndarray  # Player-matches per kills bin
+    map_kill_win_rates: np.ndarray  # Per league map, NaN where the team never played it
+
+class Season(NamedTuple):
+    maps: list[str]
+    bin_edges: np.ndarray
+    teams: list[TeamSeason]
+
+def load_season(conn: sqlite3.Connection, team_names: list[str] | None = None) -> Season:
+    """Per team series, leaders, distributions and map records for the whole league.
+
+    Every player-match row is read once into NumPy arrays and split per team there;
+    team totals and map records come from TeamAggregates and TeamMapAggregates.
+    """
+    teams = conn.execute('''
+        SELECT t.TeamID, t.TeamName, ta.Matches, ta.Kills, ta.Deaths
+        FROM TeamAggregates ta
+        JOIN Teams t ON t.TeamID = ta.TeamID
+        ORDER BY t.TeamName COLLATE NOCASE
+    ''').fetchall()
+    if team_names is not None:
+        wanted = {name.lower() for name in team_names}
+        teams = [team for team in teams if team[1].lower() in wanted]
+
+    maps = [row[0] for row in conn.execute('SELECT DISTINCT MapName FROM TeamMapAggregates ORDER BY MapName')]
+    map_index = {map_name: index for index, map_name in enumerate(maps)}
+    win_rates: dict[int, np.ndarray] = {}
+    for team_id, map_name, matches, kill_wins in conn.execute('SELECT TeamID, MapName, Matches, KillWins FROM TeamMapAggregates'):
+        rates = win_rates.setdefault(team_id, np.full(len(maps), np.nan))
+        rates[map_index[map_name]] = kill_wins / matches if matches else np.nan
+
+    names = dict(conn.execute('''
+        SELECT p.rowid, COALESCE(cn.PlayerName, p.PlayerName)
+        FROM Players p
+        LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = p.PlayerID
+    ''').fetchall())
+    rows = np.array(conn.execute('''
+        SELECT mp.TeamID, mp.ResultID, p.rowid, mp.Kills, mp.Deaths
+        FROM MatchPerformance mp
+        JOIN Players p ON p.PlayerID = mp.PlayerID
+        WHERE mp.TeamID IS NOT NULL
+    ''').fetchall(), dtype=np.int64).reshape(-1, 5)
+    rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+    team_starts = np.searchsorted(rows[:, 0], [team[0] for team in teams])
+    team_ends = np.searchsorted(rows[:, 0], [team[0] for team in teams], side='right')
+
+    # Shared bins keep the distribution bars of every team in the same place
+    bin_width = max(1, int(np.ceil((rows[:, 3].max(initial=0) + 1) / DISTRIBUTION_BINS)))
+    bin_edges = np.arange(DISTRIBUTION_BINS + 1) * bin_width
+
+    seasons = []
+    for (team_id, team_name, matches, kills, deaths), start, end in zip(teams, team_starts, team_ends):
+        team_rows = rows[start:end]
+        result_ids, match_of_row = np.unique(team_rows[:, 1], return_inverse=True)
+        player_rowids, player_of_row = np.unique(team_rows[:, 2], return_inverse=True)
+        player_kills = np.bincount(player_of_row, weights=team_rows[:, 3], minlength=len(player_rowids))
+        leaders = np.argsort(-player_kills, kind='stable')
+
+        trend_kills = np.full((TREND_PLAYERS, len(result_ids)), np.nan)
+        for position, player in enumerate(leaders[:TREND_PLAYERS]):
+            mask = player_of_row == player
+            trend_kills[position, match_of_row[mask]] = team_rows[mask, 3]
+
+        seasons.append(TeamSeason(
+            team_id=team_id,
+            team_name=team_name,
+            matches=matches,
+            kills=kills,
+            deaths=deaths,
+            match_kills=np.bincount(match_of_row, weights=team_rows[:, 3], minlength=len(result_ids)),
+            match_deaths=np.bincount(match_of_row, weights=team_rows[:, 4], minlength=len(result_ids)),
+            leader_names=[names.get(rowid, '') for rowid in player_rowids[leaders[:LEADERBOARD_PLAYERS]].tolist()],
+            leader_kills=player_kills[leaders[:LEADERBOARD_PLAYERS]],
+            trend_names=[names.get(rowid, '') for rowid in player_rowids[leaders[:TREND_PLAYERS]].tolist()],
+            trend_kills=trend_kills,
+            kill_distribution=np.histogram(team_rows[:, 3], bin_edges)[0],
+            map_kill_win_rates=win_rates.get(team_id, np.full(len(maps), np.nan)),
+        ))
+    return Season(maps, bin_edges, seasons)
+
+class DashboardTemplate:
+    """A team dashboard figure built once and redrawn for each team.
+
+    Axes, lines, bars, legends and styling are created in __init__; draw() only swaps
+    the data of existing artists (set_data, set_height) and rescales the axes, so
+    rendering a league costs one figure setup plus one savefig per team.
+    """
+
+    def __init__(self, maps: list[str], bin_edges: np.ndarray) -> None:
+        with style.context('dark_background'):
+            self.figure = Figure(figsize=(22, 14), facecolor=BACKGROUND)
+            FigureCanvasAgg(self.figure)
+            grid = self.figure.add_gridspec(2, 3, left=0.05, right=0.98, bottom=0.1, top=0.9, wspace=0.22, hspace=0.45)
+            self.title = self.figure.suptitle('', fontsize=24, color='white')
+            self.subtitle = self.figure.text(0.5, 0.935, '', ha='center', fontsize=13, color='#bbbbbb')
+
+            self.team_axes = self.figure.add_subplot(grid[0, :2])
+            self.kills_line, = self.team_axes.plot([], [], color=COLORS[0], marker='o', markersize=3, label='Kills')
+            self.deaths_line, = self.team_axes.plot([], [], color=COLORS[1], marker='o', markersize=3, label='Deaths')
+            self._style_axes(self.team_axes, 'Team Kills and Deaths per Match', 'Match', 'Count')
+            self.team_axes.legend(loc='upper left', framealpha=0.8, facecolor='#333333', edgecolor='none')
+
+            self.map_axes = self.figure.add_subplot(grid[0, 2])
+            self.map_bars = self.map_axes.bar(np.arange(len(maps)), np.zeros(len(maps)), color=COLORS[2])
+            self.map_axes.set_xticks(np.arange(len(maps)))
+            self.map_axes.set_xticklabels(maps, rotation=45, ha='right', fontsize=9, color='white')
+            self.map_axes.set_ylim(0, 1.05)
+            self._style_axes(self.map_axes, 'Kill Win Rate by Map', None, 'Share of matches')
+            self.map_axes.yaxis.set_major_formatter(PercentFormatter(1.0))
+
+            self.trend_axes = self.figure.add_subplot(grid[1, 0])
+            self.trend_lines = [self.trend_axes.plot([], [], color=color, marker='o', markersize=3, label=' ')[0]
+                                for color in COLORS[:TREND_PLAYERS]]
+            self._style_axes(self.trend_axes, 'Top Players: Kills per Match', 'Match', 'Kills')
+            self.trend_legend = self.trend_axes.legend(loc='upper left', fontsize=8, framealpha=0.8,
+                                                       facecolor='#333333', edgecolor='none')
+
+            self.leader_axes = self.figure.add_subplot(grid[1, 1])
+            self.leader_bars = self.leader_axes.bar(np.arange(LEADERBOARD_PLAYERS), np.zeros(LEADERBOARD_PLAYERS),
+                                                    color=COLORS[0])
+            # The tick formatter reads the names of the team being drawn
+            self.leader_names = [''] * LEADERBOARD_PLAYERS
+            self.leader_axes.set_xticks(np.arange(LEADERBOARD_PLAYERS))
+            self.leader_axes.xaxis.set_major_formatter(FuncFormatter(lambda x, p: self.leader_names[int(round(x))]))
+            self.leader_axes.tick_params(axis='x', labelrotation=45, labelsize=9)
+            for label in self.leader_axes.get_xticklabels():
+                label.set_ha('right')
+            self._style_axes(self.leader_axes, 'Season Kills Leaders', None, 'Kills')
+
+            self.distribution_axes = self.figure.add_subplot(grid[1, 2])
+            self.distribution_bars = self.distribution_axes.bar(
+                bin_edges[:-1], np.zeros(len(bin_edges) - 1), width=np.diff(bin_edges), align='edge',
+                color=COLORS[1], edgecolor=BACKGROUND)
+            self.distribution_axes.set_xlim(bin_edges[0], bin_edges[-1])
+            self._style_axes(self.distribution_axes, 'Kills per Player per Match', 'Kills', 'Player-matches')
+
+    @staticmethod
+    def _style_axes(axes, title: str, xlabel: str | None, ylabel: str) -> None:
+        axes.set_title(title, fontsize=14, color='white', pad=12)
+        if xlabel:
+            axes.set_xlabel(xlabel, color='white', fontsize=10)
+        axes.set_ylabel(ylabel, color='white', fontsize=10)
+        axes.grid(True, linestyle='--', alpha=0.2, color='gray')
+        axes.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f"{x:,.0f}"))
+        if xlabel == 'Match':
+            axes.xaxis.set_major_locator(MaxNLocator(integer=True, min_n_ticks=1))
+
+    def draw(self, team: TeamSeason) -> None:
+        self.title.set_text(f'{team.team_name} Season Dashboard')
+        self.subtitle.set_text(f'{team.matches:,} matches   {team.kills:,} kills   {team.deaths:,} deaths   '
+                               f'KDR {team.kills / max(team.deaths, 1):.2f}')
+
+        match_numbers = np.arange(1, len(team.match_kills) + 1)
+        self.kills_line.set_data(match_numbers, team.match_kills)
+        self.deaths_line.set_data(match_numbers, team.match_deaths)
+        self._rescale(self.team_axes, len(match_numbers))
+
+        for bar, rate in zip(self.map_bars, team.map_kill_win_rates):
+            bar.set_height(0 if np.isnan(rate) else rate)
+
+        for position, line in enumerate(self.trend_lines):
+            has_player = position < len(team.trend_names)
+            line.set_data(match_numbers, team.trend_kills[position])
+            line.set_visible(has_player)
+            self.trend_legend.get_texts()[position].set_text(team.trend_names[position] if has_player else '')
+        self._rescale(self.trend_axes, len(match_numbers))
+
+        heights = np.zeros(LEADERBOARD_PLAYERS)
+        heights[:len(team.leader_kills)] = team.leader_kills
+        self.leader_names[:] = team.leader_names + [''] * (LEADERBOARD_PLAYERS - len(team.leader_names))
+        for bar, height in zip(self.leader_bars, heights):
+            bar.set_height(height)
+        self.leader_axes.set_ylim(0, max(heights.max(), 1) * 1.1)
+
+        for bar, count in zip(self.distribution_bars, team.kill_distribution):
+            bar.set_height(count)
+        self.distribution_axes.set_ylim(0, max(team.kill_distribution.max(initial=0), 1) * 1.1)
+
+    @staticmethod
+    def _rescale(axes, matches: int) -> None:
+        axes.relim(visible_only=True)
+        axes.autoscale_view(scalex=False)
+        axes.set_xlim(0.5, max(matches, 1) + 0.5)
+        axes.set_ylim(bottom=0)
+
+    def save(self, output_file: str, dpi: int, file_format: str) -> str:
+        # Light PNG compression: about a third faster to save for files about a tenth larger
+        options = {'pil_kwargs': {'compress_level': 3}} if file_format == 'png' else {}
+        self.figure.savefig(output_file, dpi=dpi, format=file_format, facecolor=BACKGROUND, edgecolor='none', **options)
+        return output_file
+
+def dashboard_file_name(team: TeamSeason, file_format: str) -> str:
+    """The TeamID keeps teams whose names sanitize alike from overwriting each other."""
+    return f"season_dashboard_{sanitize_filename(team.team_name)}_{team.team_id}.{file_format}"
+
+def render_teams(maps: list[str], bin_edges: np.ndarray, teams: list[TeamSeason], directory: str,
+                 dpi: int, file_format: str, reuse_template: bool = True) -> list[str]:
+    """Draw and save each team's dashboard, building the template once unless reuse_template is False."""
+    template = None
+    output_files = []
+    for team in teams:
+        if template is None or not reuse_template:
+            template = DashboardTemplate(maps, bin_edges)
+        template.draw(team)
+        output_file = os.path.join(directory, dashboard_file_name(team, file_format))
+        output_files.append(template.save(output_file, dpi, file_format))
+    return output_files
+
+def render_dashboards(conn: sqlite3.Connection, directory: str, team_names: list[str] | None = None,
+                      preset: str = DEFAULT_PRESET, workers: int = 1, reuse_template: bool = True) -> list[str]:
+    """Render one season dashboard per team into directory and return the file paths.
+
+    With several workers the teams are split into one chunk per worker process, and
+    each worker builds its own template. reuse_template False builds a fresh figure
+    for every team, which is only useful to measure what the template saves.
+    """
+    settings = RENDER_PRESETS[preset]
+    season = load_season(conn, team_names)
+    os.makedirs(directory, exist_ok=True)
+    if workers <= 1 or len(season.teams) <= 1:
+        return render_teams(season.maps, season.bin_edges, season.teams, directory,
+                            settings['dpi'], settings['format'], reuse_template)
+
+    chunks = [season.teams[index::workers] for index in range(workers) if season.teams[index::workers]]
+    # Templates draw on an Agg canvas directly, so workers need no pyplot backend
+    with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(render_teams, season.maps, season.bin_edges, chunk, directory,
+                                   settings['dpi'], settings['format'], reuse_template) for chunk in chunks]
+        rendered = {team.team_id: output_file for chunk, future in zip(chunks, futures)
+                    for team, output_file in zip(chunk, future.result())}
+    # Same order as the single process path
+    return [rendered[team.team_id] for team in season.teams]
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator
+import db_operations
+import instrumentation
+from batch_ingest import EXIT_OK, EXIT_FILE_ERRORS, EXIT_USAGE_ERROR
+from stream_parser import NDJSON_EXTENSION
+from match_output import match_timestamp, match_files
+
+REBUILD_SUFFIX = '.rebuild'
+BACKUP_SUFFIX = '.bak'
+# write_match_json puts the match details and the stored analysis after the players, so the date is near the end of the file
+TAIL_BYTES = 16384
+TAIL_MATCH_DATE = re.compile(r'\n {4}"Match Date": ("(?:[^"\\]|\\.)*")')
+
+def read_match_date(file_path: str) -> str:
+    """The Match Date of a parsed JSON or NDJSON file without decoding the players."""
+    if file_path.endswith(NDJSON_EXTENSION):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.loads(f.readline())['Match Date']
+
+    with open(file_path, 'rb') as f:
+        f.seek(max(0, os.path.getsize(file_path) - TAIL_BYTES))
+        found = TAIL_MATCH_DATE.search(f.read().decode('utf-8', errors='ignore'))
+    if found:
+        return json.loads(found.group(1))
+    return db_operations.load_json_file(file_path)['Match Date']
+
+def prepare_json_file(file_path: str) -> tuple:
+    """Decode one parsed JSON into prepare_match tuples. Runs inside a worker process."""
+    return db_operations.prepare_match(os.path.basename(file_path), db_operations.load_json_file(file_path))
+
+def remove_database_files(db_file: str) -> None:
+    for path in [db_file, db_file + '-wal', db_file + '-shm']:
+        if os.path.exists(path):
+            os.remove(path)
+
+def run_rebuild(json_directory: str | None = None, db_file: str | None = None, workers: int | None = None,
+                chunk_size: int = 250) -> int:
+    """Rebuild the database from every parsed JSON and NDJSON file in json_directory.
+
+    Files are loaded in Match Date order, so name and team histories and the current name
+    and team come out as if the season had been ingested match by match. Worker processes
+    decode the JSONs and flatten them into prepare_match tuples; this process is the only
+    writer and bulk loads chunk_size matches per transaction. The new database is built
+    next to the old one and swapped in when complete; the old one is kept as .bak.
+    """
+    json_directory = json_directory or db_operations.parsed_csvs_folder
+    db_file = os.path.abspath(db_file or db_operations.db_path)
+    if not os.path.isdir(json_directory):
+        print(f"Error: {json_directory} is not a directory")
+        return EXIT_USAGE_ERROR
+
+    file_names = match_files(json_directory, ('.json', NDJSON_EXTENSION))
+    dated: list[tuple[str, str]] = []
+    failures: dict[str, str] = {}
+    with instrumentation.span('read_match_dates'):
+        for file_name in file_names:
+            try:
+                # Dates that cannot be read sort last
+                timestamp = match_timestamp(read_match_date(os.path.join(json_directory, file_name)))
+                dated.append((timestamp or '9999', file_name))
+            except (OSError, ValueError, KeyError) as e:
+                failures[file_name] = f"{type(e).__name__} - {e}"
+    ordered = [file_name for _, file_name in sorted(dated)]
+
+    rebuild_file = db_file + REBUILD_SUFFIX
+    remove_database_files(rebuild_file)
+    conn = db_operations.connect(rebuild_file)
+    # The file is thrown away if the rebuild fails, so there is nothing for fsync to protect
+    conn.execute('PRAGMA synchronous = OFF')
+    db_operations.create_tables(conn)
+    loaded = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Runs of JSON files between NDJSON files are prepared in chunks, a few chunks ahead of the writer
+            pending: deque[tuple[list[str], list[Future]]] = deque()
+            ahead = 2 * (workers or os.cpu_count() or 1)
+            chunks = _chunks(ordered, chunk_size)
+
+            while True:
+                while len(pending) < ahead:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    if chunk[0].endswith(NDJSON_EXTENSION):
+                        pending.append((chunk, []))
+                    else:
+                        pending.append((chunk, [executor.submit(instrumentation.call_recorded, instrumentation.is_enabled(),
+                                                                prepare_json_file, os.path.join(json_directory, file_name))
+                                                for file_name in chunk]))
+                if not pending:
+                    break
+
+                chunk, futures = pending.popleft()
+                if not futures:
+                    # Streamed matches can be larger than memory, so they are loaded record by record
+                    file_name = chunk[0]
+                    try:
+                        if db_operations.process_ndjson_file(conn, os.path.join(json_directory, file_name)) is not None:
+                            loaded += 1
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        failures[file_name] = f"{type(e).__name__} - {e}"
+                    continue
+
+                prepared_matches = []
+                for file_name, future in zip(chunk, futures):
+                    try:
+                        prepared_matches.append(instrumentation.unwrap_recorded(future.result()))
+                    except Exception as e:
+                        failures[file_name] = f"{type(e).__name__} - {e}"
+                loaded += db_operations.bulk_load_matches(conn, prepared_matches)
+                print(f"Loaded {loaded} of {len(ordered)} matches")
+    except BaseException:
+        conn.close()
+        remove_database_files(rebuild_file)
+        raise
+    conn.close()
+
+    if os.path.exists(db_file):
+        # Fold the old database's WAL into its file so the backup is complete on its own
+        old_conn = db_operations.connect(db_file)
+        old_conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        old_conn.close()
+        remove_database_files(db_file + BACKUP_SUFFIX)
+        os.replace(db_file, db_file + BACKUP_SUFFIX)
+    remove_database_files(db_file)
+    os.replace(rebuild_file, db_file)
+
+    # Cached models are keyed on the ingest generation, which starts again in the new database
+    from group_classifier import cache_path_for as group_cache_path
+    from kill_graph import cache_path_for as kill_graph_cache_path
+    for cache_file in [group_cache_path(db_file), kill_graph_cache_path(db_file)]:
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+    for file_name in sorted(failures):
+        print(f"  {file_name}: FAILED - {failures[file_name]}")
+    skipped = len(ordered) - loaded - sum(1 for file_name in ordered if file_name in failures)
+    print(f"\nRebuilt {db_file} from {loaded} match(es), {skipped} skipped as duplicates, {len(failures)} failed.")
+    return EXIT_FILE_ERRORS if failures else EXIT_OK
+
+def _chunks(ordered: list[str], chunk_size: int) -> Iterator[list[str]]:
+    """Consecutive JSON files in chunks of up to chunk_size; every NDJSON file is a chunk of its own."""
+    chunk: list[str] = []
+    for file_name in ordered:
+        if file_name.endswith(NDJSON_EXTENSION):
+            if chunk:
+                yield chunk
+                chunk = []
+            yield [file_name]
+            continue
+        chunk.append(file_name)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
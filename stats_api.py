@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, unquote, urlsplit
+import db_operations
+from match_results import MatchResults
+from reports import STATEMENT_CACHE_SIZE, ReportError, map_table, resolve_player, team_roster
+
+DEFAULT_PORT = 8080
+CACHE_ENTRIES = 1024
+GENERATION_CHECK_SECONDS = 1.0
+# sqlite3.OperationalError messages of a database another connection holds; answered with 503
+BUSY_ERRORS = ('database is locked', 'database is busy', 'database table is locked')
+# PlayerData.to_dict places the points before Side and Group and the streak metrics after
+STREAK_NAMES = [name for name in db_operations.METRIC_NAMES if name not in db_operations.POINT_NAMES]
+
+class NotFound(Exception):
+    pass
+
+class ResponseCache:
+    """LRU cache of encoded responses that empties itself when the ingest generation moves on."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.generation: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, generation: int) -> tuple[str, bytes] | None:
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.generation = generation
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, generation: int, entry: tuple[str, bytes]) -> None:
+        with self._lock:
+            # A response built from an older generation is not worth keeping
+            if generation != self.generation or self.max_entries <= 0:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def _query(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def list_matches(conn: sqlite3.Connection, limit: int = 50) -> dict[str, Any]:
+    """The most recently loaded matches."""
+    return {'Matches': _query(conn, '''
+        SELECT ResultID, FileName, MapName, MatchDate, ParseDate
+        FROM ParsedResults
+        ORDER BY ResultID DESC
+        LIMIT ?
+    ''', (limit,))}
+
+def resolve_match(conn: sqlite3.Connection, match: str) -> int:
+    """ResultID for a ResultID or JSON file name."""
+    row = None
+    if match.isdigit():
+        row = conn.execute('SELECT ResultID FROM ParsedResults WHERE ResultID = ?', (int(match),)).fetchone()
+    if row is None:
+        row = conn.execute('SELECT ResultID FROM ParsedResults WHERE FileName = ?', (match,)).fetchone()
+    if row is None:
+        raise NotFound(f"No match with ID or file name '{match}'")
+    return row[0]
+
+def match_summary(conn: sqlite3.Connection, match: str) -> dict[str, Any]:
+    """A loaded match rebuilt from the database in the MatchResults.to_dict shape.
+
+    Side and group likelihoods are not stored, so players have no sideLikelihood or
+    groupLikelihood. Nemesis maps are rebuilt from the kill edges, so killers appear under
+    their name in this match. Matches loaded before points were stored, whose JSON file
+    is gone, report 0 points.
+    """
+    result_id = resolve_match(conn, match)
+    file_name, map_name, match_date = conn.execute(
+        'SELECT FileName, MapName, MatchDate FROM ParsedResults WHERE ResultID = ?', (result_id,)).fetchone()
+    team_names = dict(conn.execute('''
+        SELECT DISTINCT mp.Side, t.TeamName
+        FROM MatchPerformance mp
+        JOIN Teams t ON t.TeamID = mp.TeamID
+        WHERE mp.ResultID = ?
+    ''', (result_id,)).fetchall())
+
+    weapons: dict[tuple[str, str], dict[str, int]] = {}
+    for column, table, values in [('Weapons', 'WeaponKills', 'Kills'), ('DeathByWeapons', 'WeaponDeaths', 'Deaths')]:
+        for player_id, weapon, count in conn.execute(f'''
+            SELECT x.PlayerID, w.WeaponName, x.{values}
+            FROM {table} x
+            JOIN Weapons w ON w.WeaponID = x.WeaponID
+            WHERE x.ResultID = ?
+        ''', (result_id,)):
+            weapons.setdefault((player_id, column), {})[weapon] = count
+
+    opponents: dict[tuple[str, str], dict[str, int]] = {}
+    for killer_id, victim_id, killer_name, victim_name, kills in conn.execute('''
+        SELECT KillerID, VictimID, KillerName, VictimName, Kills
+        FROM PlayerKillEdges
+        WHERE ResultID = ?
+    ''', (result_id,)):
+        if killer_id is not None:
+            opponents.setdefault((killer_id, 'Victim'), {})[victim_name] = kills
+        if victim_id is not None:
+            opponents.setdefault((victim_id, 'Nemesis'), {})[killer_name] = kills
+
+    match_results = MatchResults(team_names.get('Axis'), team_names.get('Allies'), map_name, match_date)
+    for row in _query(conn, f'''
+        SELECT PlayerID, PlayerName AS Name, Kills, Deaths, CombatEffectiveness, Side, PlayerGroup AS "Group", GroupSource,
+               {', '.join(db_operations.METRIC_NAMES)}
+        FROM MatchPerformance
+        WHERE ResultID = ?
+        ORDER BY MatchPerformanceID
+    ''', (result_id,)):
+        player_id = row['PlayerID']
+        player = {
+            'PlayerID': player_id,
+            'Name': row['Name'],
+            'Kills': row['Kills'],
+            'Deaths': row['Deaths'],
+            'KDR': MatchResults.calculate_kdr(row['Kills'], row['Deaths']),
+            'CombatEffectiveness': row['CombatEffectiveness'],
+            'OffensivePoints': row['OffensivePoints'] or 0,
+            'DefensivePoints': row['DefensivePoints'] or 0,
+            'SupportPoints': row['SupportPoints'] or 0,
+            'Weapons': weapons.get((player_id, 'Weapons'), {}),
+            'DeathByWeapons': weapons.get((player_id, 'DeathByWeapons'), {}),
+            'MachineGunKills': row['MachineGunKills'] or 0,
+            'Side': row['Side'],
+            'Group': row['Group'],
+            'GroupSource': row['GroupSource'],
+            **{name: row[name] for name in STREAK_NAMES},
+            'Nemesis': opponents.get((player_id, 'Nemesis'), {}),
+            'Victim': opponents.get((player_id, 'Victim'), {}),
+        }
+        match_results.add_player_dict(player)
+    match_results.calculate_kdrs()
+    return {'ResultID': result_id, 'FileName': file_name, **match_results.to_dict()}
+
+def player_history(conn: sqlite3.Connection, player: str, limit: int = 50) -> dict[str, Any]:
+    """Career totals, team history and the most recent matches of one player."""
+    player_id = resolve_player(conn, player)
+    return {
+        'Player': _query(conn, '''
+            SELECT p.PlayerID, COALESCE(cn.PlayerName, p.PlayerName) AS CurrentName, pa.Matches, pa.Kills, pa.Deaths,
+                   pa.CombatEffectiveness,
+                   CAST(pa.Kills AS REAL) / pa.Matches AS AverageKills,
+                   CAST(pa.Deaths AS REAL) / pa.Matches AS AverageDeaths,
+                   CAST(pa.CombatEffectiveness AS REAL) / pa.Matches AS AverageCombatEffectiveness
+            FROM Players p
+            LEFT JOIN PlayerAggregates pa ON pa.PlayerID = p.PlayerID
+            LEFT JOIN PlayerCurrentName cn ON cn.PlayerID = p.PlayerID
+            WHERE p.PlayerID = ?
+        ''', (player_id,)),
+        'Teams': _query(conn, '''
+            SELECT t.TeamName, pta.FirstSeen, pta.LastSeen, pta.MatchesPlayed
+            FROM PlayerTeamAffiliations pta
+            JOIN Teams t ON t.TeamID = pta.TeamID
+            WHERE pta.PlayerID = ?
+            ORDER BY pta.LastSeen DESC
+        ''', (player_id,)),
+        'Matches': _query(conn, '''
+            SELECT pr.ResultID, pr.FileName, pr.MapName, pr.MatchDate, mp.MatchTimestamp, t.TeamName, mp.Side, mp.PlayerGroup,
+                   mp.PlayerName, mp.Kills, mp.Deaths, mp.CombatEffectiveness, mp.MaxKillStreak, mp.KillsPerMinute
+            FROM MatchPerformance mp
+            JOIN ParsedResults pr ON pr.ResultID = mp.ResultID
+            LEFT JOIN Teams t ON t.TeamID = mp.TeamID
+            WHERE mp.PlayerID = ?
+            ORDER BY mp.MatchTimestamp DESC, mp.ResultID DESC
+            LIMIT ?
+        ''', (player_id, limit)),
+    }
+
+def map_stats(conn: sqlite3.Connection, team: str | None = None) -> dict[str, Any]:
+    """Per map and side totals, plus the per team records of the maps report."""
+    return {
+        'Maps': _query(conn, '''
+            SELECT MapName, Side, Matches, PlayerAppearances, Kills, Deaths, CombatEffectiveness,
+                   ROUND(AverageKills, 1) AS AverageKills, ROUND(AverageDeaths, 1) AS AverageDeaths
+            FROM MapSummary
+            ORDER BY MapName, Side
+        '''),
+        'Teams': map_table(conn, team)['Maps'],
+    }
+
+class StatsApi:
+    """Read-only JSON API over the match database.
+
+    Queries run on a fixed pool of threads, each with its own read-only WAL connection,
+    so concurrent requests never queue behind one connection and never open more than
+    `workers` connections. Encoded responses are kept in an LRU cache for as long as the
+    ingest generation is unchanged; the generation is read at most once per
+    `generation_check_seconds`.
+    """
+
+    def __init__(self, db_file: str | None = None, workers: int = 4, cache_entries: int = CACHE_ENTRIES,
+                 generation_check_seconds: float = GENERATION_CHECK_SECONDS) -> None:
+        self.db_file = os.path.abspath(db_file or db_operations.db_path)
+        if not os.path.exists(self.db_file):
+            raise ReportError(f"Database {self.db_file} does not exist")
+        # Readers cannot create tables, so bring the schema up to date once with a writable connection
+        conn = db_operations.connect(self.db_file)
+        try:
+            db_operations.create_tables(conn)
+        finally:
+            conn.close()
+
+        self.cache = ResponseCache(cache_entries)
+        self.generation_check_seconds = generation_check_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stats-api-db')
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        self._generation_checked = 0.0
+        self._generation_lock = threading.Lock()
+        self.routes: dict[str, Callable[..., dict[str, Any]]] = {
+            'matches': lambda conn, key, params: match_summary(conn, key) if key else
+                list_matches(conn, _int_param(params, 'limit', 50)),
+            'players': lambda conn, key, params: player_history(conn, _required(key, 'player'),
+                                                                _int_param(params, 'limit', 50)),
+            'teams': lambda conn, key, params: team_roster(conn, _required(key, 'team')),
+            'maps': lambda conn, key, params: map_stats(conn, params.get('team', [None])[0]),
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Only this thread queries it; close() closes it from another thread
+            conn = db_operations.connect(self.db_file, read_only=True, cached_statements=STATEMENT_CACHE_SIZE,
+                                         check_same_thread=False)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run function(conn, *args) on the reader pool and wait for the result."""
+        return self._executor.submit(lambda: function(self._connection(), *args)).result()
+
+    def generation(self) -> int:
+        with self._generation_lock:
+            now = time.monotonic()
+            if now - self._generation_checked >= self.generation_check_seconds:
+                self._generation = self._read(db_operations.get_ingest_generation)
+                self._generation_checked = now
+            return self._generation
+
+    def respond(self, path: str) -> tuple[int, str, bytes]:
+        """(status, ETag, body) for a GET of path, served from the cache when possible.
+
+        Database errors become a JSON 503 when the database is busy and a 500 otherwise,
+        so the client always gets a response.
+        """
+        try:
+            return self._respond(path)
+        except sqlite3.OperationalError as e:
+            if any(reason in str(e) for reason in BUSY_ERRORS):
+                return 503, '', _encode({'error': f"Database busy: {e}"})
+            return 500, '', _encode({'error': f"Database error: {e}"})
+        except sqlite3.Error as e:
+            return 500, '', _encode({'error': f"Database error: {e}"})
+
+    def _respond(self, path: str) -> tuple[int, str, bytes]:
+        generation = self.generation()
+        cached = self.cache.get(path, generation)
+        if cached is not None:
+            return 200, *cached
+
+        url = urlsplit(path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        route = self.routes.get(parts[0])
+        if route is None or len(parts) > 2:
+            return 404, '', _encode({'error': f"Unknown path {url.path}"})
+        try:
+            result = self._read(route, parts[1] if len(parts) == 2 else None, parse_qs(url.query))
+        except (NotFound, ReportError) as e:
+            return 404, '', _encode({'error': str(e)})
+        except ValueError as e:
+            return 400, '', _encode({'error': str(e)})
+
+        body = _encode(result)
+        etag = f'"{generation}-{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.cache.put(path, generation, (etag, body))
+        return 200, etag, body
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+def _encode(data: dict[str, Any]) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _required(value: str | None, name: str) -> str:
+    if not value:
+        raise ValueError(f"A {name} is required")
+    return value
+
+def _int_param(params: dict[str, list[str]], name: str, default: int) -> int:
+    try:
+        return int(params.get(name, [default])[0])
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    api: StatsApi
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; on a keep-alive connection Nagle would hold the
+    # body back until the client's delayed ACK, about 40 ms per response
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        status, etag, body = self.api.respond(self.path)
+        if status == 200 and etag and etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            # Clients may keep the response but must check the ETag, which changes with every ingest
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+def make_server(api: StatsApi, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type('BoundStatsRequestHandler', (StatsRequestHandler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def run_server(db_file: str | None = None, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+               workers: int = 4, cache_entries: int = CACHE_ENTRIES) -> int:
+    try:
+        api = StatsApi(db_file, workers=workers, cache_entries=cache_entries)
+    except ReportError as e:
+        print(f"Error: {e}")
+        return 1
+    server = make_server(api, host, port)
+    print(f"Serving match stats on http://{host}:{server.server_address[1]}/ "
+          "(/matches, /matches/<id>, /players/<player>, /teams/<team>, /maps)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStats API stopped.")
+    finally:
+        server.server_close()
+        api.close()
+    return 0
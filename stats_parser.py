@@ -1,65 +1,140 @@
 import csv
 from typing import Any
+import instrumentation
 from player_data import PlayerData
 from match_results import MatchResults
 
 class StatsParser:
     @staticmethod
-    def parse_stats_file(file_name: str) -> dict[str, Any]:
+    @instrumentation.timed('parse_stats_file')
+    def parse_stats_file(file_name: str, axis_team_name: str | None = None, allies_team_name: str | None = None,
+                         map_name: str | None = None, match_date: str | None = None,
+                         armor_player_overrides: set[str] | None = None, interactive: bool = True,
+                         classifier: Any = None) -> dict[str, Any]:
+        """Parse a CRCON CSV export.
+
+        Any match detail left as None is prompted for when interactive is True. With interactive
+        set to False nothing is read from stdin: missing details raise ValueError and potential
+        armor players are kept as classified. A GroupClassifier replaces the armor check: every
+        player's group comes from the model and only low-confidence players are reviewed.
+        """
         print(f"Parsing file: {file_name}")
 
-        axis_team_name: str = input('Axis Team Name: ')
-        allies_team_name: str = input('Allies Team Name: ')
-        map_name: str = input('Map Name: ')
-        match_date: str = input('Match Date: ')
+        axis_team_name = StatsParser._resolve_match_detail(axis_team_name, 'Axis Team Name', interactive)
+        allies_team_name = StatsParser._resolve_match_detail(allies_team_name, 'Allies Team Name', interactive)
+        map_name = StatsParser._resolve_match_detail(map_name, 'Map Name', interactive)
+        match_date = StatsParser._resolve_match_detail(match_date, 'Match Date', interactive)
 
-        armor_player_overrides: set[str] = StatsParser._get_armor_overrides()
+        if armor_player_overrides is None:
+            armor_player_overrides = StatsParser._get_armor_overrides() if interactive else set()
 
         match_results = MatchResults(axis_team_name, allies_team_name, map_name, match_date)
         unknown_weapons = set()
+        players: list[dict[str, Any]] = []
 
         with open(file_name, encoding="utf8") as f:
             csv_reader = csv.reader(f)
             headers: list[str] = next(csv_reader)  # Read the header row
-            
-            # Create a dictionary to map column names to indices
-            column_indices: dict[str, int] = {column: index for index, column in enumerate(headers)}
-
-            # Determine which ID column is present
-            id_column = StatsParser._determine_id_column(column_indices)
-
-            # Check if required columns are present
-            required_columns: list[str] = [id_column, 'Name', 'Kills', 'Deaths', 'Combat Effectiveness', 
-                                'Offensive Points', 'Defensive Points', 'Support Points', 'Weapons', 'Death by Weapons']
-            for column in required_columns:
-                if column not in column_indices:
-                    print(f"Error: '{column}' column not found in the CSV file.")
-                    print("Available columns are:", headers)
-                    raise KeyError(f"'{column}' column missing")
+            column_indices: dict[str, int] = StatsParser._map_columns(headers)
 
             for row in csv_reader:
-                try:
-                    player = PlayerData(row, column_indices)
-                    new_unknown_weapons: set[str] = player.process_weapons()
-                    unknown_weapons.update(new_unknown_weapons)
-                    player.determine_side_and_group()
-
-                    if player.player_id in armor_player_overrides:
-                        player.group = 'Armor'
-                        print(f"Setting {player.name} to Armor because of override.")
+                player = StatsParser.classify_row(row, column_indices, armor_player_overrides, interactive, unknown_weapons,
+                                                  check_armor=classifier is None)
+                players.append(player.to_dict())
+        instrumentation.count('csv_rows', len(players))
 
-                    if player.group == 'Infantry' and player.combat_effectiveness > 300 and player.group_likelihood['Infantry'] < 15:
-                        StatsParser._prompt_for_armor_classification(player)
-
-                    match_results.add_player(player)
-                except Exception as e:
-                    print(f"Error processing row: {type(e).__name__} - {e}")
-                    print("Row data:", row)
-                    raise
+        if classifier is not None:
+            with instrumentation.span('apply_group_classifier'):
+                StatsParser.apply_group_classifier(players, classifier, armor_player_overrides, interactive)
+        for player_dict in players:
+            match_results.add_player_dict(player_dict)
 
         match_results.calculate_kdrs()
         return match_results.to_dict()
 
+    @staticmethod
+    def classify_row(row: list[str], column_indices: dict[str, int], armor_player_overrides: set[str],
+                     interactive: bool, unknown_weapons: set[str] | None = None, check_armor: bool = True) -> PlayerData:
+        """Build a PlayerData from one CSV row and assign its side and group.
+
+        check_armor flags Infantry players whose kills and effectiveness look like armor.
+        """
+        try:
+            player = PlayerData(row, column_indices)
+            with instrumentation.span('process_weapons'):
+                new_unknown_weapons: set[str] = player.process_weapons()
+            instrumentation.count('weapon_entries', len(player.weapons) + len(player.death_by_weapons))
+            if unknown_weapons is not None:
+                unknown_weapons.update(new_unknown_weapons)
+            player.determine_side_and_group()
+
+            if player.player_id in armor_player_overrides:
+                player.group = 'Armor'
+                player.group_source = 'override'
+                print(f"Setting {player.name} to Armor because of override.")
+
+            if check_armor and player.group == 'Infantry' and player.combat_effectiveness > 300 and player.group_likelihood['Infantry'] < 15:
+                if interactive:
+                    StatsParser._prompt_for_armor_classification(player)
+                else:
+                    print(f"Potential armor player {player.name} ({player.player_id}) kept as Infantry; add an armor override to change this.")
+
+            return player
+        except Exception as e:
+            print(f"Error processing row: {type(e).__name__} - {e}")
+            print("Row data:", row)
+            raise
+
+    @staticmethod
+    def apply_group_classifier(players: list[dict[str, Any]], classifier: Any, armor_player_overrides: set[str],
+                               interactive: bool) -> None:
+        """Set the Group of a match's players from one batched GroupClassifier pass.
+
+        Spectators and armor overrides are left alone. Below the classifier's review confidence
+        the player is asked about when interactive, and otherwise keeps the heuristic group and
+        is listed for review.
+        """
+        for player, prediction in zip(players, classifier.classify(players)):
+            if player['Side'] == 'Spectators' or player['PlayerID'] in armor_player_overrides:
+                continue
+            if prediction.confidence >= classifier.review_confidence:
+                player['Group'] = prediction.group
+                player['GroupSource'] = 'classifier'
+            elif interactive:
+                player['Group'] = StatsParser._prompt_for_group_review(player, prediction)
+                player['GroupSource'] = 'reviewed'
+            else:
+                print(f"Review {player['Name']} ({player['PlayerID']}): classifier says {prediction.group} "
+                      f"at {prediction.confidence:.0%}, kept as {player['Group']}; add an armor override to change this.")
+
+    @staticmethod
+    def _resolve_match_detail(value: str | None, prompt: str, interactive: bool) -> str:
+        if value is not None:
+            return value
+        if not interactive:
+            raise ValueError(f"'{prompt}' must be provided when parsing non-interactively")
+        with instrumentation.span('wait_for_input'):
+            return input(f'{prompt}: ')
+
+    @staticmethod
+    def _map_columns(headers: list[str]) -> dict[str, int]:
+        """Map column names to indices and check that every required column is present."""
+        column_indices: dict[str, int] = {column: index for index, column in enumerate(headers)}
+
+        # Determine which ID column is present
+        id_column = StatsParser._determine_id_column(column_indices)
+
+        # Check if required columns are present
+        required_columns: list[str] = [id_column, 'Name', 'Kills', 'Deaths', 'Combat Effectiveness', 
+                            'Offensive Points', 'Defensive Points', 'Support Points', 'Weapons', 'Death by Weapons']
+        for column in required_columns:
+            if column not in column_indices:
+                print(f"Error: '{column}' column not found in the CSV file.")
+                print("Available columns are:", headers)
+                raise KeyError(f"'{column}' column missing")
+
+        return column_indices
+
     @staticmethod
     def _determine_id_column(column_indices: dict[str, int]) -> str:
         if 'Steam ID' in column_indices:
@@ -70,6 +145,7 @@ class StatsParser:
             raise ValueError("Neither 'Steam ID' nor 'Player ID' found in CSV headers")
 
     @staticmethod
+    @instrumentation.timed('wait_for_input')
     def _get_armor_overrides() -> set[str]:
         armor_player_overrides = set()
         while True:
@@ -80,6 +156,7 @@ class StatsParser:
         return armor_player_overrides
 
     @staticmethod
+    @instrumentation.timed('wait_for_input')
     def _prompt_for_armor_classification(player: PlayerData) -> None:
         print(f"\nPotential armor player detected: {player.name}")
         print(f"Combat Effectiveness: {player.combat_effectiveness}")
@@ -98,4 +175,40 @@ class StatsParser:
             player.group = 'Armor'
             print('OK, setting this player as Armor')
         else:
-            print('Keeping this player as Infantry')
\ No newline at end of file
+            print('Keeping this player as Infantry')
+        player.group_source = 'reviewed'
+
+    @staticmethod
+    @instrumentation.timed('wait_for_input')
+    def _prompt_for_group_review(player: dict[str, Any], prediction: Any) -> str:
+        print(f"\nUncertain group for {player['Name']}")
+        print(f"Combat Effectiveness: {player['CombatEffectiveness']}")
+        print(f"Kills: {player['Kills']}")
+        print(f"Deaths: {player['Deaths']}")
+        print(f"Offensive Points: {player['OffensivePoints']}")
+        print(f"Defensive Points: {player['DefensivePoints']}")
+        print(f"Support Points: {player['SupportPoints']}")
+        print("Top weapons:")
+        for weapon, count in sorted(player['Weapons'].items(), key=lambda x: x[1], reverse=True)[:5]:
+            print(f"  - {weapon}: {count}")
+        print("Classifier: " + ', '.join(f"{group} {probability:.0%}" for group, probability in prediction.probabilities.items()))
+
+        while True:
+            response: str = input(f"Which group is {player['Name']} in? ({'/'.join(prediction.probabilities)}, blank for {prediction.group}): ")
+            if not response:
+                return prediction.group
+            for group in prediction.probabilities:
+                if response.lower() == group.lower():
+                    return group
+            print(f"'{response}' is not a group")
+
+PARSE_ENGINES: list[str] = ['rows', 'columnar']
+
+def get_stats_parser(engine: str = 'rows') -> Any:
+    """Return the parser class for an engine name; 'columnar' needs NumPy and SciPy."""
+    if engine == 'rows':
+        return StatsParser
+    if engine == 'columnar':
+        from columnar_parser import ColumnarStatsParser
+        return ColumnarStatsParser
+    raise ValueError(f"Unknown parse engine '{engine}', expected one of {', '.join(PARSE_ENGINES)}")
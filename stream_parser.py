@@ -0,0 +1,127 @@
+import os
+import csv
+import json
+import hashlib
+from typing import Any, Iterator, TextIO
+from stats_parser import StatsParser
+from match_results import MatchResults
+from match_output import HASH_EXCLUDED_KEYS, generate_descriptive_filename, unique_output_path
+
+NDJSON_EXTENSION = '.ndjson'
+
+def iter_csv_rows(file_name: str) -> Iterator[tuple[list[str], dict[str, int]]]:
+    """Yield (row, column_indices) pairs from a CRCON export, one row at a time.
+
+    Exports concatenated into one file repeat their header row; each repeated header
+    is skipped and its column order is used for the rows that follow it.
+    """
+    with open(file_name, encoding="utf8", newline='') as f:
+        csv_reader = csv.reader(f)
+        column_indices: dict[str, int] = StatsParser._map_columns(next(csv_reader))
+        for row in csv_reader:
+            if not row:
+                continue
+            if 'Name' in row and ('Player ID' in row or 'Steam ID' in row):
+                column_indices = StatsParser._map_columns(row)
+                continue
+            yield row, column_indices
+
+def iter_players(file_name: str, armor_player_overrides: set[str], interactive: bool = False) -> Iterator[dict[str, Any]]:
+    """Yield classified players in the PlayerData.to_dict shape."""
+    for row, column_indices in iter_csv_rows(file_name):
+        yield StatsParser.classify_row(row, column_indices, armor_player_overrides, interactive).to_dict()
+
+class NdjsonMatchWriter:
+    """Writes a match as newline-delimited JSON records while it is being parsed.
+
+    The file holds one 'Match' record with the match details, one 'Player' record per
+    player in CSV order and a closing 'Totals' record with the team aggregates.
+    """
+
+    def __init__(self, output_file: str) -> None:
+        self.output_file = output_file
+        self._file: TextIO | None = None
+
+    def __enter__(self) -> 'NdjsonMatchWriter':
+        self._file = open(self.output_file, 'w', encoding='utf-8')
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write_record(self, record_type: str, record: dict[str, Any]) -> None:
+        self._file.write(json.dumps({'Record': record_type, **record}, ensure_ascii=False))
+        self._file.write('\n')
+
+def read_ndjson_match(file_path: str) -> Iterator[dict[str, Any]]:
+    """Yield the records of an NDJSON match file one line at a time."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def ndjson_payload_hash(file_path: str) -> str:
+    """SHA-256 of an NDJSON match's records, read line by line.
+
+    Each record is hashed in canonical form without its source metadata, so the hash
+    depends only on the match contents. It is not comparable with payload_hash of the
+    equivalent JSON file; duplicates across the two formats are caught by the source hash.
+    """
+    digest = hashlib.sha256()
+    for record in read_ndjson_match(file_path):
+        record = {key: value for key, value in record.items() if key not in HASH_EXCLUDED_KEYS}
+        digest.update(json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def _team_totals(team: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    return {
+        group: {key: value for key, value in stats.items() if key != 'Players'}
+        for group, stats in team.items() if group != 'Team Name'
+    }
+
+def stream_stats_file(file_name: str, output_folder: str, axis_team_name: str, allies_team_name: str,
+                      map_name: str, match_date: str, armor_player_overrides: set[str] | None = None,
+                      source_hash: str | None = None) -> str:
+    """Parse a CRCON export straight into an NDJSON file and return its path.
+
+    Players are written as soon as they are classified and only the team totals are
+    kept, so memory use does not grow with the number of rows.
+    """
+    print(f"Streaming file: {file_name}")
+    totals = MatchResults(axis_team_name, allies_team_name, map_name, match_date, keep_players=False)
+    descriptive_filename = generate_descriptive_filename(totals.to_dict(), extension=NDJSON_EXTENSION)
+    output_file = unique_output_path(output_folder, descriptive_filename)
+
+    match_record: dict[str, Any] = {
+        'Map': map_name,
+        'Match Date': match_date,
+        'Axis Team Name': axis_team_name,
+        'Allies Team Name': allies_team_name
+    }
+    if source_hash is not None:
+        match_record['Source Hash'] = source_hash
+
+    try:
+        with NdjsonMatchWriter(output_file) as writer:
+            writer.write_record('Match', match_record)
+            for player in iter_players(file_name, armor_player_overrides or set()):
+                totals.add_player_dict(player)
+                writer.write_record('Player', player)
+
+            totals.calculate_kdrs()
+            results = totals.to_dict()
+            writer.write_record('Totals', {
+                'Axis': _team_totals(results['Axis']),
+                'Allies': _team_totals(results['Allies']),
+                'SpectatorCount': totals.spectator_count
+            })
+    except Exception:
+        # Never leave a truncated match behind for the database loader to pick up
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+
+    return output_file
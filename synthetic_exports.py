@@ -0,0 +1,178 @@
+"""Seeded synthetic CRCON exports for benchmarks and scale tests.
+
+Every generated match is internally consistent: each kill is drawn once as a
+(killer, victim, weapon) event, so Kills, Deaths, Weapons, Death by Weapons,
+Nemesis and Victim all add up the way they do in a real export.
+"""
+import os
+import csv
+import json
+import numpy as np
+from typing import Any
+from weapon_data import WeaponData
+from batch_ingest import MANIFEST_FILENAME
+
+CRCON_HEADERS: list[str] = [
+    'Player ID', 'Name', 'Kills', 'Deaths', 'K/D', 'Max kill streak', 'Kill(s) / minute', 'Death(s) / minute',
+    'Max death streak', 'Max TK streak', 'Death by TK', 'Death by TK Streak', '(aprox.) Longest life min.',
+    '(aprox.) Shortest life secs.', 'Nemesis', 'Victim', 'Combat Effectiveness', 'Support Points',
+    'Defensive Points', 'Offensive Points', 'Weapons', 'Death by Weapons'
+]
+MAPS: list[str] = ['Carentan', 'Foy', 'Hurtgen Forest', 'Kursk', 'SMDM', 'SME', 'Utah Beach', 'Omaha Beach',
+                   'Stalingrad', 'Purple Heart Lane', 'Hill 400', 'El Alamein']
+ALLIED_FACTIONS: list[str] = ['US', 'GB', 'RUS']
+GROUPS: list[str] = ['Infantry', 'Artillery', 'Armor']
+NAME_PARTS: list[str] = ['Grekker', 'hippie', 'Slug', 'Ketchup', 'Pavlos', 'Majk', 'Yoss', 'Golem', 'Bille',
+                         'Štěpán', 'Řízek', 'Kelly', 'Lucifer', 'Ronnar', 'Bratr', 'Forge', 'Kaidou', 'Moe',
+                         'Tsavok', 'Dimo', 'Bimpus', 'Spamdini', 'Athens', 'Grizzly', 'Vulture', 'Mayo']
+TEAM_TAGS: list[str] = ['-TL-', 'VLK', 'GBI', 'HTD', 'W3', 'WTH', 'CU', 'ESPT', 'Helios', 'Syndicate', 'VNGD',
+                        'Taurus', 'Omen', 'Refuze', 'EG', 'JG', 'MS', 'FJ', 'Greyhounds', 'RONIN']
+MATCH_MINUTES = 90
+
+class SyntheticLeague:
+    """Teams with fixed rosters that play seeded matches against each other.
+
+    Rosters are larger than a side so the same players come back match after match,
+    as they do in a real league, and the database sees repeat players and teams.
+    """
+
+    def __init__(self, seed: int = 1, teams: int = 20, roster_size: int = 70, players_per_side: int = 50) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.players_per_side = players_per_side
+        self.team_names = [TEAM_TAGS[index % len(TEAM_TAGS)] + (f" {index // len(TEAM_TAGS) + 1}" if index >= len(TEAM_TAGS) else '')
+                           for index in range(teams)]
+        self.rosters: list[list[tuple[str, str]]] = []
+        for team_index, team_name in enumerate(self.team_names):
+            roster = []
+            for slot in range(roster_size):
+                player_number = team_index * roster_size + slot
+                name = f"{team_name} {NAME_PARTS[player_number % len(NAME_PARTS)]}{player_number}"
+                roster.append((str(76561198000000000 + player_number), name))
+            self.rosters.append(roster)
+        self.skills = [self.rng.lognormal(0.0, 0.5, roster_size) for _ in range(teams)]
+        self.weapons = self._weapon_lists()
+
+    @staticmethod
+    def _weapon_lists() -> dict[tuple[str, str], list[str]]:
+        """Weapon names per (faction, group), most common first."""
+        weapons: dict[tuple[str, str], list[str]] = {}
+        for name, info in WeaponData.WEAPONS.items():
+            weapons.setdefault((info['faction'], info['group']), []).append(name)
+        return weapons
+
+    def match(self, match_index: int) -> tuple[dict[str, Any], list[list[str]]]:
+        """Manifest entry and CSV rows of one match."""
+        rng = self.rng
+        axis_team, allies_team = rng.choice(len(self.team_names), 2, replace=False).tolist()
+        factions = ['GER', ALLIED_FACTIONS[int(rng.integers(len(ALLIED_FACTIONS)))]]
+
+        players: list[tuple[str, str]] = []
+        side_of: list[int] = []
+        group_of: list[int] = []
+        skill: list[float] = []
+        for side, team in enumerate([axis_team, allies_team]):
+            picked = rng.choice(len(self.rosters[team]), self.players_per_side, replace=False).tolist()
+            armor = int(rng.integers(6, 10))
+            artillery = int(rng.integers(0, 4))
+            for position, slot in enumerate(picked):
+                players.append(self.rosters[team][slot])
+                side_of.append(side)
+                group_of.append(2 if position < armor else 1 if position < armor + artillery else 0)
+                skill.append(float(self.skills[team][slot]))
+        side_of_array = np.array(side_of)
+        group_of_array = np.array(group_of)
+
+        # Every kill is one (killer, victim, weapon) event; armor and artillery kill at their own rates
+        weights = np.array(skill) * np.array([1.0, 1.4, 2.2])[group_of_array]
+        total_kills = int(rng.normal(1400, 250))
+        killers = rng.choice(len(players), max(total_kills, 100), p=weights / weights.sum())
+        victims = np.empty_like(killers)
+        for side in (0, 1):
+            chosen = side_of_array[killers] == side
+            opponents = np.flatnonzero(side_of_array != side)
+            victims[chosen] = rng.choice(opponents, int(chosen.sum()))
+        weapon_names, weapon_ids = self._pick_weapons(killers, side_of_array, group_of_array, factions)
+
+        kills = np.bincount(killers, minlength=len(players))
+        deaths = np.bincount(victims, minlength=len(players))
+        victim_maps = self._count_maps(killers, victims, players)
+        nemesis_maps = self._count_maps(victims, killers, players)
+        weapon_maps = self._weapon_maps(killers, weapon_ids, weapon_names, len(players))
+        death_weapon_maps = self._weapon_maps(victims, weapon_ids, weapon_names, len(players))
+
+        rows = []
+        for index, (player_id, name) in enumerate(players):
+            player_kills, player_deaths = int(kills[index]), int(deaths[index])
+            group = group_of[index]
+            combat = int(player_kills * (18 if group == 0 else 9) + rng.integers(20, 300))
+            offensive, defensive, support = (20 * rng.integers(0, [60, 80, 40])).tolist()
+            rows.append([
+                player_id, name, str(player_kills), str(player_deaths), f"{player_kills / max(player_deaths, 1):.2f}",
+                str(int(rng.integers(0, player_kills + 1) // 2 + min(player_kills, 1))),
+                f"{player_kills / MATCH_MINUTES:.2f}", f"{player_deaths / MATCH_MINUTES:.2f}",
+                str(min(player_deaths, int(rng.integers(1, 6)))), '0', str(int(rng.random() < 0.05)), '0',
+                str(int(rng.integers(3, 40))), str(int(rng.integers(5, 120))),
+                nemesis_maps[index], victim_maps[index], str(combat), str(support), str(defensive), str(offensive),
+                weapon_maps[index], death_weapon_maps[index]
+            ])
+
+        entry = {
+            'Axis Team Name': self.team_names[axis_team],
+            'Allies Team Name': self.team_names[allies_team],
+            'Map': MAPS[match_index % len(MAPS)],
+            'Match Date': f"{1 + match_index // 28 % 12}/{1 + match_index % 28}/{2024 + match_index // 336}",
+        }
+        return entry, rows
+
+    def _pick_weapons(self, killers: np.ndarray, side_of: np.ndarray, group_of: np.ndarray,
+                      factions: list[str]) -> tuple[list[str], np.ndarray]:
+        """Weapon per kill from the killer's faction and group, favouring the first weapons of each list."""
+        names: list[str] = []
+        weapon_ids = np.empty(len(killers), dtype=np.int64)
+        for side, faction in enumerate(factions):
+            for group_index, group in enumerate(GROUPS):
+                chosen = np.flatnonzero((side_of[killers] == side) & (group_of[killers] == group_index))
+                choices = self.weapons[(faction, group)]
+                preference = 1.0 / np.arange(1, len(choices) + 1)
+                picks = self.rng.choice(len(choices), len(chosen), p=preference / preference.sum())
+                weapon_ids[chosen] = picks + len(names)
+                names.extend(choices)
+        return names, weapon_ids
+
+    @staticmethod
+    def _count_maps(keys: np.ndarray, others: np.ndarray, players: list[tuple[str, str]]) -> list[str]:
+        """JSON {name: count} per key player, counting the other player of each event."""
+        pairs, counts = np.unique(keys * len(players) + others, return_counts=True)
+        maps: list[dict[str, int]] = [{} for _ in players]
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            maps[pair // len(players)][players[pair % len(players)][1]] = count
+        return [json.dumps(counts_by_name, ensure_ascii=False, separators=(',', ':')) for counts_by_name in maps]
+
+    @staticmethod
+    def _weapon_maps(keys: np.ndarray, weapon_ids: np.ndarray, weapon_names: list[str], size: int) -> list[str]:
+        pairs, counts = np.unique(keys * len(weapon_names) + weapon_ids, return_counts=True)
+        maps: list[dict[str, int]] = [{} for _ in range(size)]
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            maps[pair // len(weapon_names)][weapon_names[pair % len(weapon_names)]] = count
+        return [json.dumps(counts_by_weapon, ensure_ascii=False, separators=(',', ':')) for counts_by_weapon in maps]
+
+def write_export(file_path: str, rows: list[list[str]]) -> None:
+    """Write rows as a CRCON CSV export: every field quoted, UTF-8."""
+    with open(file_path, 'w', encoding='utf8', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(CRCON_HEADERS)
+        writer.writerows(rows)
+
+def generate_exports(directory: str, matches: int, seed: int = 1, teams: int = 20,
+                     players_per_side: int = 50) -> list[str]:
+    """Write matches synthetic exports and their manifest.json into directory; returns the CSV file names."""
+    os.makedirs(directory, exist_ok=True)
+    league = SyntheticLeague(seed, teams, players_per_side=players_per_side)
+    manifest: dict[str, dict[str, Any]] = {}
+    for match_index in range(matches):
+        file_name = f"synthetic_{match_index:05d}.csv"
+        manifest[file_name], rows = league.match(match_index)
+        write_export(os.path.join(directory, file_name), rows)
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return list(manifest)
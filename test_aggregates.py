@@ -0,0 +1,53 @@
+import json
+import pytest
+import db_operations
+
+AGGREGATE_TABLES = ['PlayerAggregates', 'TeamAggregates', 'MapAggregates', 'TeamMapAggregates',
+                    'PlayerWeaponAggregates', 'WeaponAggregates', 'PlayerWeaponGroupAggregates',
+                    'PlayerTeamAffiliations', 'PlayerCurrentTeam', 'PlayerRatings', 'TeamRatings']
+
+def players_with_matches(conn):
+    # Retracting a match leaves the names seen in it, and a zeroed Players row for anyone it was the only match of
+    return conn.execute('''
+        SELECT PlayerID, TotalKills, AverageKills, TotalDeaths, AverageDeaths, TotalMatches,
+               TotalCombatEffectiveness, AverageCombatEffectiveness
+        FROM Players
+        WHERE TotalMatches > 0
+        ORDER BY PlayerID
+    ''').fetchall()
+
+def load(conn, matches):
+    db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in matches])
+
+@pytest.mark.parametrize('position', [0, 7, -1])
+def test_retract_matches_never_loading_the_match(connect_db, bundled_matches, snapshot, position):
+    retracted = connect_db('retracted.db')
+    without = connect_db('without.db')
+    file_name = bundled_matches[position][0]
+    load(retracted, bundled_matches)
+    load(without, [match for match in bundled_matches if match[0] != file_name])
+
+    db_operations.retract_match(retracted, db_operations.get_result_id(retracted, file_name))
+    retracted.commit()
+    assert snapshot(retracted, AGGREGATE_TABLES) == snapshot(without, AGGREGATE_TABLES)
+    assert players_with_matches(retracted) == players_with_matches(without)
+
+def test_reprocess_restores_the_aggregates(conn, bundled_matches, snapshot, tmp_path):
+    load(conn, bundled_matches)
+    before = snapshot(conn, AGGREGATE_TABLES), players_with_matches(conn)
+    file_name, data = bundled_matches[7]
+    json_path = tmp_path / file_name
+    json_path.write_text(json.dumps(data), encoding='utf-8')
+
+    db_operations.reprocess_json_file(conn, str(json_path))
+    conn.commit()
+    assert (snapshot(conn, AGGREGATE_TABLES), players_with_matches(conn)) == before
+
+def test_incremental_aggregates_match_a_rebuild(conn, bundled_matches, snapshot):
+    for file_name, data in bundled_matches:
+        db_operations.process_match_data(conn, file_name, data)
+    conn.commit()
+    incremental = snapshot(conn, AGGREGATE_TABLES), players_with_matches(conn)
+
+    db_operations.rebuild_aggregates(conn)
+    assert (snapshot(conn, AGGREGATE_TABLES), players_with_matches(conn)) == incremental
@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+import batch_ingest
+import db_operations
+
+RAW_CSVS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Raw_csvs')
+
+MANIFEST = {
+    'HeliosVsESPTCarentan.csv': {'Axis Team Name': 'Helios', 'Allies Team Name': 'ESPT', 'Map': 'Carentan',
+                                 'Match Date': '11/10/2024'},
+    'GBIvsSYNPHLNightHCAWeek4.csv': {'Axis Team Name': 'GBI', 'Allies Team Name': 'SYN', 'Map': 'PHL Night',
+                                     'Match Date': '11/24/2024'},
+}
+
+def write_batch(tmp_path):
+    csv_directory = tmp_path / 'csv'
+    csv_directory.mkdir()
+    for file_name in MANIFEST:
+        shutil.copy(os.path.join(RAW_CSVS, file_name), csv_directory / file_name)
+    (csv_directory / batch_ingest.MANIFEST_FILENAME).write_text(json.dumps(MANIFEST), encoding='utf-8')
+    return str(csv_directory)
+
+def run_batch(tmp_path, csv_directory):
+    return batch_ingest.run_batch(csv_directory, output_directory=str(tmp_path / 'out'),
+                                  db_file=str(tmp_path / 'batch.db'), workers=1)
+
+def test_second_run_skips_every_file(tmp_path, capsys):
+    csv_directory = write_batch(tmp_path)
+    assert run_batch(tmp_path, csv_directory) == batch_ingest.EXIT_OK
+    capsys.readouterr()
+
+    assert run_batch(tmp_path, csv_directory) == batch_ingest.EXIT_OK
+    assert '0 of 2 files ingested successfully, 2 skipped as duplicates.' in capsys.readouterr().out
+
+def test_match_loaded_by_another_writer_is_reported_skipped(tmp_path, capsys, monkeypatch):
+    csv_directory = write_batch(tmp_path)
+    bulk_load_matches = db_operations.bulk_load_matches
+
+    def racing_load(conn, prepared_matches):
+        bulk_load_matches(conn, [('other_writer.json',) + prepared_matches[0][1:]])
+        return bulk_load_matches(conn, prepared_matches)
+
+    monkeypatch.setattr(db_operations, 'bulk_load_matches', racing_load)
+    assert run_batch(tmp_path, csv_directory) == batch_ingest.EXIT_OK
+
+    output = capsys.readouterr().out
+    assert 'same match as already loaded other_writer.json' in output
+    assert '1 of 2 files ingested successfully, 1 skipped as duplicates.' in output
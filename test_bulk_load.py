@@ -0,0 +1,26 @@
+import db_operations
+
+def load_row_by_row(conn, matches):
+    for file_name, data in matches:
+        db_operations.process_match_data(conn, file_name, data)
+    conn.commit()
+
+def load_bulk(conn, matches):
+    return db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in matches])
+
+def test_bulk_load_matches_row_by_row_load(connect_db, bundled_matches, snapshot):
+    rows = connect_db('rows.db')
+    bulk = connect_db('bulk.db')
+    load_row_by_row(rows, bundled_matches)
+    load_bulk(bulk, bundled_matches)
+
+    assert snapshot(bulk) == snapshot(rows)
+
+def test_bulk_load_in_batches_matches_one_batch(connect_db, bundled_matches, snapshot):
+    whole = connect_db('whole.db')
+    batched = connect_db('batched.db')
+    load_bulk(whole, bundled_matches)
+    for start in range(0, len(bundled_matches), 4):
+        load_bulk(batched, bundled_matches[start:start + 4])
+
+    assert snapshot(batched) == snapshot(whole)
@@ -0,0 +1,30 @@
+import db_operations
+
+def load_row_by_row(conn, matches):
+    for file_name, data in matches:
+        db_operations.process_match_data(conn, file_name, data)
+    conn.commit()
+
+def load_bulk(conn, matches):
+    return db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in matches])
+
+def test_reloading_matches_changes_nothing(conn, bundled_matches, snapshot):
+    load_bulk(conn, bundled_matches)
+    before = snapshot(conn)
+
+    generation = db_operations.get_ingest_generation(conn)
+
+    assert load_bulk(conn, bundled_matches) == 0
+    load_row_by_row(conn, bundled_matches)
+    assert snapshot(conn) == before
+    assert db_operations.get_ingest_generation(conn) == generation
+
+def test_renamed_copy_of_a_loaded_match_is_skipped(conn, bundled_matches, snapshot):
+    file_name, data = bundled_matches[0]
+    db_operations.process_match_data(conn, file_name, data)
+    conn.commit()
+    before = snapshot(conn)
+
+    assert db_operations.process_match_data(conn, 'copy_' + file_name, data) is None
+    assert load_bulk(conn, [('copy_' + file_name, data)]) == 0
+    assert snapshot(conn) == before
@@ -0,0 +1,51 @@
+import json
+import os
+import db_operations
+from group_classifier import load_training_data
+from match_archive import MatchArchive, append_matches
+from stats_parser import get_stats_parser
+from match_output import match_files
+
+RAW_CSVS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Raw_csvs')
+
+def test_parsed_groups_record_their_source_through_the_archive(tmp_path):
+    file_name = match_files(RAW_CSVS, ('.csv',))[0]
+    data = get_stats_parser('rows').parse_stats_file(os.path.join(RAW_CSVS, file_name), 'Axis', 'Allies', 'Carentan',
+                                                      '1/1/2024', armor_player_overrides=set(), interactive=False)
+    players = [player for side in ['Axis', 'Allies'] for group in ['Infantry', 'Artillery', 'Armor']
+               for player in data[side][group]['Players']] + data['Spectators']
+    assert set(player['GroupSource'] for player in players) == {'heuristic'}
+
+    override = players[0]['PlayerID']
+    data = get_stats_parser('rows').parse_stats_file(os.path.join(RAW_CSVS, file_name), 'Axis', 'Allies', 'Carentan',
+                                                      '1/1/2024', armor_player_overrides={override}, interactive=False)
+    assert [player['GroupSource'] for player in data['Axis']['Armor']['Players'] + data['Allies']['Armor']['Players']
+            if player['PlayerID'] == override] == ['override']
+
+    archive_path = str(tmp_path / 'season.hllarc')
+    append_matches(archive_path, [('match.json', data)])
+    with MatchArchive(archive_path) as archive:
+        match = archive.matches[0]
+        assert json.dumps(match.to_dict(), ensure_ascii=False) == json.dumps(data, ensure_ascii=False)
+        assert match.prepared() == db_operations.prepare_match('match.json', data)
+
+def test_training_uses_only_confirmed_groups(conn, bundled_matches):
+    db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data)
+                                           for file_name, data in bundled_matches])
+    legacy_ids = load_training_data(conn)[-1].tolist()
+
+    # Rows loaded before group sources were recorded still train; the model's own groups do not
+    classified = legacy_ids[::3]
+    reviewed = legacy_ids[1::3]
+    conn.executemany("UPDATE MatchPerformance SET GroupSource = 'classifier' WHERE MatchPerformanceID = ?",
+                     [(performance_id,) for performance_id in classified])
+    conn.executemany("UPDATE MatchPerformance SET GroupSource = 'reviewed' WHERE MatchPerformanceID = ?",
+                     [(performance_id,) for performance_id in reviewed])
+    conn.executemany("UPDATE MatchPerformance SET GroupSource = 'heuristic' WHERE MatchPerformanceID = ?",
+                     [(performance_id,) for performance_id in legacy_ids[2::3][:10]])
+
+    trained_ids = load_training_data(conn)[-1].tolist()
+    assert not set(trained_ids) & set(classified)
+    assert not set(trained_ids) & set(legacy_ids[2::3][:10])
+    assert set(reviewed) <= set(trained_ids)
+    assert load_training_data(conn, confirmed_only=False)[-1].tolist() == legacy_ids
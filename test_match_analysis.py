@@ -0,0 +1,24 @@
+from match_analysis import MatchAnalysis
+from match_output import ANALYSIS_KEY, payload_hash
+
+def test_stored_analysis_is_reused_while_the_match_is_unchanged(bundled_matches):
+    data = bundled_matches[0][1]
+    stored = MatchAnalysis.attach(data).to_dict()
+    stored['MachineGunPlayers'] = ['marker']
+    data[ANALYSIS_KEY] = stored
+
+    assert MatchAnalysis.for_match(data).mg_players == ['marker']
+    assert stored['Payload Hash'] == payload_hash(data)
+
+def test_stored_analysis_is_recomputed_after_the_match_changes(bundled_matches):
+    data = bundled_matches[0][1]
+    fresh = MatchAnalysis(data).to_dict()
+    MatchAnalysis.attach(data)
+    player = data['Axis']['Infantry']['Players'][0]
+    player['Deaths'] += 10
+    data['Axis']['Total']['Deaths'] += 10
+
+    analysis = MatchAnalysis.for_match(data)
+    assert analysis.stored == {}
+    assert analysis.kdrs['Axis']['Total'] < fresh['KDR']['Axis']['Total']
+    assert analysis.to_dict()['Payload Hash'] == payload_hash(data)
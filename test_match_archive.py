@@ -0,0 +1,37 @@
+import os
+import db_operations
+from match_archive import MatchArchive, convert_directory
+from match_output import payload_hash
+
+PARSED_JSONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parsed_jsons')
+
+def test_archive_round_trip(tmp_path, bundled_matches):
+    archive_path = str(tmp_path / 'season.hllarc')
+    assert convert_directory(PARSED_JSONS, archive_path) == len(bundled_matches)
+    originals = dict(bundled_matches)
+
+    with MatchArchive(archive_path) as archive:
+        assert len(archive) == len(bundled_matches)
+        for match in archive:
+            data = originals[match.file_name]
+            assert payload_hash(match.to_dict()) == payload_hash(data)
+            assert match.prepared() == db_operations.prepare_match(match.file_name, data)
+
+def test_appending_an_archived_match_again_does_nothing(tmp_path):
+    archive_path = str(tmp_path / 'season.hllarc')
+    convert_directory(PARSED_JSONS, archive_path)
+    size = (tmp_path / 'season.hllarc').stat().st_size
+
+    assert convert_directory(PARSED_JSONS, archive_path) == 0
+    assert (tmp_path / 'season.hllarc').stat().st_size == size
+
+def test_loading_the_archive_matches_loading_the_json(connect_db, bundled_matches, snapshot, tmp_path):
+    archive_path = str(tmp_path / 'season.hllarc')
+    convert_directory(PARSED_JSONS, archive_path)
+    from_json = connect_db('json.db')
+    from_archive = connect_db('archive.db')
+    db_operations.bulk_load_matches(from_json, [db_operations.prepare_match(file_name, data)
+                                                for file_name, data in sorted(bundled_matches)])
+
+    assert db_operations.load_archive(from_archive, archive_path) == len(bundled_matches)
+    assert snapshot(from_archive) == snapshot(from_json)
@@ -0,0 +1,65 @@
+import db_operations
+
+def name_runs(conn, player_id):
+    return conn.execute('''
+        SELECT PlayerName, FirstSeen, LastSeen
+        FROM PlayerNameHistory
+        WHERE PlayerID = ?
+        ORDER BY FirstSeen
+    ''', (player_id,)).fetchall()
+
+def current_name(conn, player_id):
+    return conn.execute('SELECT PlayerName FROM PlayerCurrentName WHERE PlayerID = ?', (player_id,)).fetchone()[0]
+
+def out_of_order_matches(make_match, player_id):
+    """A February match under the new name, then older January matches under the old one."""
+    return [
+        ('feb_01.json', make_match('02/01/2025', player_id, 'NewName')),
+        ('jan_01.json', make_match('01/01/2025', player_id, 'OldName')),
+        ('jan_09.json', make_match('01/09/2025', player_id, 'OldName')),
+        ('jan_05.json', make_match('01/05/2025', player_id, 'OldName')),
+    ]
+
+EXPECTED_RUNS = [
+    ('OldName', '2025-01-01 00:00:00', '2025-01-09 00:00:00'),
+    ('NewName', '2025-02-01 00:00:00', '2025-02-01 00:00:00'),
+]
+
+def first_player_id(data):
+    return data['Axis']['Infantry']['Players'][0]['PlayerID']
+
+def test_row_path_widens_the_old_name_run(conn, make_match):
+    player_id = first_player_id(make_match('01/01/2025'))
+    for file_name, data in out_of_order_matches(make_match, player_id):
+        db_operations.process_match_data(conn, file_name, data)
+
+    assert name_runs(conn, player_id) == EXPECTED_RUNS
+    assert current_name(conn, player_id) == 'NewName'
+
+def test_bulk_path_widens_the_old_name_run_across_batches(conn, make_match):
+    player_id = first_player_id(make_match('01/01/2025'))
+    matches = out_of_order_matches(make_match, player_id)
+    for batch in [matches[:1], matches[1:3], matches[3:]]:
+        db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in batch])
+
+    assert name_runs(conn, player_id) == EXPECTED_RUNS
+    assert current_name(conn, player_id) == 'NewName'
+
+def test_timestamp_backfill_restamps_each_run_of_a_returning_name(conn, make_match):
+    player_id = first_player_id(make_match('01/01/2025'))
+    for file_name, match_date, player_name in [('a1.json', '01/01/2025', 'A'), ('b.json', '01/05/2025', 'B'),
+                                               ('a2.json', '01/09/2025', 'A')]:
+        db_operations.process_match_data(conn, file_name, make_match(match_date, player_id, player_name))
+    # As in a database loaded before MatchTimestamp existed, stamped with the time of loading
+    conn.execute('UPDATE ParsedResults SET MatchTimestamp = NULL')
+    conn.execute('UPDATE MatchPerformance SET MatchTimestamp = NULL')
+    conn.execute("UPDATE PlayerNameHistory SET FirstSeen = '2025-06-01 00:00:00', LastSeen = '2025-06-01 00:00:00'")
+
+    db_operations.backfill_match_timestamps(conn)
+
+    assert name_runs(conn, player_id) == [
+        ('A', '2025-01-01 00:00:00', '2025-01-01 00:00:00'),
+        ('B', '2025-01-05 00:00:00', '2025-01-05 00:00:00'),
+        ('A', '2025-01-09 00:00:00', '2025-01-09 00:00:00'),
+    ]
+    assert current_name(conn, player_id) == 'A'
@@ -0,0 +1,17 @@
+import json
+import os
+import pytest
+from stats_parser import PARSE_ENGINES, get_stats_parser
+from match_output import match_files
+
+RAW_CSVS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Raw_csvs')
+
+def parse(engine, file_name):
+    return get_stats_parser(engine).parse_stats_file(os.path.join(RAW_CSVS, file_name), 'Axis', 'Allies', 'Carentan',
+                                                     '1/1/2024', armor_player_overrides=set(), interactive=False)
+
+@pytest.mark.parametrize('file_name', match_files(RAW_CSVS, ('.csv',)))
+def test_every_engine_matches_the_row_parser(file_name):
+    reference = json.dumps(parse('rows', file_name), ensure_ascii=False)
+    for engine in PARSE_ENGINES[1:]:
+        assert json.dumps(parse(engine, file_name), ensure_ascii=False) == reference
@@ -0,0 +1,50 @@
+import random
+import pytest
+import db_operations
+import ratings
+
+RATING_TABLES = ['PlayerRatings', 'TeamRatings', 'PlayerRatingHistory', 'TeamRatingHistory', 'RatingState']
+
+@pytest.fixture(autouse=True)
+def small_checkpoints(monkeypatch):
+    """Checkpoint and chunk often enough for the bundled season to cross both boundaries."""
+    monkeypatch.setattr(ratings, 'CHECKPOINT_INTERVAL', 4)
+    monkeypatch.setattr(ratings, 'RATING_CHUNK', 3)
+
+def load(conn, matches, batch_size):
+    for start in range(0, len(matches), batch_size):
+        db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data)
+                                               for file_name, data in matches[start:start + batch_size]])
+
+def test_load_order_does_not_change_the_ratings(connect_db, bundled_matches, snapshot):
+    in_order = connect_db('in_order.db')
+    shuffled = connect_db('shuffled.db')
+    load(in_order, bundled_matches, len(bundled_matches))
+    # Matches played at the same time are rated in load order, so only whole match dates are shuffled
+    dates = {}
+    for file_name, data in bundled_matches:
+        dates.setdefault(data['Match Date'], []).append((file_name, data))
+    days = list(dates.values())
+    random.Random(7).shuffle(days)
+    load(shuffled, [match for day in days for match in day], 2)
+
+    assert snapshot(shuffled, RATING_TABLES) == snapshot(in_order, RATING_TABLES)
+
+def test_replay_reproduces_the_incremental_ratings(conn, bundled_matches, snapshot):
+    load(conn, bundled_matches, 1)
+    incremental = snapshot(conn, RATING_TABLES)
+
+    ratings.replay_ratings(conn)
+    assert snapshot(conn, RATING_TABLES) == incremental
+    ratings.replay_ratings(conn)
+    assert snapshot(conn, RATING_TABLES) == incremental
+
+def test_replay_from_a_checkpoint_matches_a_full_replay(conn, bundled_matches, snapshot):
+    load(conn, bundled_matches, len(bundled_matches))
+    full = snapshot(conn, RATING_TABLES)
+    position = conn.execute('''
+        SELECT MatchTimestamp, ResultID FROM ParsedResults ORDER BY MatchTimestamp, ResultID LIMIT 1 OFFSET 9
+    ''').fetchone()
+
+    ratings.replay_ratings(conn, tuple(position))
+    assert snapshot(conn, RATING_TABLES) == full
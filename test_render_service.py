@@ -0,0 +1,14 @@
+import os
+from render_service import RenderService
+
+def test_matches_of_the_same_teams_get_their_own_files(tmp_path, make_match):
+    service = RenderService(workers=2, preset='preview')
+    try:
+        futures = [service.render(make_match(match_date), str(tmp_path)) for match_date in ['11/09/2024', '11/10/2024']]
+        outputs = [future.result() for future in futures]
+        assert outputs[0] != outputs[1]
+        assert all(os.path.exists(output) for output in outputs)
+
+        assert service.render_sync(make_match('11/10/2024'), str(tmp_path)) == outputs[1]
+    finally:
+        service.shutdown()
@@ -0,0 +1,34 @@
+import sqlite3
+import pytest
+import db_operations
+import reports
+
+@pytest.fixture(autouse=True)
+def close_report_connections():
+    yield
+    reports.close_connections()
+
+def test_report_connection_is_read_only(tmp_path, bundled_matches):
+    db_file = str(tmp_path / 'reports.db')
+    conn = db_operations.connect(db_file)
+    db_operations.create_tables(conn)
+    db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data) for file_name, data in bundled_matches])
+    conn.close()
+
+    report_conn = reports.get_connection(db_file)
+    assert reports.rating_table(report_conn)['Players']
+    with pytest.raises(sqlite3.OperationalError):
+        report_conn.execute("INSERT INTO Teams (TeamName) VALUES ('Readers')")
+
+def test_outdated_database_is_not_migrated(tmp_path):
+    db_file = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE ParsedResults (ResultID INTEGER PRIMARY KEY, FileName TEXT, MatchDate TEXT)')
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(reports.ReportError, match='rebuild-aggregates'):
+        reports.get_connection(db_file)
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall() == [('ParsedResults',)]
+    conn.close()
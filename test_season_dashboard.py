@@ -0,0 +1,15 @@
+import os
+import pytest
+import db_operations
+from season_dashboard import render_dashboards
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_teams_whose_names_sanitize_alike_get_their_own_dashboards(conn, make_match, tmp_path, workers):
+    data = make_match('11/09/2024')
+    data['Axis']['Team Name'] = 'A/B'
+    data['Allies']['Team Name'] = 'A_B'
+    db_operations.process_match_data(conn, 'match.json', data)
+
+    outputs = render_dashboards(conn, str(tmp_path / 'dashboards'), preset='preview', workers=workers)
+    assert len(set(outputs)) == 2
+    assert all(os.path.exists(output) for output in outputs)
@@ -0,0 +1,90 @@
+import http.client
+import json
+import sqlite3
+import threading
+from urllib.parse import quote
+import pytest
+import db_operations
+import stats_api
+
+@pytest.fixture
+def db_file(tmp_path, bundled_matches):
+    db_file = str(tmp_path / 'api.db')
+    conn = db_operations.connect(db_file)
+    db_operations.create_tables(conn)
+    db_operations.bulk_load_matches(conn, [db_operations.prepare_match(file_name, data)
+                                           for file_name, data in bundled_matches[:-1]])
+    conn.close()
+    return db_file
+
+@pytest.fixture
+def api(db_file):
+    api = stats_api.StatsApi(db_file, workers=2, generation_check_seconds=0)
+    server = stats_api.make_server(api, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    api.port = server.server_address[1]
+    yield api
+    server.shutdown()
+    server.server_close()
+    api.close()
+
+def get(api, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', api.port, timeout=10)
+    try:
+        conn.request('GET', quote(path, safe='/?=&'), headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, response.getheader('ETag'), json.loads(body) if body else None
+    finally:
+        conn.close()
+
+def test_routes(api, bundled_matches):
+    status, _, matches = get(api, '/matches')
+    assert status == 200
+    assert len(matches['Matches']) == len(bundled_matches) - 1
+
+    file_name, data = bundled_matches[0]
+    status, _, match = get(api, f'/matches/{file_name}')
+    assert status == 200
+    assert match['Axis']['Team Name'] == data['Axis']['Team Name']
+
+    player = data['Axis']['Infantry']['Players'][0]
+    status, _, history = get(api, f"/players/{player['PlayerID']}")
+    assert status == 200
+    assert history['Player'][0]['PlayerID'] == player['PlayerID']
+
+    assert get(api, f"/teams/{data['Axis']['Team Name']}")[0] == 200
+    assert get(api, '/maps')[2]['Maps']
+    assert get(api, '/players/nobody')[0] == 404
+    assert get(api, '/nowhere')[0] == 404
+    assert get(api, '/matches?limit=many')[0] == 400
+
+def test_etag_answers_304_until_the_generation_changes(api, db_file, bundled_matches):
+    status, etag, body = get(api, '/matches')
+    assert status == 200 and etag
+    assert get(api, '/matches', {'If-None-Match': etag})[0] == 304
+    assert len(api.cache) == 1
+
+    conn = db_operations.connect(db_file)
+    db_operations.bulk_load_matches(conn, [db_operations.prepare_match(*bundled_matches[-1])])
+    conn.close()
+
+    status, new_etag, new_body = get(api, '/matches', {'If-None-Match': etag})
+    assert status == 200
+    assert new_etag != etag
+    assert len(new_body['Matches']) == len(body['Matches']) + 1
+
+@pytest.mark.parametrize('error, status', [
+    (sqlite3.OperationalError('database is locked'), 503),
+    (sqlite3.OperationalError('no such table: ParsedResults'), 500),
+    (sqlite3.DatabaseError('database disk image is malformed'), 500),
+])
+def test_database_errors_get_a_json_response(api, error, status):
+    def fail(conn, key, params):
+        raise error
+
+    api.routes['maps'] = fail
+    response_status, _, body = get(api, '/maps')
+    assert response_status == status
+    assert str(error) in body['error']
@@ -1,3 +1,6 @@
+import sys
+from typing import NamedTuple
+
 class WeaponData:
     # Reference data for weapons so we can assign them to a faction
     WEAPONS: dict[str, dict[str, str]] = {
@@ -205,3 +208,91 @@ class WeaponData:
     MACHINE_GUNS: set[str] = {
         'BROWNING M1919', 'MG34', 'MG42', 'DP-27', 'Lewis Gun'
     }
+
+
+class WeaponInfo(NamedTuple):
+    weapon_id: int
+    name: str
+    side: str | None
+    faction: str | None
+    group: str | None
+    category: str
+    is_machine_gun: bool
+    is_known: bool
+
+
+class WeaponIndex:
+    """Precompiled weapon classification built once from WeaponData.
+
+    Every weapon name maps to a WeaponInfo with a small integer ID and its side,
+    faction, group, death category and MG flag already worked out, so classifying
+    a weapon is a single dict lookup. Names missing from WeaponData are classified
+    on first sight and memoized.
+    """
+
+    DEATH_CATEGORIES: list[str] = ['Small Arms', 'Sniper', 'Tank', 'Artillery', 'Explosives']
+
+    # Checked in order; the first category with a matching keyword wins
+    CATEGORY_KEYWORDS: list[tuple[str, list[str]]] = [
+        ('Artillery', ['HOWITZER', '155MM', '150MM', '122MM']),
+        ('Tank', ['SHERMAN', 'TIGER', 'PANZER', 'T34', 'CHURCHILL', 'STUART',
+                  'LUCHS', 'PUMA', 'CANNON', 'MM GUN', 'KWK']),
+        ('Sniper', ['SCOPED', 'SNIPER', 'X8', 'X4']),
+        ('Explosives', ['GRENADE', 'MINE', 'PANZERSCHRECK', 'BAZOOKA',
+                        'STIELHANDGRANATE', 'DYNAMITE', 'TNT']),
+    ]
+
+    def __init__(self, weapons: dict[str, dict[str, str]] | None = None, machine_guns: set[str] | None = None) -> None:
+        self._weapons = WeaponData.WEAPONS if weapons is None else weapons
+        self._machine_guns = WeaponData.MACHINE_GUNS if machine_guns is None else machine_guns
+        self._by_name: dict[str, WeaponInfo] = {}
+        self._by_id: list[WeaponInfo] = []
+        for name in self._weapons:
+            self._add(name)
+        for name in sorted(self._machine_guns):
+            self.lookup(name)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def lookup(self, name: str) -> WeaponInfo:
+        info = self._by_name.get(name)
+        if info is None:
+            info = self._add(name)
+        return info
+
+    def by_id(self, weapon_id: int) -> WeaponInfo:
+        return self._by_id[weapon_id]
+
+    def entries(self) -> list[WeaponInfo]:
+        """All weapons seen so far, ordered by weapon_id."""
+        return list(self._by_id)
+
+    def _add(self, name: str) -> WeaponInfo:
+        name = sys.intern(name)
+        ref = self._weapons.get(name)
+        info = WeaponInfo(
+            weapon_id=len(self._by_id),
+            name=name,
+            side=ref['side'] if ref else None,
+            faction=ref['faction'] if ref else None,
+            group=ref['group'] if ref else None,
+            category=self.categorize(name),
+            is_machine_gun=name in self._machine_guns,
+            is_known=ref is not None
+        )
+        self._by_name[name] = info
+        self._by_id.append(info)
+        return info
+
+    @classmethod
+    def categorize(cls, name: str) -> str:
+        """Death source category of a weapon; defaults to small arms."""
+        weapon_upper = name.upper()
+        for category, keywords in cls.CATEGORY_KEYWORDS:
+            if any(keyword in weapon_upper for keyword in keywords):
+                return category
+        return 'Small Arms'
+
+
+weapon_index = WeaponIndex()